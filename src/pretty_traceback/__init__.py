@@ -3,24 +3,60 @@
 #
 # Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
 # SPDX-License-Identifier: MIT
+import sys
 
 from .hook import install
 from .hook import uninstall
-from .formatting import LoggingFormatter
-from .formatting import LoggingFormatterMixin
+from .hook import asyncio_exception_handler
 
 __version__ = "2024.1021"
 
 
-# retain typo for backward compatibility
-LoggingFormaterMixin = LoggingFormatterMixin
+# NOTE: The formatting module (and with it colorama, logging, re, etc.)
+#   is only imported when one of these attributes is first accessed, so
+#   that `import pretty_traceback; pretty_traceback.install()` adds
+#   next to nothing to the startup time of a program.
+_LAZY_ATTRS = {
+    # name                 : (module, attribute)
+    'LoggingFormatter'     : ('formatting', 'LoggingFormatter'),
+    'LoggingFormatterMixin': ('formatting', 'LoggingFormatterMixin'),
+    'JSONLoggingFormatter' : ('structured', 'JSONLoggingFormatter'),
+    # retain typo for backward compatibility
+    'LoggingFormaterMixin': ('formatting', 'LoggingFormatterMixin'),
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        # pylint:disable=import-outside-toplevel   ; lazy import
+        import importlib
+
+        module_name, attr = _LAZY_ATTRS[name]
+        module = importlib.import_module("." + module_name, __name__)
+        return getattr(module, attr)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
+
+
+if sys.version_info < (3, 7):
+    # module level __getattr__ (PEP 562) is not supported
+    from .formatting import LoggingFormatter
+    from .formatting import LoggingFormatterMixin
+    from .structured import JSONLoggingFormatter
+
+    LoggingFormaterMixin = LoggingFormatterMixin
 
 
 __all__ = [
     'install',
     'uninstall',
+    'asyncio_exception_handler',
     '__version__',
     'LoggingFormatter',
     'LoggingFormatterMixin',
     'LoggingFormaterMixin',
+    'JSONLoggingFormatter',
 ]
@@ -0,0 +1,106 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Filter log output and reformat any tracebacks it contains.
+
+Usage:
+    $ python -m pretty_traceback app.log
+    $ kubectl logs -f mypod | python -m pretty_traceback
+    $ python -m pretty_traceback --jobs 0 app.log.*
+    $ python -m pretty_traceback --install-pth
+"""
+
+import os
+import sys
+import typing as typ
+import argparse
+
+from pretty_traceback import hook
+from pretty_traceback import batch
+from pretty_traceback import logfilter
+
+
+def _parse_args(args: typ.Optional[typ.List[str]] = None) -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m pretty_traceback",
+        description="Reformat python tracebacks in log output.",
+    )
+    arg_parser.add_argument(
+        'files', nargs="*", default=["-"], help="Input files. Default: - (stdin)"
+    )
+    color_group = arg_parser.add_mutually_exclusive_group()
+    color_group.add_argument('--color', dest='color', action='store_true', default=None)
+    color_group.add_argument('--no-color', dest='color', action='store_false')
+    arg_parser.add_argument(
+        '--width', type=int, default=None, help="Output width. Default: width of the terminal"
+    )
+    arg_parser.add_argument('--encoding', default="utf-8")
+    arg_parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=None,
+        help=(
+            "Process files in parallel using this many processes (0: one per core). "
+            "Default: sequential processing, suitable for streams."
+        ),
+    )
+    pth_group = arg_parser.add_mutually_exclusive_group()
+    pth_group.add_argument(
+        '--install-pth',
+        action='store_true',
+        help="Activate pretty_traceback for all programs of this python environment.",
+    )
+    pth_group.add_argument('--uninstall-pth', action='store_true', help="Undo --install-pth.")
+    arg_parser.add_argument(
+        '--site-dir', default=None, help="Directory for --install-pth. Default: site-packages"
+    )
+    return arg_parser.parse_args(args)
+
+
+def _default_color() -> bool:
+    if "NO_COLOR" in os.environ:
+        return False
+    isatty = getattr(sys.stdout, "isatty", lambda: False)
+    return bool(isatty())
+
+
+def main(args: typ.Optional[typ.List[str]] = None) -> int:
+    parsed = _parse_args(args)
+    if parsed.install_pth:
+        print("Installed", hook.install_pth(parsed.site_dir))
+        return 0
+    if parsed.uninstall_pth:
+        pth_path = hook.uninstall_pth(parsed.site_dir)
+        if pth_path:
+            print("Removed", pth_path)
+        return 0
+
+    color  = _default_color() if parsed.color is None else parsed.color
+    opts   = logfilter.FilterOptions(color, parsed.width, parsed.encoding)
+    out    = sys.stdout.buffer
+
+    try:
+        if parsed.jobs is not None and "-" not in parsed.files:
+            batch.filter_files(parsed.files, out, opts, jobs=parsed.jobs)
+            return 0
+
+        for path in parsed.files:
+            if path == "-":
+                logfilter.filter_stream(sys.stdin.buffer, out, opts)
+            else:
+                with open(path, mode="rb") as fobj:
+                    logfilter.filter_stream(fobj, out, opts)
+    except BrokenPipeError:
+        # e.g. piped into head
+        sys.stderr.close()
+        return 1
+    except KeyboardInterrupt:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
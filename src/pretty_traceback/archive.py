@@ -0,0 +1,348 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Compact binary archive of traceback chains.
+
+Layout of an archive file:
+
+    MAGIC, then a sequence of records
+
+    record     : kind (1 byte), payload length (varint), payload
+    STRINGS    : count (varint), [length (varint), utf-8 bytes] * count
+    CHAIN      : num_links (varint), [link] * num_links
+    link       : exc_name (sid), exc_msg (sid), flags (1 byte),
+                 num_entries (varint), [entry] * num_entries,
+                 [members] if flags & FLAG_HAS_MEMBERS
+    entry      : module (sid), call (sid), lineno (varint), src_ctx (sid),
+                 [caret (sid), repeat (varint)] if flags & FLAG_HAS_EXTRAS
+    members    : num_members (varint), [count (varint), num_links (varint),
+                 [link] * num_links] * num_members
+
+Each distinct string (module paths, calls, source lines, messages) is
+stored once in a STRINGS record, which precedes the first CHAIN that
+refers to it. Strings are referenced by their index (sid) in the order
+in which they were written. Line numbers are stored as lineno + 1, or 0
+followed by a sid for line numbers that are not an integer.
+
+Records are only ever appended, so an archive can be extended by
+multiple runs of a program. An incomplete record at the end of the
+file (e.g. if a program was killed while writing) is ignored by the
+reader and truncated by the next writer.
+"""
+
+import os
+import mmap
+import typing as typ
+
+import pretty_traceback.common as com
+from pretty_traceback import formatting
+
+MAGIC = b"PTBARCH\x01"
+
+RECORD_STRINGS = 1
+RECORD_CHAIN   = 2
+
+FLAG_IS_CAUSED   = 1
+FLAG_IS_CONTEXT  = 2
+FLAG_HAS_MEMBERS = 4
+FLAG_HAS_EXTRAS  = 8    # carets or repetitions of entries
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def _write_varint(buf: bytearray, val: int) -> None:
+    while val > 0x7F:
+        buf.append((val & 0x7F) | 0x80)
+        val >>= 7
+    buf.append(val)
+
+
+def _read_varint(data: typ.Any, pos: int) -> typ.Tuple[int, int]:
+    val   = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        val |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return val, pos
+        shift += 7
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.ids    : typ.Dict[str, int] = {}
+        self.size   : int = 0
+        self.pending: typ.List[str] = []
+
+    def sid(self, val: str) -> int:
+        sid = self.ids.get(val)
+        if sid is None:
+            sid = self.ids[val] = self.size
+            self.size += 1
+            self.pending.append(val)
+        return sid
+
+    def add(self, val: str) -> None:
+        # strings of an existing archive, which are already written
+        self.ids.setdefault(val, self.size)
+        self.size += 1
+
+
+def _encode_lineno(buf: bytearray, strings: _StringTable, lineno: str) -> None:
+    # NOTE: isdecimal excludes e.g. "²", for which int() would fail.
+    if lineno.isdecimal() and str(int(lineno)) == lineno:
+        _write_varint(buf, int(lineno) + 1)
+    else:
+        buf.append(0)
+        _write_varint(buf, strings.sid(lineno))
+
+
+def _encode_links(buf: bytearray, strings: _StringTable, tracebacks: com.Tracebacks) -> None:
+    _write_varint(buf, len(tracebacks))
+    for tb_tup in tracebacks:
+        has_extras = any(entry.caret or entry.repeat for entry in tb_tup.entries)
+        flags      = (
+            (FLAG_IS_CAUSED if tb_tup.is_caused else 0)
+            | (FLAG_IS_CONTEXT if tb_tup.is_context else 0)
+            | (FLAG_HAS_MEMBERS if tb_tup.members else 0)
+            | (FLAG_HAS_EXTRAS if has_extras else 0)
+        )
+        _write_varint(buf, strings.sid(tb_tup.exc_name))
+        _write_varint(buf, strings.sid(tb_tup.exc_msg))
+        buf.append(flags)
+        _write_varint(buf, len(tb_tup.entries))
+        for module, call, lineno, src_ctx, caret, repeat in formatting.load_src_ctx(
+            tb_tup.entries
+        ):
+            _write_varint(buf, strings.sid(module))
+            _write_varint(buf, strings.sid(call))
+            _encode_lineno(buf, strings, lineno)
+            _write_varint(buf, strings.sid(src_ctx))
+            if has_extras:
+                _write_varint(buf, strings.sid(caret))
+                _write_varint(buf, repeat)
+
+        if tb_tup.members:
+            _write_varint(buf, len(tb_tup.members))
+            for member in tb_tup.members:
+                _write_varint(buf, member.count)
+                _encode_links(buf, strings, member.tracebacks)
+
+
+def _encode_chain(strings: _StringTable, tracebacks: com.Tracebacks) -> bytes:
+    buf = bytearray()
+    _encode_links(buf, strings, tracebacks)
+    return bytes(buf)
+
+
+def _encode_record(kind: int, payload: bytes) -> bytes:
+    buf = bytearray([kind])
+    _write_varint(buf, len(payload))
+    return bytes(buf) + payload
+
+
+def _encode_strings(vals: typ.List[str]) -> bytes:
+    buf = bytearray()
+    _write_varint(buf, len(vals))
+    for val in vals:
+        data = val.encode("utf-8", "surrogatepass")
+        _write_varint(buf, len(data))
+        buf += data
+    return bytes(buf)
+
+
+def _encode_records(strings: _StringTable, tracebacks: com.Tracebacks) -> bytes:
+    chain = _encode_chain(strings, tracebacks)
+    if strings.pending:
+        pending = _encode_strings(strings.pending)
+        del strings.pending[:]
+        return _encode_record(RECORD_STRINGS, pending) + _encode_record(RECORD_CHAIN, chain)
+    else:
+        return _encode_record(RECORD_CHAIN, chain)
+
+
+class _Record(typ.NamedTuple):
+
+    kind : int
+    start: int    # of the payload
+    end  : int
+
+
+def _iter_records(data: typ.Any, size: int) -> typ.Iterator[_Record]:
+    if size < len(MAGIC) or data[: len(MAGIC)] != MAGIC:
+        raise ArchiveError("Not a traceback archive")
+
+    pos = len(MAGIC)
+    while pos < size:
+        try:
+            kind = data[pos]
+            length, start = _read_varint(data, pos + 1)
+        except IndexError:
+            return    # incomplete record header
+
+        end = start + length
+        if end > size:
+            return    # incomplete record
+        yield _Record(kind, start, end)
+        pos = end
+
+
+def _decode_strings(data: typ.Any, rec: _Record, strings: typ.List[str]) -> None:
+    count, pos = _read_varint(data, rec.start)
+    for _ in range(count):
+        length, pos = _read_varint(data, pos)
+        strings.append(bytes(data[pos : pos + length]).decode("utf-8", "surrogatepass"))
+        pos += length
+
+
+def _decode_links(
+    data: typ.Any, pos: int, strings: typ.List[str]
+) -> typ.Tuple[com.Tracebacks, int]:
+    # pylint:disable=too-many-locals   ; inlined for speed
+    num_links, pos = _read_varint(data, pos)
+
+    tracebacks: com.Tracebacks = []
+    for _ in range(num_links):
+        exc_name, pos = _read_varint(data, pos)
+        exc_msg , pos = _read_varint(data, pos)
+        flags = data[pos]
+        num_entries, pos = _read_varint(data, pos + 1)
+
+        entries: com.Entries = []
+        for _ in range(num_entries):
+            module , pos = _read_varint(data, pos)
+            call   , pos = _read_varint(data, pos)
+            lineno , pos = _read_varint(data, pos)
+            if lineno == 0:
+                lineno_sid, pos = _read_varint(data, pos)
+                lineno_str = strings[lineno_sid]
+            else:
+                lineno_str = str(lineno - 1)
+            src_ctx, pos = _read_varint(data, pos)
+            entry = com.Entry(strings[module], strings[call], lineno_str, strings[src_ctx])
+            if flags & FLAG_HAS_EXTRAS:
+                caret , pos = _read_varint(data, pos)
+                repeat, pos = _read_varint(data, pos)
+                entry = entry._replace(caret=strings[caret], repeat=repeat)
+            entries.append(entry)
+
+        members: typ.List[com.Member] = []
+        if flags & FLAG_HAS_MEMBERS:
+            num_members, pos = _read_varint(data, pos)
+            for _ in range(num_members):
+                count, pos = _read_varint(data, pos)
+                member_tbs, pos = _decode_links(data, pos, strings)
+                members.append(com.Member(member_tbs, count))
+
+        tracebacks.append(
+            com.Traceback(
+                exc_name=strings[exc_name],
+                exc_msg=strings[exc_msg],
+                entries=entries,
+                is_caused=bool(flags & FLAG_IS_CAUSED),
+                is_context=bool(flags & FLAG_IS_CONTEXT),
+                members=tuple(members),
+            )
+        )
+    return tracebacks, pos
+
+
+def _decode_chain(data: typ.Any, rec: _Record, strings: typ.List[str]) -> com.Tracebacks:
+    tracebacks, _ = _decode_links(data, rec.start, strings)
+    return tracebacks
+
+
+def _iter_chains(data: typ.Any, size: int) -> typ.Iterator[com.Tracebacks]:
+    strings: typ.List[str] = []
+    for rec in _iter_records(data, size):
+        if rec.kind == RECORD_STRINGS:
+            _decode_strings(data, rec, strings)
+        elif rec.kind == RECORD_CHAIN:
+            yield _decode_chain(data, rec, strings)
+        # unknown records are skipped, for forward compatibility
+
+
+def dumps(chains: typ.Iterable[com.Tracebacks]) -> bytes:
+    strings = _StringTable()
+    return MAGIC + b"".join(_encode_records(strings, tracebacks) for tracebacks in chains)
+
+
+def loads(data: bytes) -> typ.List[com.Tracebacks]:
+    return list(_iter_chains(data, len(data)))
+
+
+def iter_archive(path: str) -> typ.Iterator[com.Tracebacks]:
+    """Read all traceback chains of an archive file.
+
+    The file is memory mapped, so only the decoded chains are held
+    in memory. Identical strings are shared by all chains.
+    """
+    with open(path, mode="rb") as fobj:
+        size = os.fstat(fobj.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for chain in _iter_chains(data, size):
+                yield chain
+
+
+class ArchiveWriter:
+    """Append traceback chains to an archive file.
+
+    If the file exists, its string table is loaded first (without
+    decoding any chains), so that strings are never stored twice.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path     = path
+        self._strings = _StringTable()
+        self._fobj    = open(path, mode="a+b")    # pylint:disable=consider-using-with
+        try:
+            self._init_file()
+        except BaseException:
+            # e.g. ArchiveError if the file is not an archive
+            self._fobj.close()
+            raise
+
+    def _init_file(self) -> None:
+        fobj = self._fobj
+        size = os.fstat(fobj.fileno()).st_size
+        if size == 0:
+            fobj.write(MAGIC)
+            fobj.flush()
+            return
+
+        strings: typ.List[str] = []
+        end = len(MAGIC)
+        with mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for rec in _iter_records(data, size):
+                if rec.kind == RECORD_STRINGS:
+                    _decode_strings(data, rec, strings)
+                end = rec.end
+
+        for val in strings:
+            self._strings.add(val)
+
+        if end < size:
+            # drop an incomplete record
+            fobj.truncate(end)
+
+    def write(self, tracebacks: com.Tracebacks) -> None:
+        self._fobj.write(_encode_records(self._strings, tracebacks))
+
+    def flush(self) -> None:
+        self._fobj.flush()
+
+    def close(self) -> None:
+        self._fobj.close()
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,175 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Reprocess log files using multiple processes.
+
+Files are split into ranges of bytes which start at the head of a
+traceback, so that each range can be processed independently. Results
+are returned in the order of the input.
+"""
+
+import os
+import mmap
+import typing as typ
+import collections
+import concurrent.futures as cf
+
+import pretty_traceback.common as com
+from pretty_traceback import parsing
+from pretty_traceback import logfilter
+
+# Ranges are no larger than this, so that a worker never holds more
+# than this (plus its output) in memory.
+MAX_RANGE_SIZE = 32 * 1024 * 1024
+
+# Ranges smaller than this are not split further, even if there are idle cores.
+MIN_RANGE_SIZE = 1024 * 1024
+
+# How far to look back for the head of a chained traceback
+# (a CAUSE_HEAD or CONTEXT_HEAD followed by blank lines).
+_CHAIN_LOOKBEHIND = 256
+
+
+class FileRange(typ.NamedTuple):
+
+    path : str
+    start: int
+    end  : int
+
+
+def _is_chained(data: typ.Any, line_start: int) -> bool:
+    prelude = bytes(data[max(0, line_start - _CHAIN_LOOKBEHIND) : line_start])
+    for line in reversed(prelude.splitlines()):
+        stripped = line.strip()
+        if stripped:
+            return stripped.startswith((parsing.CAUSE_HEAD_BYTES, parsing.CONTEXT_HEAD_BYTES))
+    return False
+
+
+def _next_boundary(data: typ.Any, pos: int, size: int) -> int:
+    """Find the start of the next traceback (that is not part of a chain)."""
+    head = parsing.TRACEBACK_HEAD_BYTES
+    while pos < size:
+        idx = data.find(head, pos)
+        if idx < 0:
+            return size
+
+        line_start = data.rfind(b"\n", 0, idx) + 1
+        is_head    = not bytes(data[line_start:idx]).strip()
+        if is_head and line_start >= pos and not _is_chained(data, line_start):
+            return line_start
+
+        pos = idx + len(head)
+    return size
+
+
+def split_file(path: str, range_size: int = MAX_RANGE_SIZE) -> typ.List[FileRange]:
+    size = os.path.getsize(path)
+    if size <= range_size:
+        return [FileRange(path, 0, size)]
+
+    ranges: typ.List[FileRange] = []
+    with open(path, mode="rb") as fobj:
+        with mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < size:
+                end = _next_boundary(data, start + range_size, size)
+                ranges.append(FileRange(path, start, end))
+                start = end
+    return ranges
+
+
+def split_files(paths: typ.List[str], jobs: int) -> typ.List[FileRange]:
+    total_size = sum(os.path.getsize(path) for path in paths)
+    # enough ranges to keep all workers busy
+    range_size = max(MIN_RANGE_SIZE, min(MAX_RANGE_SIZE, total_size // (jobs * 4) + 1))
+    return [rng for path in paths for rng in split_file(path, range_size)]
+
+
+def _iter_range_chunks(rng: FileRange) -> typ.Iterator[bytes]:
+    with open(rng.path, mode="rb") as fobj:
+        fobj.seek(rng.start)
+        remaining = rng.end - rng.start
+        while remaining > 0:
+            chunk = fobj.read(min(remaining, logfilter.READ_SIZE * 16))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _parse_range(rng: FileRange) -> com.Tracebacks:
+    parser     = parsing.TracebackParser(offset=rng.start)
+    tracebacks = []
+    for chunk in _iter_range_chunks(rng):
+        tracebacks.extend(parser.feed(chunk))
+    tracebacks.extend(parser.close())
+    return tracebacks
+
+
+def _filter_range(rng: FileRange, opts: logfilter.FilterOptions) -> bytes:
+    parser = parsing.TracebackParser(offset=rng.start, encoding=opts.encoding)
+    output = []
+    for chunk in _iter_range_chunks(rng):
+        output.extend(logfilter.iter_filtered(parser.feed_items(chunk), opts))
+    output.extend(logfilter.iter_filtered(parser.close_items(), opts))
+    return b"".join(output)
+
+
+Result = typ.TypeVar('Result')
+
+
+def _iter_ordered(
+    func: typ.Callable[..., Result], args: typ.List[typ.Tuple[typ.Any, ...]], jobs: int
+) -> typ.Iterator[Result]:
+    # Unlike Executor.map, only a bounded number of results are pending
+    # at any time, so memory doesn't grow if the consumer is slow.
+    if jobs == 1:
+        for arg in args:
+            yield func(*arg)
+        return
+
+    max_pending = jobs * 2
+    with cf.ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: typ.Deque[cf.Future] = collections.deque()
+        for arg in args:
+            pending.append(executor.submit(func, *arg))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def _default_jobs(jobs: typ.Optional[int]) -> int:
+    if jobs:
+        return jobs
+    else:
+        return os.cpu_count() or 1
+
+
+def iter_tracebacks(
+    paths: typ.List[str], jobs: typ.Optional[int] = None
+) -> typ.Iterator[com.Traceback]:
+    """Parse all tracebacks in the files, using multiple processes."""
+    _jobs  = _default_jobs(jobs)
+    ranges = split_files(paths, _jobs)
+    for tracebacks in _iter_ordered(_parse_range, [(rng,) for rng in ranges], _jobs):
+        for tb_tup in tracebacks:
+            yield tb_tup
+
+
+def filter_files(
+    paths: typ.List[str],
+    out  : typ.IO[bytes],
+    opts : logfilter.FilterOptions,
+    jobs : typ.Optional[int] = None,
+) -> None:
+    """Same as logfilter.filter_stream for each file, using multiple processes."""
+    _jobs  = _default_jobs(jobs)
+    ranges = split_files(paths, _jobs)
+    for output in _iter_ordered(_filter_range, [(rng, opts) for rng in ranges], _jobs):
+        out.write(output)
+    out.flush()
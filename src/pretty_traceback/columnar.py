@@ -0,0 +1,188 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Columnar storage for large numbers of tracebacks.
+
+A list of com.Traceback holds a tuple and four strings for each entry,
+even if the same path occurs in thousands of tracebacks. An EntryTable
+instead stores the id of each string (in a shared StringPool) in
+array-backed columns, so each entry costs about 16 bytes.
+
+Tracebacks (and their entries) are only materialized as com.Traceback
+when they are accessed, their strings are the interned instances from
+the pool.
+"""
+
+import array
+import typing as typ
+
+import pretty_traceback.common as com
+
+FLAG_IS_CAUSED  = 1
+FLAG_IS_CONTEXT = 2
+
+
+class StringPool:
+    """Interned strings, each with an integer id."""
+
+    def __init__(self) -> None:
+        self.strings: typ.List[str] = []
+        self._ids   : typ.Dict[str, int] = {}
+
+    def intern(self, val: str) -> int:
+        sid = self._ids.get(val)
+        if sid is None:
+            sid = self._ids[val] = len(self.strings)
+            self.strings.append(val)
+        return sid
+
+    def __getitem__(self, sid: int) -> str:
+        return self.strings[sid]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class EntryTable:
+    """Tracebacks stored column by column.
+
+    Each row of the traceback columns (exc_names, exc_msgs, flags)
+    corresponds to one com.Traceback, i.e. one link of a chain. Its
+    entries are the rows entry_offsets[i] to entry_offsets[i + 1] of
+    the entry columns (modules, calls, linenos, src_ctxs).
+
+    Line numbers are stored as integers. The rare line number which is
+    not a (canonical) integer is stored as -1 - sid.
+
+    The carets and repetitions of entries (which most entries don't
+    have) are stored in the sparse mapping extras, by the row of the
+    entry.
+
+    The members of exception groups (com.Traceback.members) are not
+    stored, since parsed tracebacks don't have any.
+    """
+
+    def __init__(self, pool: typ.Optional[StringPool] = None) -> None:
+        self.pool = StringPool() if pool is None else pool
+
+        # entry columns
+        self.modules  = array.array('I')
+        self.calls    = array.array('I')
+        self.linenos  = array.array('i')
+        self.src_ctxs = array.array('I')
+        # row -> (caret sid, repeat)
+        self.extras: typ.Dict[int, typ.Tuple[int, int]] = {}
+
+        # traceback columns
+        self.exc_names     = array.array('I')
+        self.exc_msgs      = array.array('I')
+        self.flags         = array.array('B')
+        self.entry_offsets = array.array('Q', [0])
+
+    def __len__(self) -> int:
+        return len(self.exc_names)
+
+    @property
+    def num_entries(self) -> int:
+        return len(self.modules)
+
+    def append(self, tb_tup: com.Traceback) -> None:
+        intern = self.pool.intern
+        for module, call, lineno, src_ctx, caret, repeat in tb_tup.entries:
+            if caret or repeat:
+                self.extras[len(self.modules)] = (intern(caret), repeat)
+            self.modules.append(intern(module))
+            self.calls.append(intern(call))
+            if lineno.isdigit() and str(int(lineno)) == lineno:
+                self.linenos.append(int(lineno))
+            else:
+                self.linenos.append(-1 - intern(lineno))
+            self.src_ctxs.append(intern(src_ctx))
+
+        flags = (FLAG_IS_CAUSED if tb_tup.is_caused else 0) | (
+            FLAG_IS_CONTEXT if tb_tup.is_context else 0
+        )
+        self.exc_names.append(intern(tb_tup.exc_name))
+        self.exc_msgs.append(intern(tb_tup.exc_msg))
+        self.flags.append(flags)
+        self.entry_offsets.append(len(self.modules))
+
+    def extend(self, tracebacks: typ.Iterable[com.Traceback]) -> None:
+        for tb_tup in tracebacks:
+            self.append(tb_tup)
+
+    def entries(self, idx: int) -> com.Entries:
+        strings = self.pool.strings
+        start   = self.entry_offsets[idx]
+        end     = self.entry_offsets[idx + 1]
+
+        linenos = [
+            str(lineno) if lineno >= 0 else strings[-1 - lineno]
+            for lineno in self.linenos[start:end]
+        ]
+        entries = [
+            com.Entry(strings[module], strings[call], lineno, strings[src_ctx])
+            for module, call, lineno, src_ctx in zip(
+                self.modules[start:end], self.calls[start:end], linenos, self.src_ctxs[start:end]
+            )
+        ]
+        if self.extras:
+            for entry_idx in range(start, end):
+                extra = self.extras.get(entry_idx)
+                if extra:
+                    caret, repeat = extra
+                    entries[entry_idx - start] = entries[entry_idx - start]._replace(
+                        caret=strings[caret], repeat=repeat
+                    )
+        return entries
+
+    def __getitem__(self, idx: int) -> com.Traceback:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+
+        strings = self.pool.strings
+        flags   = self.flags[idx]
+        return com.Traceback(
+            exc_name=strings[self.exc_names[idx]],
+            exc_msg=strings[self.exc_msgs[idx]],
+            entries=self.entries(idx),
+            is_caused=bool(flags & FLAG_IS_CAUSED),
+            is_context=bool(flags & FLAG_IS_CONTEXT),
+        )
+
+    def __iter__(self) -> typ.Iterator[com.Traceback]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def iter_chains(self) -> typ.Iterator[com.Tracebacks]:
+        """Group the tracebacks into chains.
+
+        A traceback that is caused by or happened during the handling
+        of the previous traceback belongs to the same chain.
+        """
+        chain: com.Tracebacks = []
+        for tb_tup in self:
+            if chain and not (tb_tup.is_caused or tb_tup.is_context):
+                yield chain
+                chain = []
+            chain.append(tb_tup)
+        if chain:
+            yield chain
+
+    def nbytes(self) -> int:
+        """Size of the columns in bytes (excluding the string pool)."""
+        columns = (
+            self.modules,
+            self.calls,
+            self.linenos,
+            self.src_ctxs,
+            self.exc_names,
+            self.exc_msgs,
+            self.flags,
+            self.entry_offsets,
+        )
+        return sum(len(col) * col.itemsize for col in columns)
@@ -12,6 +12,12 @@ class Entry(typ.NamedTuple):
     lineno : str
     src_ctx: str
 
+    # markers below src_ctx (python 3.11+), aligned with src_ctx, e.g. "    ~~^~~"
+    caret: str = ""
+    # how often the entry was repeated after this one, which python
+    # writes as "[Previous line repeated 996 more times]"
+    repeat: int = 0
+
 
 Entries = typ.List[Entry]
 
@@ -25,9 +31,23 @@ class Traceback(typ.NamedTuple):
     is_caused : bool
     is_context: bool
 
+    # sub-exceptions of an exception group (PEP 654)
+    members: typ.Sequence['Member'] = ()
+
 
 Tracebacks = typ.List[Traceback]
 
+
+class Member(typ.NamedTuple):
+    """A distinct sub-exception of an exception group.
+
+    The tracebacks are the chain of the sub-exception, count is the
+    number of sub-exceptions of the group with the same fingerprint.
+    """
+
+    tracebacks: Tracebacks
+    count     : int = 1
+
 ALIASES_HEAD   = "Aliases for entries in sys.path:"
 TRACEBACK_HEAD = "Traceback (most recent call last):"
 CAUSE_HEAD     = "The above exception was the direct cause of the following exception:"
@@ -0,0 +1,93 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Detection of repeated tracebacks."""
+
+import time
+import hashlib
+import threading
+import typing as typ
+import collections
+
+import pretty_traceback.common as com
+
+# Upper bound for the number of fingerprints that are tracked.
+DEFAULT_MAX_FINGERPRINTS = 1000
+
+
+def fingerprint(tracebacks: com.Tracebacks) -> str:
+    """Stable id for a chain of tracebacks.
+
+    Only the names of the exceptions and the location of each entry
+    are used, messages are ignored since they often contain ids or
+    other values which differ between otherwise identical errors.
+    The distinct members of an exception group are included, but not
+    how often each of them occurred.
+    """
+    parts: typ.List[str] = []
+    for tb_tup in tracebacks:
+        parts.append(tb_tup.exc_name)
+        for entry in tb_tup.entries:
+            parts.extend((entry.module, entry.call, entry.lineno))
+        for member in tb_tup.members:
+            parts.append(fingerprint(member.tracebacks))
+        parts.append("")
+
+    digest = hashlib.blake2b("\0".join(parts).encode("utf-8", "replace"), digest_size=8)
+    return digest.hexdigest()
+
+
+class DuplicateTracker:
+    """Count occurrences of fingerprints within a time window.
+
+    At most max_size fingerprints are tracked, the least recently seen
+    fingerprint is dropped first. Instances are safe to use from
+    multiple threads.
+    """
+
+    def __init__(self, window: float, max_size: int = DEFAULT_MAX_FINGERPRINTS) -> None:
+        self.window   = window
+        self.max_size = max_size
+        self._lock    = threading.Lock()
+        # fingerprint -> [start of window, number of duplicates]
+        self._seen: typ.Dict[str, typ.List[float]] = collections.OrderedDict()
+
+    def count(self, fp: str, now: typ.Optional[float] = None) -> int:
+        """Register an occurrence of fp.
+
+        Returns the number of previous occurrences in the current window,
+        i.e. zero if fp is new or if the previous window has expired.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        seen = typ.cast(collections.OrderedDict, self._seen)
+        with self._lock:
+            entry = seen.get(fp)
+            if entry is None or now - entry[0] > self.window:
+                entry = [now, 0]
+                seen[fp] = entry
+            else:
+                entry[1] += 1
+            seen.move_to_end(fp)
+
+            while len(seen) > self.max_size:
+                seen.popitem(last=False)
+
+            return int(entry[1])
+
+
+def summary_line(tracebacks: com.Tracebacks, fp: str, num_duplicates: int) -> str:
+    if not tracebacks:
+        exc_line = "NoneType: None"
+    elif tracebacks[-1].exc_msg:
+        exc_line = tracebacks[-1].exc_name + ": " + tracebacks[-1].exc_msg
+    else:
+        exc_line = tracebacks[-1].exc_name
+
+    if num_duplicates == 1:
+        return f"{exc_line}  [traceback {fp} seen 1 more time]"
+    else:
+        return f"{exc_line}  [traceback {fp} seen {num_duplicates} more times]"
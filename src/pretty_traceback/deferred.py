@@ -0,0 +1,121 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Format exceptions of log records in a background thread.
+
+CapturingQueueHandler only takes a snapshot of the exception chain when
+a record is logged: names, messages and the locations of all entries.
+No source files are read, no paths are resolved and no terminal is
+probed. The snapshot holds no references to frames, so the locals of
+the failed code can be released immediately.
+
+The pretty formatting is done by the handlers of a QueueListener,
+i.e. in its thread, using LoggingFormatter (or JSONLoggingFormatter).
+
+Usage:
+
+    listener = deferred.start_listener([logging.StreamHandler()])
+    ...
+    listener.stop()
+"""
+
+import queue
+import typing as typ
+import logging
+import logging.handlers
+
+from pretty_traceback import formatting
+
+
+def _snapshot(
+    record: logging.LogRecord,
+    limits: typ.Optional[formatting.Limits] = None,
+) -> logging.LogRecord:
+    record = logging.makeLogRecord(record.__dict__)    # don't modify the original record
+
+    exc_info = record.exc_info
+    if exc_info and exc_info[1] is not None:
+        _, exc_value, traceback = exc_info
+        tracebacks = formatting.exc_to_tracebacks(
+            exc_value, traceback, lazy_src=True, limits=limits
+        )
+        setattr(record, formatting.TRACEBACKS_ATTR, tracebacks)
+
+    # Same as QueueHandler.prepare, except that the message is not
+    # formatted (that is up to the handlers of the listener).
+    record.message  = record.getMessage()
+    record.msg      = record.message
+    record.args     = None
+    record.exc_info = None
+    record.exc_text = None
+    return record
+
+
+class CapturingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler which defers the formatting of exceptions.
+
+    Records are put on the queue with a snapshot of their exception
+    (in the `pretty_tracebacks` attribute) instead of exc_info. The
+    handlers of the listener should use LoggingFormatter.
+
+    The snapshot is bounded by `limits` (default: formatting.DEFAULT_LIMITS),
+    which should match the limits of the formatters of the handlers.
+    """
+
+    def __init__(
+        self,
+        record_queue: queue.SimpleQueue,
+        limits      : typ.Optional[formatting.Limits] = None,
+    ) -> None:
+        super().__init__(record_queue)
+        self.limits = limits
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return _snapshot(record, self.limits)
+
+
+class DeferredListener(logging.handlers.QueueListener):
+    """QueueListener which detaches its CapturingQueueHandler when stopped."""
+
+    def __init__(
+        self,
+        logger  : logging.Logger,
+        handlers: typ.Sequence[logging.Handler],
+        limits  : typ.Optional[formatting.Limits] = None,
+    ) -> None:
+        record_queue: queue.SimpleQueue = queue.SimpleQueue()
+        super().__init__(record_queue, *handlers, respect_handler_level=True)
+        self.logger        = logger
+        self.queue_handler = CapturingQueueHandler(record_queue, limits)
+
+    def start(self) -> None:
+        super().start()
+        self.logger.addHandler(self.queue_handler)
+
+    def stop(self) -> None:
+        self.logger.removeHandler(self.queue_handler)
+        super().stop()
+
+
+def start_listener(
+    handlers: typ.Sequence[logging.Handler],
+    logger  : typ.Optional[logging.Logger] = None,
+    limits  : typ.Optional[formatting.Limits] = None,
+) -> DeferredListener:
+    """Log the records of logger (default: root) to handlers in a background thread.
+
+    A LoggingFormatter is set for any handler without a formatter.
+    The snapshots of exceptions (and the default formatters) are
+    bounded by `limits`.
+    Call .stop() on the returned listener to flush pending records.
+    """
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatting.LoggingFormatter(limits=limits))
+
+    _logger  = logging.getLogger() if logger is None else logger
+    listener = DeferredListener(_logger, handlers, limits)
+    listener.start()
+    return listener
@@ -0,0 +1,542 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Parsing of tracebacks in the formats found in logs.
+
+Besides the default format of python, logs contain the dumps of
+faulthandler, the long and short reports of pytest, the output of
+IPython and the tracebacks of multiprocessing, which include the
+traceback of the worker process.
+
+Each format is detected by the first line of its tracebacks. The text
+between tracebacks is only scanned with str.find, for a marker of each
+format. The lines of a traceback are only handled by the parser of its
+format.
+"""
+
+import re
+import typing as typ
+
+import pretty_traceback.common as com
+from pretty_traceback import parsing
+
+Lines  = typ.List[str]
+Chains = typ.List[com.Tracebacks]
+
+# The chains of tracebacks that were parsed and the index of the
+# first line after them, or None if the lines were not a traceback
+# after all.
+ParseResult = typ.Optional[typ.Tuple[Chains, int]]
+
+# Called with all lines of the text and the index of a line that
+# matched the head_re of the format.
+ParseFunc = typ.Callable[[Lines, int], ParseResult]
+
+
+class TracebackFormat(typ.NamedTuple):
+
+    name: str
+    # Text that is part of the first line of every traceback. The text is
+    # searched for with str.find, head_re is only matched against the lines
+    # which contain the marker.
+    marker : str
+    head_re: typ.Pattern[str]
+    parse  : ParseFunc
+
+
+FORMATS: typ.List[TracebackFormat] = []
+
+
+def register_format(fmt: TracebackFormat) -> None:
+    """Add a format, or replace the format with the same name.
+
+    Formats that were registered first take precedence for lines that
+    are matched by the head_re of more than one format.
+    """
+    for i, other in enumerate(FORMATS):
+        if other.name == fmt.name:
+            FORMATS[i] = fmt
+            return
+    FORMATS.append(fmt)
+
+
+def _skip_blank(lines: Lines, idx: int) -> int:
+    while idx < len(lines) and not lines[idx].strip():
+        idx += 1
+    return idx
+
+
+def _next_link(lines: Lines, idx: int) -> typ.Optional[typ.Tuple[int, bool, bool]]:
+    """Skip the head of a chained exception, if the next line is one.
+
+    Returns the index after the head and the is_caused and is_context
+    flags of the next traceback in the chain.
+    """
+    idx = _skip_blank(lines, idx)
+    if idx < len(lines):
+        stripped = lines[idx].strip()
+        if stripped.startswith(com.CAUSE_HEAD):
+            return (_skip_blank(lines, idx + 1), True, False)
+        if stripped.startswith(com.CONTEXT_HEAD):
+            return (_skip_blank(lines, idx + 1), False, True)
+    return None
+
+
+def _split_exc_line(exc_line: str) -> typ.Tuple[str, str]:
+    if ": " in exc_line:
+        exc_name, exc_msg = exc_line.split(": ", 1)
+        return (exc_name, exc_msg)
+    else:
+        return (exc_line, "")
+
+
+# python
+
+PYTHON_HEAD_RE = re.compile(r"[ \t]*Traceback \(most recent call last\):")
+
+
+def _parse_python_chain(lines: Lines, idx: int) -> typ.Tuple[com.Tracebacks, int]:
+    tracebacks: com.Tracebacks = []
+    is_caused  = False
+    is_context = False
+
+    while idx < len(lines):
+        if lines[idx].lstrip().startswith(com.TRACEBACK_HEAD):
+            idx += 1
+
+        start = idx
+        while idx < len(lines) and lines[idx].startswith("  "):
+            idx += 1
+        entry_lines = lines[start:idx]
+
+        idx = _skip_blank(lines, idx)
+        if idx < len(lines):
+            exc_line = lines[idx].strip()
+            idx += 1
+        else:
+            exc_line = parsing.TRUNCATED_EXC_NAME
+
+        tracebacks.append(parsing.init_traceback(entry_lines, exc_line, is_caused, is_context))
+
+        link = _next_link(lines, idx)
+        if link is None:
+            break
+        idx, is_caused, is_context = link
+
+    return (tracebacks, idx)
+
+
+def _parse_python(lines: Lines, idx: int) -> ParseResult:
+    tracebacks, idx = _parse_python_chain(lines, idx)
+    return ([tracebacks], idx)
+
+
+# multiprocessing
+
+REMOTE_HEAD_RE = re.compile(r"[\w.]*RemoteTraceback: ?$")
+
+
+def _parse_remote(lines: Lines, idx: int) -> ParseResult:
+    # The traceback of the worker is quoted, followed by the chain of the
+    # exception that was raised again in the parent process.
+    #
+    #   multiprocessing.pool.RemoteTraceback:
+    #   """
+    #   Traceback (most recent call last):
+    #   ...
+    #   ValueError: bad value
+    #   """
+    #
+    #   The above exception was the direct cause of the following exception:
+    #
+    #   Traceback (most recent call last):
+    #   ...
+    if idx + 1 >= len(lines) or lines[idx + 1].strip() != '"""':
+        return None
+
+    idx   = idx + 2
+    start = idx
+    while idx < len(lines) and lines[idx].strip() != '"""':
+        idx += 1
+
+    tracebacks = parsing.parse_tracebacks("\n".join(lines[start:idx]))
+    if idx < len(lines):
+        idx += 1
+        link = _next_link(lines, idx)
+        if link is not None and link[0] < len(lines):
+            local_tracebacks, idx = _parse_python_chain(lines, link[0])
+            local_tracebacks[0] = local_tracebacks[0]._replace(
+                is_caused=link[1], is_context=link[2]
+            )
+            tracebacks.extend(local_tracebacks)
+
+    return ([tracebacks], idx)
+
+
+# faulthandler
+
+FAULT_ENTRY_RE = re.compile(
+    r'  File "(?P<module>[^"]+)", line (?P<lineno>\d+|\?\?\?) in (?P<call>.*)'
+)
+
+FAULT_MARKER = "(most recent call first):"
+
+FAULT_THREAD_RE = re.compile(
+    r"((?:Current thread|Thread) 0x[0-9a-fA-F]+|Stack) \(most recent call first\):"
+)
+
+FATAL_PREFIX = "Fatal Python error: "
+
+# lines between the fatal error and the first thread, e.g. "Python runtime state: initialized"
+FAULT_MAX_PREAMBLE = 4
+
+
+def _parse_fault_thread(
+    lines: Lines, idx: int, exc_name: str, exc_msg: str
+) -> typ.Tuple[com.Traceback, int]:
+    entries: com.Entries = []
+    while idx < len(lines) and lines[idx].startswith("  "):
+        match = FAULT_ENTRY_RE.match(lines[idx])
+        # NOTE: other indented lines are "  <no Python frame>" and "  ..."
+        #   if the stack was too deep.
+        if match:
+            module, lineno, call = match.groups()
+            entries.append(com.Entry(module, call, lineno, ""))
+        idx += 1
+
+    # faulthandler writes the most recent call first
+    entries.reverse()
+    tb_tup = com.Traceback(exc_name, exc_msg, entries, is_caused=False, is_context=False)
+    return (tb_tup, idx)
+
+
+def _fatal_msg(lines: Lines, idx: int) -> str:
+    # NOTE: Only the lines of the threads are detected, the fatal error
+    #   (if there is one) is written a few lines before the first thread.
+    for line in reversed(lines[max(0, idx - FAULT_MAX_PREAMBLE - 1) : idx]):
+        if line.startswith(FATAL_PREFIX):
+            return line[len(FATAL_PREFIX) :].strip()
+    return ""
+
+
+def _parse_faulthandler(lines: Lines, idx: int) -> ParseResult:
+    fatal_msg = _fatal_msg(lines, idx)
+
+    chains: Chains = []
+    while True:
+        label = typ.cast(typ.Match[str], FAULT_THREAD_RE.match(lines[idx])).group(1)
+        if fatal_msg and not label.startswith("Thread "):
+            exc_name, exc_msg = ("Fatal Python error", fatal_msg)
+        else:
+            exc_name, exc_msg = (label, "")
+
+        tb_tup, idx = _parse_fault_thread(lines, idx + 1, exc_name, exc_msg)
+        chains.append([tb_tup])
+
+        next_idx = _skip_blank(lines, idx)
+        if next_idx < len(lines) and FAULT_THREAD_RE.match(lines[next_idx]):
+            idx = next_idx
+        else:
+            break
+
+    if idx < len(lines) and lines[idx].startswith("Extension modules: "):
+        idx += 1
+    return (chains, idx)
+
+
+# pytest
+
+# the header of a failed test, e.g. "________ test_helper ________"
+PYTEST_HEAD_RE = re.compile(r"_{3,} \S.* _{3,}$")
+
+# location of an entry in a report of pytest
+#   "test_app.py:12: in helper"  (--tb=short, or for entries in the middle)
+#   "test_app.py:14: "           (end of a section for --tb=long)
+#   "test_app.py:14: KeyError"   (end of the section with the exception)
+PYTEST_LOCATION_RE = re.compile(r"(?P<module>\S.*?):(?P<lineno>\d+): ?(?P<rest>.*)")
+
+PYTEST_LOCALS_RE = re.compile(r"[A-Za-z_]\w* = ")
+
+PYTEST_DEF_RE = re.compile(r"\s*(?:async\s+)?def\s+(\w+)")
+
+
+class _PytestLink:
+
+    def __init__(self, is_caused: bool, is_context: bool) -> None:
+        self.is_caused  = is_caused
+        self.is_context = is_context
+        self.entries: com.Entries = []
+        self.exc_name = ""
+        self.exc_line = ""
+
+        # state of the current section of the long format
+        self.call    = ""
+        self.src_ctx = ""
+
+    def traceback(self) -> com.Traceback:
+        exc_name, exc_msg = _split_exc_line(self.exc_line)
+        if self.exc_name and exc_name != self.exc_name:
+            # e.g. "E       assert 1 == 2" of an AssertionError
+            exc_name, exc_msg = (self.exc_name, self.exc_line)
+        elif not exc_name:
+            exc_name = parsing.TRUNCATED_EXC_NAME
+        elif exc_name.startswith("assert "):
+            exc_name, exc_msg = ("AssertionError", self.exc_line)
+
+        return com.Traceback(
+            exc_name=exc_name,
+            exc_msg=exc_msg,
+            entries=self.entries,
+            is_caused=self.is_caused,
+            is_context=self.is_context,
+        )
+
+
+def _parse_pytest(lines: Lines, idx: int) -> ParseResult:
+    tracebacks: com.Tracebacks = []
+    link = _PytestLink(is_caused=False, is_context=False)
+
+    idx += 1
+    while idx < len(lines):
+        line = lines[idx]
+        if not line.strip() or line.startswith("_ _ "):
+            idx += 1
+        elif line.startswith(" "):
+            # source of the function of a section
+            def_match = PYTEST_DEF_RE.match(line)
+            if def_match:
+                link.call = def_match.group(1)
+            idx += 1
+        elif line.startswith(">"):
+            link.src_ctx = line[1:].strip()
+            idx += 1
+        elif line == "E" or line.startswith("E "):
+            if not link.exc_line:
+                link.exc_line = line[1:].strip()
+            idx += 1
+        elif line.startswith((com.CAUSE_HEAD, com.CONTEXT_HEAD)):
+            tracebacks.append(link.traceback())
+            is_caused = line.startswith(com.CAUSE_HEAD)
+            link      = _PytestLink(is_caused=is_caused, is_context=not is_caused)
+            idx += 1
+        elif PYTEST_LOCALS_RE.match(line):
+            idx += 1
+        else:
+            loc_match = PYTEST_LOCATION_RE.match(line)
+            if loc_match is None:
+                break
+
+            module, lineno, rest = loc_match.groups()
+            idx += 1
+            if rest.startswith("in "):
+                src_ctx = ""
+                if idx < len(lines) and lines[idx].startswith("    "):
+                    src_ctx = lines[idx].strip()
+                    idx += 1
+                link.entries.append(com.Entry(module, rest[3:], lineno, src_ctx))
+            else:
+                link.entries.append(com.Entry(module, link.call, lineno, link.src_ctx))
+                link.call    = ""
+                link.src_ctx = ""
+                if rest.strip():
+                    link.exc_name = rest.strip()
+
+    if link.entries or link.exc_line:
+        tracebacks.append(link.traceback())
+    if not tracebacks:
+        return None
+    return ([tracebacks], idx)
+
+
+# IPython
+
+# NOTE: IPython may write the output with colors
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+IPYTHON_MARKER = "Traceback (most recent call last)"
+
+# e.g. "KeyError                 Traceback (most recent call last)"
+IPYTHON_HEAD_RE = re.compile(r"\S+\s+Traceback \(most recent call last\)(?:\x1b\[[0-9;]*m)*\s*$")
+
+# "File /app/calc.py:6, in run(values={})" or "Cell In[3], line 2"
+IPYTHON_FRAME_RE = re.compile(
+    r"""
+    (?:
+        File\s(?P<module>.+?):(?P<lineno>\d+)
+        |
+        Cell\s(?P<cell>In\s?\[\d*\]),\sline\s(?P<cell_lineno>\d+)
+    )
+    (?:,\sin\s(?P<call>[^(]+))?
+    """,
+    flags=re.VERBOSE,
+)
+
+# the line that was executed, e.g. "----> 6     total = lookup(values)"
+IPYTHON_ARROW_RE = re.compile(r"-*> *\d+ (?P<src_ctx>.*)")
+
+
+def _parse_ipython_chain(lines: Lines, idx: int) -> typ.Tuple[com.Tracebacks, int]:
+    tracebacks: com.Tracebacks = []
+    is_caused  = False
+    is_context = False
+
+    while True:
+        entries: com.Entries = []
+        exc_line = parsing.TRUNCATED_EXC_NAME
+
+        idx += 1
+        while idx < len(lines):
+            line = ANSI_RE.sub("", lines[idx]) if "\x1b" in lines[idx] else lines[idx]
+            if not line.strip() or line.startswith(" "):
+                # context of the source and the values of variables
+                idx += 1
+                continue
+
+            arrow_match = IPYTHON_ARROW_RE.match(line)
+            if arrow_match:
+                if entries:
+                    entries[-1] = entries[-1]._replace(src_ctx=arrow_match.group("src_ctx").strip())
+                idx += 1
+                continue
+
+            frame_match = IPYTHON_FRAME_RE.match(line)
+            if frame_match:
+                module = frame_match.group("module") or frame_match.group("cell")
+                lineno = frame_match.group("lineno") or frame_match.group("cell_lineno")
+                call   = (frame_match.group("call") or "<module>").strip()
+                entries.append(com.Entry(module, call, lineno, ""))
+                idx += 1
+                continue
+
+            exc_line = line.strip()
+            idx += 1
+            break
+
+        exc_name, exc_msg = _split_exc_line(exc_line)
+        tracebacks.append(com.Traceback(exc_name, exc_msg, entries, is_caused, is_context))
+
+        link = _next_link(lines, idx)
+        if link is None:
+            return (tracebacks, idx)
+
+        head_idx = link[0]
+        while head_idx < len(lines) and lines[head_idx].startswith("---"):
+            head_idx += 1
+        if head_idx >= len(lines) or not IPYTHON_HEAD_RE.match(lines[head_idx]):
+            return (tracebacks, idx)
+
+        idx, is_caused, is_context = head_idx, link[1], link[2]
+
+
+def _parse_ipython(lines: Lines, idx: int) -> ParseResult:
+    tracebacks, idx = _parse_ipython_chain(lines, idx)
+    return ([tracebacks], idx)
+
+
+register_format(TracebackFormat("remote", "RemoteTraceback:", REMOTE_HEAD_RE, _parse_remote))
+register_format(TracebackFormat("python", com.TRACEBACK_HEAD, PYTHON_HEAD_RE, _parse_python))
+register_format(
+    TracebackFormat("faulthandler", FAULT_MARKER, FAULT_THREAD_RE, _parse_faulthandler)
+)
+register_format(TracebackFormat("pytest", "___ ", PYTEST_HEAD_RE, _parse_pytest))
+register_format(TracebackFormat("ipython", IPYTHON_MARKER, IPYTHON_HEAD_RE, _parse_ipython))
+
+
+def _iter_heads(
+    text: str, lines: Lines, formats: typ.Sequence[TracebackFormat]
+) -> typ.Generator[typ.Tuple[int, TracebackFormat], typ.Optional[int], None]:
+    """Find the first lines of tracebacks.
+
+    Yields the index of the line and its format. The index of the line
+    after the traceback is sent back, where the search continues.
+    """
+    # NOTE: Each marker is searched for with str.find, which is much faster
+    #   than matching a regular expression at every position of the text.
+    marker_pos = {fmt.marker: text.find(fmt.marker) for fmt in formats}
+
+    pos      = 0
+    line_idx = 0
+    while True:
+        for marker, marker_idx in marker_pos.items():
+            if 0 <= marker_idx < pos:
+                marker_pos[marker] = text.find(marker, pos)
+
+        hits = [marker_idx for marker_idx in marker_pos.values() if marker_idx >= 0]
+        if not hits:
+            return
+
+        line_start = text.rfind("\n", 0, min(hits)) + 1
+        line_idx += text.count("\n", pos, line_start)
+        pos  = line_start
+        line = lines[line_idx]
+
+        end_idx = line_idx + 1
+        for fmt in formats:
+            if fmt.marker in line and fmt.head_re.match(line):
+                parsed_idx = yield (line_idx, fmt)
+                end_idx    = max(end_idx, parsed_idx or 0)
+                break
+
+        for line in lines[line_idx:end_idx]:
+            pos += len(line) + 1
+        line_idx = end_idx
+
+
+def _normalize(text: str) -> str:
+    if "\r" in text:
+        return text.replace("\r\n", "\n")
+    else:
+        return text
+
+
+def iter_chains(
+    text: str, formats: typ.Optional[typ.Sequence[TracebackFormat]] = None
+) -> typ.Iterator[com.Tracebacks]:
+    """Parse the chains of tracebacks in text, in any of the formats."""
+    if formats is None:
+        formats = FORMATS
+
+    text  = _normalize(text)
+    lines = text.split("\n")
+    heads = _iter_heads(text, lines, formats)
+    head  = next(heads, None)
+    while head is not None:
+        line_idx, fmt = head
+        result = fmt.parse(lines, line_idx)
+        if result is None:
+            end_idx = line_idx + 1
+        else:
+            chains, end_idx = result
+            for chain in chains:
+                yield chain
+
+        try:
+            head = heads.send(end_idx)
+        except StopIteration:
+            head = None
+
+
+def parse_tracebacks(
+    text: str, formats: typ.Optional[typ.Sequence[TracebackFormat]] = None
+) -> com.Tracebacks:
+    """Parse the tracebacks in text, in any of the formats.
+
+    The tracebacks of all chains are returned as one list, the first
+    traceback of each chain has neither is_caused nor is_context set.
+    """
+    tracebacks: com.Tracebacks = []
+    for chain in iter_chains(text, formats):
+        tracebacks.extend(chain)
+    return tracebacks
+
+
+def detect_format(text: str) -> typ.Optional[str]:
+    """Name of the format of the first traceback in text."""
+    text = _normalize(text)
+    head = next(_iter_heads(text, text.split("\n"), FORMATS), None)
+    if head is None:
+        return None
+    else:
+        return head[1].name
@@ -7,21 +7,48 @@
 import os
 import re
 import sys
+import time
 import types
 import typing as typ
 import logging
-import traceback as tb
+import linecache
+import threading
 import subprocess as sp
 import collections
 
 import colorama
 
 import pretty_traceback.common as com
+from pretty_traceback import dedup
 
 DEFAULT_COLUMNS = 80
 
+# Columns reported by `stty size`, which is only used if the terminal size
+# can't be queried directly. Spawning stty is slow, so it's done at most once.
+_stty_columns: typ.Optional[int] = None
 
-def _get_terminal_width() -> int:
+
+def _stty_terminal_width() -> int:
+    # pylint:disable=global-statement   ; module level cache
+    global _stty_columns
+
+    if _stty_columns is None:
+        _stty_columns = DEFAULT_COLUMNS
+        try:
+            size_output = sp.check_output(['stty', 'size']).decode()
+            _, columns = [int(val) for val in size_output.strip().split()]
+            _stty_columns = columns
+        except sp.CalledProcessError:
+            pass
+        except IOError:
+            pass
+        except ValueError:
+            pass
+
+    return _stty_columns
+
+
+def _get_terminal_width(stream: typ.Optional[typ.IO[str]] = None) -> int:
     try:
         columns = int(os.environ['COLUMNS'])
         # lines   = int(os.environ['LINES'  ])
@@ -29,48 +56,155 @@ def _get_terminal_width() -> int:
     except (KeyError, ValueError):
         pass
 
-    if not sys.stdout.isatty():
+    if stream is None:
+        stream = sys.stdout
+
+    try:
+        if not stream.isatty():
+            return DEFAULT_COLUMNS
+        fd = stream.fileno()
+    except (AttributeError, ValueError, OSError):
+        # closed, detached or not a real file
         return DEFAULT_COLUMNS
 
+    # NOTE: os.get_terminal_size is a single ioctl, cheap enough to do for
+    #   every traceback, so the width is current even after a resize.
     if hasattr(os, 'get_terminal_size'):
         try:
-            size = os.get_terminal_size(0)
-            return size.columns
+            return os.get_terminal_size(fd).columns
         except OSError:
             pass
 
-    try:
-        size_output = sp.check_output(['stty', 'size']).decode()
-        _, columns = [int(val) for val in size_output.strip().split()]
-        return columns
-    except sp.CalledProcessError:
-        pass
-    except IOError:
-        pass
+    return _stty_terminal_width()
 
-    return DEFAULT_COLUMNS
 
+class Theme(typ.NamedTuple):
+    """ANSI escape sequences for each part of a traceback.
 
-FMT_MODULE : str = colorama.Fore.CYAN + colorama.Style.NORMAL + "{0}" + colorama.Style.RESET_ALL
-FMT_CALL   : str = colorama.Fore.YELLOW + colorama.Style.NORMAL + "{0}" + colorama.Style.RESET_ALL
-FMT_LINENO : str = colorama.Fore.MAGENTA + colorama.Style.NORMAL + "{0}" + colorama.Style.RESET_ALL
-FMT_CONTEXT: str = "{0}"
+    Each sequence is written before its part, the style is reset
+    after each part (unless the sequence is empty).
+    """
 
-FMT_ERROR_NAME: str = colorama.Fore.RED + colorama.Style.BRIGHT + "{0}" + colorama.Style.RESET_ALL
-FMT_ERROR_MSG : str = colorama.Style.BRIGHT + "{0}" + colorama.Style.RESET_ALL
+    module    : str = colorama.Fore.CYAN + colorama.Style.NORMAL
+    call      : str = colorama.Fore.YELLOW + colorama.Style.NORMAL
+    lineno    : str = colorama.Fore.MAGENTA + colorama.Style.NORMAL
+    context   : str = ""
+    error_name: str = colorama.Fore.RED + colorama.Style.BRIGHT
+    error_msg : str = colorama.Style.BRIGHT
 
+    # added to module, call and lineno of entries in the current directory
+    pwd: str = colorama.Style.BRIGHT
 
-class Row(typ.NamedTuple):
 
-    alias       : str
-    short_module: str
-    full_module : str
-    call        : str
-    lineno      : str
-    context     : str
+DEFAULT_THEME = Theme()
+
+# used if color is disabled
+_PLAIN_THEME = Theme("", "", "", "", "", "", "")
+
+
+def _fmt(style: str) -> str:
+    return style + "{0}" + colorama.Style.RESET_ALL if style else "{0}"
+
+
+FMT_MODULE : str = _fmt(DEFAULT_THEME.module)
+FMT_CALL   : str = _fmt(DEFAULT_THEME.call)
+FMT_LINENO : str = _fmt(DEFAULT_THEME.lineno)
+FMT_CONTEXT: str = _fmt(DEFAULT_THEME.context)
+
+FMT_ERROR_NAME: str = _fmt(DEFAULT_THEME.error_name)
+FMT_ERROR_MSG : str = _fmt(DEFAULT_THEME.error_msg)
+
+
+class RowPlan(typ.NamedTuple):
+    """Pre-joined separators and ANSI sequences between the parts of a row."""
+
+    module_open : str
+    lineno_open : str
+    lineno_close: str
+    call_open   : str
+    context_open: str
+    line_close  : str
+    caret_open  : str
 
 
-class PaddedRow(typ.NamedTuple):
+class RenderPlan(typ.NamedTuple):
+
+    row    : RowPlan
+    pwd_row: RowPlan
+
+    alias_path_open : str
+    alias_path_close: str
+
+    error_name_open : str
+    error_name_close: str
+    error_msg_open  : str
+    error_msg_close : str
+
+
+def _reset(style: str) -> str:
+    return colorama.Style.RESET_ALL if style else ""
+
+
+def _init_row_plan(module: str, lineno: str, call: str, context: str) -> RowPlan:
+    return RowPlan(
+        module_open=" " + module,
+        lineno_open=_reset(module) + ":" + lineno,
+        lineno_close=_reset(lineno),
+        call_open="  " + call,
+        context_open=_reset(call) + "  " + context,
+        line_close=_reset(context),
+        caret_open=context,
+    )
+
+
+def _pwd_style(style: str, pwd: str) -> str:
+    # an explicit normal intensity would be redundant
+    if pwd:
+        return style.replace(colorama.Style.NORMAL, "") + pwd
+    else:
+        return style
+
+
+def _init_render_plan(theme: Theme) -> RenderPlan:
+    pwd = theme.pwd
+    return RenderPlan(
+        row=_init_row_plan(theme.module, theme.lineno, theme.call, theme.context),
+        pwd_row=_init_row_plan(
+            _pwd_style(theme.module, pwd),
+            _pwd_style(theme.lineno, pwd),
+            _pwd_style(theme.call, pwd),
+            theme.context,
+        ),
+        alias_path_open=": " + theme.module,
+        alias_path_close=_reset(theme.module),
+        error_name_open=theme.error_name,
+        error_name_close=_reset(theme.error_name),
+        error_msg_open=": " + theme.error_msg,
+        error_msg_close=_reset(theme.error_msg),
+    )
+
+
+# Upper bound for the number of cached render plans (one per theme).
+MAX_RENDER_PLANS = 64
+
+_render_plans: typ.Dict[Theme, RenderPlan] = {}
+
+
+def _get_render_plan(color: bool, theme: typ.Optional[Theme] = None) -> RenderPlan:
+    if color:
+        _theme = theme or DEFAULT_THEME
+    else:
+        _theme = _PLAIN_THEME
+
+    plan = _render_plans.get(_theme)
+    if plan is None:
+        if len(_render_plans) >= MAX_RENDER_PLANS:
+            _render_plans.clear()
+        plan = _render_plans[_theme] = _init_render_plan(_theme)
+    return plan
+
+
+class Row(typ.NamedTuple):
 
     alias       : str
     short_module: str
@@ -78,6 +212,8 @@ class PaddedRow(typ.NamedTuple):
     call        : str
     lineno      : str
     context     : str
+    # markers below the context (python 3.11+), aligned with the context
+    caret: str = ""
 
 
 Alias  = str
@@ -103,21 +239,117 @@ class Context(typ.NamedTuple):
     max_call_len   : int
     max_context_len: int
 
+    # lines for omitted entries, inserted before the row with the given index
+    # (or after the last row)
+    markers: typ.Dict[int, str] = {}
+
+
+# Upper bound for the number of resolved entry paths that are cached.
+PATH_CACHE_MAXSIZE = 1024
+
+# If enabled, a cached path is only used if the (st_ino, st_mtime_ns) of
+# the file are unchanged. This costs one stat per entry, but guards against
+# files that are created or replaced while the process is running.
+PATH_CACHE_VALIDATE = False
+
+
+class PathCacheInfo(typ.NamedTuple):
+
+    hits    : int
+    misses  : int
+    maxsize : int
+    currsize: int
+
+
+FileSig = typ.Optional[typ.Tuple[int, int]]
+
+PathCacheKey   = typ.Tuple[str, str]    # (module, cwd)
+PathCacheValue = typ.Tuple[str, FileSig]
+
+_path_cache: typ.Dict[PathCacheKey, PathCacheValue] = collections.OrderedDict()
+_path_cache_lock   = threading.Lock()
+_path_cache_hits   = 0
+_path_cache_misses = 0
+
+
+def path_cache_info() -> PathCacheInfo:
+    """Statistics of the cache used to resolve paths of traceback entries."""
+    return PathCacheInfo(_path_cache_hits, _path_cache_misses, PATH_CACHE_MAXSIZE, len(_path_cache))
+
+
+def path_cache_clear() -> None:
+    # pylint:disable=global-statement   ; module level cache
+    global _path_cache_hits
+    global _path_cache_misses
+
+    with _path_cache_lock:
+        _path_cache.clear()
+        _path_cache_hits   = 0
+        _path_cache_misses = 0
+
+
+def _file_sig(path: str) -> FileSig:
+    try:
+        stat = os.stat(path)
+        return (stat.st_ino, stat.st_mtime_ns)
+    except (OSError, ValueError):
+        return None
+
+
+def _resolve_entry_path(module: str, cwd: str) -> PathCacheValue:
+    module_abspath = os.path.normpath(os.path.join(cwd, module))
+    if module_abspath == module:
+        # already an absolute path, nothing to check on the filesystem
+        return (module, None)
+
+    sig = _file_sig(module_abspath)
+    if sig is None:
+        return (module, None)
+    else:
+        return (module_abspath, sig)
+
 
 def _iter_entry_paths(entries: com.Entries) -> typ.Iterable[str]:
+    # pylint:disable=global-statement   ; module level cache
+    global _path_cache_hits
+    global _path_cache_misses
+
+    cwd   = os.getcwd()
+    cache = typ.cast(collections.OrderedDict, _path_cache)
     for entry in entries:
-        module_abspath   = os.path.abspath(entry.module)
-        is_valid_abspath = module_abspath != entry.module and os.path.exists(module_abspath)
-        if is_valid_abspath:
-            yield module_abspath
+        key = (entry.module, cwd)
+        with _path_cache_lock:
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+
+        is_stale = False
+        if PATH_CACHE_VALIDATE and cached and cached[1]:
+            is_stale = _file_sig(cached[0]) != cached[1]
+
+        if cached is None or is_stale:
+            cached = _resolve_entry_path(entry.module, cwd)
+            with _path_cache_lock:
+                _path_cache_misses += 1
+                cache[key] = cached
+                while len(cache) > PATH_CACHE_MAXSIZE:
+                    cache.popitem(last=False)
         else:
-            yield entry.module
+            with _path_cache_lock:
+                _path_cache_hits += 1
+
+        yield cached[0]
 
 
 # used by unit tests to override paths
 TEST_PATHS: typ.List[str] = []
 
-PWD = os.getcwd()
+# used by unit tests to override the working directory (os.getcwd() if None)
+PWD: typ.Optional[str] = None
+
+
+def _pwd() -> str:
+    return PWD or os.getcwd()
 
 
 def _py_paths() -> typ.List[str]:
@@ -140,36 +372,130 @@ def _py_paths() -> typ.List[str]:
     return paths
 
 
-def _iter_used_py_paths(entry_paths: typ.List[str]) -> typ.Iterable[str]:
-    _uniq_entry_paths = set(entry_paths)
+def _py_path_alias(py_path: str, pwd: str) -> Alias:
+    # An empty alias means that the path gets a numbered alias (<p0>, <p1>...)
+    if py_path.endswith("site-packages"):
+        return "<site>"
+    elif py_path.endswith("dist-packages"):
+        return "<dist>"
+    elif re.search(r"lib/python\d.\d+$", py_path):
+        return "<py>"
+    elif re.search(r"lib/Python\d.\d+\\lib$", py_path):
+        return "<py>"
+    elif py_path.startswith(pwd):
+        return "<pwd>"
+    else:
+        return ""
+
+
+# Upper bound for the number of entry paths memoized per index.
+MAX_INDEX_MATCHES = 10000
+
+
+class PyPathIndex(typ.NamedTuple):
+    """Lookup table for the preferred sys.path prefix of a module path.
+
+    A path matches the py_path with the lowest rank (i.e. the first in
+    the order of `_py_paths`) that is a prefix of it. Rather than testing
+    every py_path, only one dict lookup is done per distinct prefix length.
+    """
+
+    ranks  : typ.Dict[str, int]
+    aliases: typ.Dict[str, Alias]
+    # distinct lengths of all py_paths, longest first
+    lengths: typ.List[int]
+    # if the ranks are ordered by length, the first match is the best
+    is_len_sorted: bool
+    # memo of entry_path -> py_path (or None if no py_path matches)
+    matches: typ.Dict[str, typ.Optional[str]]
+    # working directory for which the aliases were computed
+    pwd: str
+
+
+def _init_py_path_index(py_paths: typ.List[str], pwd: str) -> PyPathIndex:
+    ranks: typ.Dict[str, int] = {}
+    for rank, py_path in enumerate(py_paths):
+        if py_path and py_path not in ranks:
+            ranks[py_path] = rank
+
+    aliases       = {py_path: _py_path_alias(py_path, pwd) for py_path in ranks}
+    lengths       = sorted({len(py_path) for py_path in ranks}, reverse=True)
+    path_lens     = [len(py_path) for py_path in ranks]
+    is_len_sorted = path_lens == sorted(path_lens, reverse=True)
+    return PyPathIndex(ranks, aliases, lengths, is_len_sorted, matches={}, pwd=pwd)
+
+
+# cache key (the sys.path snapshot and the working directory) and the
+# index that was built for it
+_py_path_index_key  : typ.Tuple[typ.List[str], str] = ([], "")
+_py_path_index_cache: typ.Optional[PyPathIndex] = None
+
+
+def _get_py_path_index() -> PyPathIndex:
+    # pylint:disable=global-statement   ; module level cache
+    global _py_path_index_key
+    global _py_path_index_cache
+
+    # NOTE: Comparing with the snapshot is a single list comparison,
+    #   which is much cheaper than the copy and sort done by _py_paths.
+    paths_src          = TEST_PATHS or sys.path
+    pwd                = _pwd()
+    key_paths, key_pwd = _py_path_index_key
+    if _py_path_index_cache and key_pwd == pwd and key_paths == paths_src:
+        return _py_path_index_cache
+
+    index = _init_py_path_index(_py_paths(), pwd)
+    _py_path_index_key   = (list(paths_src), pwd)
+    _py_path_index_cache = index
+    return index
+
+
+def _match_py_path(index: PyPathIndex, entry_path: str) -> typ.Optional[str]:
+    matches = index.matches
+    if entry_path in matches:
+        return matches[entry_path]
+
+    ranks     = index.ranks
+    best_path = None
+    best_rank = len(ranks)
+    path_len  = len(entry_path)
+    for length in index.lengths:
+        if length > path_len:
+            continue
+
+        prefix = entry_path[:length]
+        rank   = ranks.get(prefix)
+        if rank is not None and rank < best_rank:
+            best_path = prefix
+            best_rank = rank
+            if index.is_len_sorted:
+                break
+
+    if len(matches) >= MAX_INDEX_MATCHES:
+        matches.clear()
+    matches[entry_path] = best_path
+    return best_path
 
-    for py_path in _py_paths():
-        is_path_used = False
-        for entry_path in list(_uniq_entry_paths):
-            if entry_path.startswith(py_path):
-                is_path_used = True
-                _uniq_entry_paths.remove(entry_path)
 
-        if is_path_used:
-            yield py_path
+def _iter_used_py_paths(index: PyPathIndex, entry_paths: typ.Iterable[str]) -> typ.Iterable[str]:
+    used_paths = set()
+    for entry_path in set(entry_paths):
+        py_path = _match_py_path(index, entry_path)
+        if py_path is not None:
+            used_paths.add(py_path)
 
+    return sorted(used_paths, key=index.ranks.__getitem__)
 
-def _iter_alias_prefixes(entry_paths: typ.List[str]) -> typ.Iterable[AliasPrefix]:
+
+def _iter_alias_prefixes(entry_paths: typ.Iterable[str]) -> typ.Iterable[AliasPrefix]:
+    index       = _get_py_path_index()
     alias_index = 0
 
-    for py_path in _iter_used_py_paths(entry_paths):
-        if py_path.endswith("site-packages"):
-            alias = "<site>"
-        elif py_path.endswith("dist-packages"):
-            alias = "<dist>"
-        elif re.search(r"lib/python\d.\d+$", py_path):
-            alias = "<py>"
-        elif re.search(r"lib/Python\d.\d+\\lib$", py_path):
-            alias = "<py>"
-        elif py_path.startswith(PWD):
-            alias   = "<pwd>"
-            py_path = PWD
-        else:
+    for py_path in _iter_used_py_paths(index, entry_paths):
+        alias = index.aliases[py_path]
+        if alias == "<pwd>":
+            py_path = index.pwd
+        elif not alias:
             alias = f"<p{alias_index}>"
             alias_index += 1
 
@@ -214,17 +540,327 @@ def _iter_entry_rows(
             entry.call or "",
             entry.lineno or "",
             entry.src_ctx or "",
+            entry.caret or "",
         )
 
 
-def _init_entries_context(entries: com.Entries, term_width: typ.Optional[int] = None) -> Context:
+class Limits(typ.NamedTuple):
+    """Upper bounds for the size of a formatted traceback.
+
+    Each limit is applied before the parts that are cut off are
+    processed further (resolving paths, reading source lines, ...).
+    Anything that is omitted is marked as such in the output.
+    """
+
+    # number of exceptions of a chain (via __cause__/__context__)
+    max_chain_len: int = 32
+    # entries per traceback, the first and last entries are kept
+    max_entries: int = 1000
+    # characters of an exception message
+    max_msg_len: int = 10000
+    # characters of the formatted output (of the whole chain)
+    max_output_len: int = 1000000
+    # distinct sub-exceptions shown for an exception group
+    max_group_members: int = 20
+    # levels of nested exception groups
+    max_group_depth: int = 10
+
+
+DEFAULT_LIMITS = Limits()
+
+# Name of the placeholder for the omitted (oldest) exceptions of a chain.
+OMITTED_EXC_NAME = "..."
+
+
+def _omitted_traceback(marker: str) -> com.Traceback:
+    return com.Traceback(OMITTED_EXC_NAME, marker, [], False, False)
+
+
+def _is_omitted(traceback: com.Traceback) -> bool:
+    return traceback.exc_name == OMITTED_EXC_NAME and not traceback.entries
+
+
+def _limit_msg(msg: str, max_msg_len: int) -> str:
+    if len(msg) <= max_msg_len:
+        return msg
+    else:
+        return msg[:max_msg_len] + f"... ({len(msg) - max_msg_len} more characters)"
+
+
+# NOTE: With a latency budget (see LoggingFormatter), the time is checked
+#   after each stage of formatting. Once the budget is exceeded, the
+#   remaining stages produce a cheaper output:
+#
+#   capture: at most BUDGET_MAX_ENTRIES entries, no source lines
+#   paths  : no aliases (full paths)
+#   layout : no color
+#   render : (nothing left to degrade, only counted)
+
+BUDGET_STAGES = ("capture", "paths", "layout", "render")
+
+BUDGET_MAX_ENTRIES = 20
+
+
+class BudgetInfo(typ.NamedTuple):
+
+    num_formatted: int
+    num_exceeded : int
+    # number of tracebacks for which the budget was exceeded in each stage
+    by_stage: typ.Dict[str, int]
+
+
+class _Budget:
+    def __init__(self, seconds: float) -> None:
+        self.deadline = time.perf_counter() + seconds
+        self.exceeded_stage: typ.Optional[str] = None
+
+    def check(self, stage: str) -> bool:
+        """Return True if the budget was exceeded (in this or an earlier stage)."""
+        if self.exceeded_stage is None and time.perf_counter() > self.deadline:
+            self.exceeded_stage = stage
+        return self.exceeded_stage is not None
+
+
+def _drop_src_ctx(entries: com.Entries) -> com.Entries:
+    return [entry._replace(src_ctx="", caret="") for entry in entries]
+
+
+# Repeated cycles of entries are compressed if they are no longer than
+# MAX_CYCLE_LEN and if more than MIN_CYCLE_OMITTED entries can be omitted.
+MAX_CYCLE_LEN     = 32
+MIN_CYCLE_REPEATS = 3
+MIN_CYCLE_OMITTED = 10
+
+# If the traceback of a RecursionError still has more entries than this
+# after cycles have been compressed (e.g. unpredictable mutual recursion),
+# entries are omitted from the first entry that is seen for the third time.
+MAX_UNCOMPRESSED_ENTRIES = 100
+
+Markers = typ.Dict[int, str]
+
+
+def _run_length(keys: typ.List[int], start: int, shift: int) -> int:
+    """Number of consecutive keys from start which equal the key shift positions later."""
+    # NOTE: Slices are compared with exponential and then binary search,
+    #   so that the comparisons of long runs are done in C.
+    limit = len(keys) - shift - start
+    lo    = 0
+    hi    = 1
+    while hi <= limit and keys[start : start + hi] == keys[start + shift : start + shift + hi]:
+        lo = hi
+        hi *= 2
+
+    hi = min(hi, limit + 1)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if keys[start : start + mid] == keys[start + shift : start + shift + mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _find_cycle(keys: typ.List[int], start: int) -> typ.Tuple[int, int]:
+    """Find the cycle that covers the most entries from start.
+
+    Returns the length of the cycle and the number of repetitions.
+    """
+    num_keys   = len(keys)
+    best_len   = 0
+    best_count = 0
+    # index of the first key after the repetitions of the best cycle
+    best_end = 0
+    max_len  = min(MAX_CYCLE_LEN, (num_keys - start) // MIN_CYCLE_REPEATS)
+    for cycle_len in range(1, max_len + 1):
+        if best_len and cycle_len % best_len == 0 and best_end - start >= cycle_len:
+            # NOTE: The keys from start to best_end repeat with best_len. If
+            #   a multiple of it fits in there, its repetitions end at the
+            #   same key, so it can't cover more entries. It can if it's
+            #   longer, e.g. [0, 0, 0, 1, 2] * 5 has the cycles [0] and
+            #   [0, 0, 0, 1, 2], which covers more entries.
+            continue
+
+        run_len = _run_length(keys, start, cycle_len)
+        count   = run_len // cycle_len + 1
+        if count >= MIN_CYCLE_REPEATS and count * cycle_len > best_count * best_len:
+            best_len   = cycle_len
+            best_count = count
+            best_end   = start + cycle_len + run_len
+    return (best_len, best_count)
+
+
+def _compress_cycles(
+    entries: com.Entries, keys: typ.List[int]
+) -> typ.Tuple[com.Entries, typ.List[int], Markers, typ.List[int]]:
+    # NOTE: The scan for each cycle length stops at the first mismatch
+    #   and a cycle that is found is skipped entirely. Since the cycle
+    #   length is bounded, this is linear in the number of entries.
+    kept_entries  : com.Entries = []
+    kept_keys     : typ.List[int] = []
+    kept_positions: typ.List[int] = []
+    markers       : Markers = {}
+
+    i = 0
+    while i < len(entries):
+        cycle_len, count = _find_cycle(keys, i)
+        num_omitted = (count - 2) * cycle_len
+        if num_omitted < MIN_CYCLE_OMITTED:
+            kept_entries.append(entries[i])
+            kept_keys.append(keys[i])
+            kept_positions.append(i)
+            i += 1
+            continue
+
+        # keep the first and the last repetition of the cycle
+        last_start = i + (count - 1) * cycle_len
+        kept_entries.extend(entries[i : i + cycle_len])
+        kept_keys.extend(keys[i : i + cycle_len])
+        kept_positions.extend(range(i, i + cycle_len))
+        markers[len(kept_entries)] = (
+            f"... {num_omitted} omitted entries "
+            f"(cycle of {cycle_len} repeated {count} times)"
+        )
+        kept_entries.extend(entries[last_start : last_start + cycle_len])
+        kept_keys.extend(keys[last_start : last_start + cycle_len])
+        kept_positions.extend(range(last_start, last_start + cycle_len))
+        i = last_start + cycle_len
+
+    return (kept_entries, kept_keys, markers, kept_positions)
+
+
+def _compress_positions(
+    entries: com.Entries, is_recursion: bool
+) -> typ.Tuple[com.Entries, Markers, typ.Sequence[int]]:
+    # Same as _compress_entries, plus the index of each kept entry in entries.
+    if len(entries) < MIN_CYCLE_OMITTED + MIN_CYCLE_REPEATS:
+        return (entries, {}, range(len(entries)))
+
+    key_ids: typ.Dict[typ.Tuple[str, str, str], int] = {}
+    keys = [key_ids.setdefault((e.module, e.lineno, e.call), len(key_ids)) for e in entries]
+    if len(key_ids) == len(keys):
+        return (entries, {}, range(len(entries)))
+
+    entries, keys, markers, positions = _compress_cycles(entries, keys)
+
+    if is_recursion and len(entries) > MAX_UNCOMPRESSED_ENTRIES:
+        key_counts: typ.Dict[int, int] = collections.defaultdict(int)
+        for i, key in enumerate(keys):
+            key_counts[key] += 1
+            if key_counts[key] == 3:
+                num_omitted = len(entries) - i - 2
+                if num_omitted > 0:
+                    prelude_markers = {idx: marker for idx, marker in markers.items() if idx < i}
+                    prelude_markers[i] = f"... {num_omitted} omitted entries"
+                    positions = positions[:i] + positions[-2:]
+                    return (entries[:i] + entries[-2:], prelude_markers, positions)
+                break
+
+    return (entries, markers, positions)
+
+
+def _compress_entries(
+    entries: com.Entries, is_recursion: bool = False
+) -> typ.Tuple[com.Entries, Markers]:
+    """Omit repeated entries, e.g. due to recursion.
+
+    This is done before any other processing of the entries (resolving
+    paths, padding, coloring...), so that the cost for the omitted
+    entries is minimal. Only repeated cycles are omitted, unless the
+    entries are of a RecursionError (is_recursion).
+    """
+    entries, markers, _ = _compress_positions(entries, is_recursion)
+    return (entries, markers)
+
+
+def _limit_entries(
+    entries: com.Entries, max_entries: int, is_recursion: bool = False
+) -> typ.Tuple[com.Entries, Markers]:
+    """Compress entries and keep at most max_entries of them.
+
+    The cycles are compressed first (which only compares the keys of the
+    entries), so that the markers count the repetitions of the whole
+    traceback. If more than max_entries remain, the first and the last
+    entries are kept.
+    """
+    kept, markers, positions = _compress_positions(entries, is_recursion)
+    if len(kept) <= max_entries:
+        return (kept, markers)
+
+    num_head   = max_entries // 2
+    num_tail   = max_entries - num_head
+    tail_start = len(kept) - num_tail
+
+    # NOTE: The markers between the head and the tail are replaced by
+    #   one marker, which counts all entries that are omitted there.
+    omitted_start = positions[num_head - 1] + 1 if num_head > 0 else 0
+    omitted_end   = positions[tail_start] if num_tail > 0 else len(entries)
+    num_omitted   = omitted_end - omitted_start
+
+    limited_markers = {idx: marker for idx, marker in markers.items() if idx < num_head}
+    limited_markers[num_head] = (
+        f"... {num_omitted} omitted entries (max_entries={max_entries})"
+    )
+    for idx, marker in markers.items():
+        if idx > tail_start:
+            limited_markers[idx - tail_start + num_head] = marker
+    return (kept[:num_head] + kept[tail_start:], limited_markers)
+
+
+def _add_repeat_markers(entries: com.Entries, markers: Markers) -> Markers:
+    # Parsed tracebacks have entries that python wrote only once,
+    # followed by "[Previous line repeated 996 more times]".
+    result = markers
+    for idx, entry in enumerate(entries):
+        if entry.repeat:
+            if result is markers:
+                result = dict(markers)
+            marker = f"[Previous line repeated {entry.repeat} more times]"
+            if idx + 1 in result:
+                marker += os.linesep + "    " + result[idx + 1]
+            result[idx + 1] = marker
+    return result
+
+
+def _init_contexts(
+    entries_list: typ.Sequence[com.Entries],
+    term_width  : typ.Optional[int] = None,
+    limits      : Limits = DEFAULT_LIMITS,
+    budget      : typ.Optional[_Budget] = None,
+    exc_names   : typ.Sequence[str] = (),
+) -> typ.List[Context]:
+    """Contexts for multiple tracebacks, which are rendered together.
+
+    The aliases and the widths of the columns are the same for all
+    contexts, so the rows of all tracebacks are aligned. The exc_names
+    (if given) are those of the tracebacks of entries_list.
+    """
+    is_degraded = budget is not None and budget.check("capture")
+    max_entries = min(limits.max_entries, BUDGET_MAX_ENTRIES) if is_degraded else limits.max_entries
     if term_width is None:
         _term_width = _get_terminal_width()
     else:
         _term_width = term_width
 
-    entry_paths = list(_iter_entry_paths(entries))
-    aliases     = list(_iter_alias_prefixes(entry_paths))
+    markers_list: typ.List[Markers] = []
+    loaded      : typ.List[com.Entries] = []
+    paths_list  : typ.List[typ.List[str]] = []
+    for i, entries in enumerate(entries_list):
+        is_recursion     = i < len(exc_names) and exc_names[i] == "RecursionError"
+        entries, markers = _limit_entries(entries, max_entries, is_recursion)
+        markers = _add_repeat_markers(entries, markers)
+        if is_degraded:
+            entries = _drop_src_ctx(entries)
+        else:
+            entries = load_src_ctx(entries)
+        markers_list.append(markers)
+        loaded.append(entries)
+        paths_list.append(list(_iter_entry_paths(entries)))
+
+    if budget is not None and budget.check("paths"):
+        aliases: AliasPrefixes = []
+    else:
+        all_paths = {entry_path for entry_paths in paths_list for entry_path in entry_paths}
+        aliases   = list(_iter_alias_prefixes(all_paths))
 
     # NOTE (mb 2020-10-04): When calculating widths of a column, we care more
     #   about alignment than staying below the max_row_width. The limits are
@@ -234,9 +870,15 @@ def _init_entries_context(entries: com.Entries, term_width: typ.Optional[int] =
     # indent (4 spaces) + 3 x sep (2 spaces each)
     max_row_width = _term_width - 10
 
-    rows = list(_iter_entry_rows(aliases, entry_paths, entries))
+    rows_list = [
+        list(_iter_entry_rows(aliases, entry_paths, entries))
+        for entry_paths, entries in zip(paths_list, loaded)
+    ]
+    del loaded, paths_list
+
+    if any(rows_list):
+        rows = [row for _rows in rows_list for row in _rows]
 
-    if rows:
         max_short_module_len = max(len(row.alias) + len(row.short_module) for row in rows)
         max_full_module_len  = max(len(row.full_module) for row in rows)
 
@@ -254,218 +896,965 @@ def _init_entries_context(entries: com.Entries, term_width: typ.Optional[int] =
     max_total_len = max_full_module_len + max_lineno_len + max_call_len + max_context_len
     is_wide_mode  = max_total_len < max_row_width
 
-    return Context(
-        rows,
-        aliases,
-        max_row_width,
-        is_wide_mode,
-        max_short_module_len,
-        max_full_module_len,
-        max_lineno_len,
-        max_call_len,
-        max_context_len,
-    )
+    return [
+        Context(
+            _rows,
+            aliases,
+            max_row_width,
+            is_wide_mode,
+            max_short_module_len,
+            max_full_module_len,
+            max_lineno_len,
+            max_call_len,
+            max_context_len,
+            markers,
+        )
+        for _rows, markers in zip(rows_list, markers_list)
+    ]
+
+
+def _init_entries_context(
+    entries   : com.Entries,
+    term_width: typ.Optional[int] = None,
+    limits    : Limits = DEFAULT_LIMITS,
+) -> Context:
+    return _init_contexts([entries], term_width, limits)[0]
+
+
+def _aliases_to_lines(aliases: AliasPrefixes, plan: RenderPlan) -> typ.Iterable[str]:
+    if aliases:
+        alias_padding = max(len(alias) for alias, _ in aliases)
+        for alias, path in aliases:
+            yield "".join(
+                ("    ", alias.ljust(alias_padding), plan.alias_path_open, path, plan.alias_path_close)
+            )
+
+
+def _rows_to_lines(ctx: Context, plan: RenderPlan) -> typ.Iterable[str]:
+    # NOTE: All separators and ANSI sequences are pre-joined in the
+    #   render plan, so each line is rendered with a single join.
+    is_wide_mode   = ctx.is_wide_mode
+    max_lineno_len = ctx.max_lineno_len
+    max_call_len   = ctx.max_call_len
+    markers        = ctx.markers
+
+    # indent + module + ":" + lineno + call + 3 x sep (see _init_row_plan)
+    module_width = ctx.max_full_module_len if is_wide_mode else ctx.max_short_module_len
+    context_col  = 4 + 1 + module_width + 1 + max_lineno_len + 2 + max_call_len + 2
+
+    for i, row in enumerate(ctx.rows):
+        if markers and i in markers:
+            yield "    " + markers[i]
+
+        if is_wide_mode:
+            alias          = ""
+            module         = row.full_module
+            module_padding = ctx.max_full_module_len - len(module)
+        else:
+            alias          = row.alias
+            module         = row.short_module
+            module_padding = ctx.max_short_module_len - len(alias) - len(module)
+
+        # the line number is appended to the module so editors can jump to the line
+        padding  = " " * (module_padding + max_lineno_len - len(row.lineno))
+        row_plan = plan.pwd_row if row.alias == "<pwd>" else plan.row
+
+        yield "".join(
+            (
+                "    ",
+                alias,
+                row_plan.module_open,
+                module,
+                row_plan.lineno_open,
+                row.lineno,
+                row_plan.lineno_close,
+                padding,
+                row_plan.call_open,
+                row.call.ljust(max_call_len),
+                row_plan.context_open,
+                row.context,
+                row_plan.line_close,
+            )
+        )
 
+        if row.caret and row.context:
+            caret = row.caret.lstrip()
+            yield "".join(
+                (
+                    " " * (context_col + len(row.caret) - len(caret)),
+                    row_plan.caret_open,
+                    caret,
+                    row_plan.line_close,
+                )
+            )
 
-def _padded_rows(ctx: Context) -> typ.Iterable[PaddedRow]:
-    # Expand padding from left to right.
-    # This will mutate rows (updating strings with added padding)
+    if markers and len(ctx.rows) in markers:
+        yield "    " + markers[len(ctx.rows)]
 
-    for row in ctx.rows:
-        if ctx.is_wide_mode:
-            short_module = ""
-            full_module  = row.full_module.ljust(ctx.max_full_module_len)
-        else:
-            short_module = row.short_module.ljust(ctx.max_short_module_len - len(row.alias))
-            full_module  = ""
-
-        # the max lengths are calculated upstream in `_init_entries_context`
-        padded_call   = row.call.ljust(ctx.max_call_len)
-        padded_lineno = row.lineno.ljust(ctx.max_lineno_len)
-
-        yield PaddedRow(
-            row.alias,
-            short_module,
-            full_module,
-            padded_call,
-            padded_lineno,
-            row.context,
-        )
 
+# Placeholder for the source line of an entry that has not been loaded
+# yet. Python source code can't contain a null byte, so this can't be
+# confused with an actual line.
+LAZY_SRC_CTX = "\0"
 
-def _aliases_to_lines(ctx: Context, color: bool = False) -> typ.Iterable[str]:
-    fmt_module = FMT_MODULE if color else "{0}"
-    if ctx.aliases:
-        alias_padding = max(len(alias) for alias, _ in ctx.aliases)
-        for alias, path in ctx.aliases:
-            yield "    " + alias.ljust(alias_padding) + ": " + fmt_module.format(path)
 
+def _traceback_to_entries(traceback: types.TracebackType) -> typ.Iterable[com.Entry]:
+    # NOTE: Unlike traceback.extract_tb, the source lines are not read
+    #   here. They are only loaded (see load_src_ctx) for entries that
+    #   are actually rendered.
+    lazy_files: typ.Set[str] = set()
+
+    cur_tb: typ.Optional[types.TracebackType] = traceback
+    while cur_tb is not None:
+        frame    = cur_tb.tb_frame
+        code     = frame.f_code
+        filename = code.co_filename
+        if filename not in lazy_files:
+            # make source available for modules loaded from e.g. a zip file
+            lazy_files.add(filename)
+            linecache.lazycache(filename, frame.f_globals)
+
+        lineno = cur_tb.tb_lineno
+        yield com.Entry(filename, code.co_name, "" if lineno is None else str(lineno), LAZY_SRC_CTX)
+        cur_tb = cur_tb.tb_next
+
+
+def load_src_ctx(entries: com.Entries) -> com.Entries:
+    """Entries with the source lines loaded, if they were captured lazily (LAZY_SRC_CTX)."""
+    checked_files: typ.Set[str] = set()
+
+    loaded: com.Entries = []
+    for entry in entries:
+        if entry.src_ctx == LAZY_SRC_CTX:
+            if entry.module not in checked_files:
+                # same as traceback.extract_tb, in case a file was modified
+                checked_files.add(entry.module)
+                linecache.checkcache(entry.module)
+
+            if entry.lineno.isdigit():
+                src_ctx = linecache.getline(entry.module, int(entry.lineno)).strip()
+            else:
+                src_ctx = ""
+            entry = entry._replace(src_ctx=src_ctx)
+        loaded.append(entry)
+    return loaded
+
+
+def _iter_traceback_lines(
+    ctx      : Context,
+    traceback: com.Traceback,
+    color    : bool = False,
+    theme    : typ.Optional[Theme] = None,
+    limits   : Limits = DEFAULT_LIMITS,
+) -> typ.Iterator[str]:
+    plan = _get_render_plan(color, theme)
 
-def _rows_to_lines(rows: typ.List[PaddedRow], color: bool = False) -> typ.Iterable[str]:
+    if ctx.aliases and not ctx.is_wide_mode:
+        yield com.ALIASES_HEAD
+        for line in _aliases_to_lines(ctx.aliases, plan):
+            yield line
 
-    # apply colors and additional separators/ spacing
-    fmt_module  = FMT_MODULE if color else "{0}"
-    fmt_call    = FMT_CALL if color else "{0}"
-    fmt_lineno  = FMT_LINENO if color else "{0}"
-    fmt_context = FMT_CONTEXT if color else "{0}"
+    yield com.TRACEBACK_HEAD
+    for line in _rows_to_lines(ctx, plan):
+        yield line
 
-    # padding has already been added to the components at this point
-    for alias, short_module, full_module, call, lineno, context in rows:
-        if short_module:
-            _alias = alias
-            module = short_module
-        else:
-            _alias = ""
-            module = full_module
-
-        # append line number to file so editors can jump to the line
-        bare_module    = module.strip()
-        bare_lineno    = lineno.strip()
-        module_padding = " " * (len(module) - len(bare_module) + len(lineno) - len(bare_lineno))
-
-        parts = (
-            "    ",
-            _alias,
-            " ",
-            fmt_module.format(bare_module),
-            ":",
-            fmt_lineno.format(bare_lineno),
-            module_padding,
-            "  ",
-            fmt_call.format(call),
-            "  ",
-            fmt_context.format(context),
+    if traceback.exc_msg:
+        yield "".join(
+            (
+                plan.error_name_open,
+                traceback.exc_name,
+                plan.error_name_close,
+                plan.error_msg_open,
+                _limit_msg(traceback.exc_msg, limits.max_msg_len),
+                plan.error_msg_close,
+            )
         )
+    else:
+        yield plan.error_name_open + traceback.exc_name + plan.error_name_close
 
-        line = "".join(parts)
 
-        if alias == "<pwd>":
-            yield line.replace(colorama.Style.NORMAL, colorama.Style.BRIGHT)
-        else:
-            yield line
+def _format_traceback(
+    ctx      : Context,
+    traceback: com.Traceback,
+    color    : bool = False,
+    theme    : typ.Optional[Theme] = None,
+    limits   : Limits = DEFAULT_LIMITS,
+) -> str:
+    lines = _iter_traceback_lines(ctx, traceback, color, theme, limits)
+    return os.linesep.join(lines) + os.linesep
 
 
-def _traceback_to_entries(traceback: types.TracebackType) -> typ.Iterable[com.Entry]:
-    summary = tb.extract_tb(traceback)
-    for entry in summary:
-        module  = entry[0]
-        call    = entry[2]
-        lineno  = str(entry[1])
-        context = entry[3] or ""
-        yield com.Entry(module, call, lineno, context)
+def iter_group_tracebacks(traceback: com.Traceback) -> typ.Iterable[com.Traceback]:
+    """The traceback and those of the members of an exception group (depth first)."""
+    yield traceback
+    for member in traceback.members:
+        for member_tb in member.tracebacks:
+            for group_tb in iter_group_tracebacks(member_tb):
+                yield group_tb
 
 
-def _format_traceback(ctx: Context, traceback: com.Traceback, color: bool = False) -> str:
-    padded_rows = list(_padded_rows(ctx))
+def chain_aliases(tracebacks: com.Tracebacks) -> AliasPrefixes:
+    """The aliases for the paths of the entries of a chain (including group members)."""
+    entries = [
+        entry
+        for tb_tup in tracebacks
+        for group_tb in iter_group_tracebacks(tb_tup)
+        for entry in group_tb.entries
+    ]
+    entry_paths = list(_iter_entry_paths(entries))
+    return list(_iter_alias_prefixes(entry_paths))
 
-    lines = []
-    if ctx.aliases and not ctx.is_wide_mode:
-        lines.append(com.ALIASES_HEAD)
-        lines.extend(_aliases_to_lines(ctx, color))
 
-    lines.append(com.TRACEBACK_HEAD)
-    lines.extend(_rows_to_lines(padded_rows, color))
+# Prefixes for the lines of the members of an exception group.
+GROUP_MEMBER_HEAD   = "  +---------------- {0} ----------------"
+GROUP_MEMBER_PREFIX = "  | "
+GROUP_END           = "  +------------------------------------"
 
-    if traceback.exc_name == 'RecursionError' and len(lines) > 100:
-        prelude_index = 0
 
-        line_counts: typ.Dict[str, int] = collections.defaultdict(int)
-        for i, line in enumerate(lines):
-            line_counts[line] += 1
-            if line_counts[line] == 3:
-                prelude_index = i
-                break
+def _member_head(idx: int, member: com.Member) -> str:
+    if _is_omitted(member.tracebacks[0]):
+        return GROUP_MEMBER_HEAD.format("...")
+    elif member.count > 1:
+        return GROUP_MEMBER_HEAD.format(f"{idx} ({member.count} times)")
+    else:
+        return GROUP_MEMBER_HEAD.format(idx)
+
+
+def _iter_member_lines(
+    member: com.Member,
+    ctxs  : typ.Iterator[Context],
+    color : bool,
+    theme : typ.Optional[Theme],
+    limits: Limits,
+) -> typ.Iterator[str]:
+    for member_tb in member.tracebacks:
+        if member_tb.is_caused:
+            yield ""
+            yield com.CAUSE_HEAD
+            yield ""
+        elif member_tb.is_context:
+            yield ""
+            yield com.CONTEXT_HEAD
+            yield ""
+        for line in _iter_group_lines(member_tb, ctxs, color, theme, limits, False):
+            yield line
 
-        if prelude_index > 0:
-            num_omitted = len(lines) - prelude_index - 2
-            lines       = lines[:prelude_index] + [f"    ... {num_omitted} omitted lines"] + lines[-2:]
 
-    fmt_error_name = FMT_ERROR_NAME if color else "{0}"
-    error_line     = fmt_error_name.format(traceback.exc_name)
-    if traceback.exc_msg:
-        fmt_error_msg = FMT_ERROR_MSG if color else "{0}"
-        error_line += ": " + fmt_error_msg.format(traceback.exc_msg)
+def _iter_group_lines(
+    traceback : com.Traceback,
+    ctxs      : typ.Iterator[Context],
+    color     : bool,
+    theme     : typ.Optional[Theme],
+    limits    : Limits,
+    with_alias: bool = True,
+) -> typ.Iterator[str]:
+    # NOTE: ctxs must yield a context for each of the tracebacks in the
+    #   order of iter_group_tracebacks.
+    ctx = next(ctxs)
+    if _is_omitted(traceback):
+        yield "    " + OMITTED_EXC_NAME + " " + traceback.exc_msg
+        return
+
+    if not with_alias:
+        ctx = ctx._replace(aliases=[])
+    for line in _iter_traceback_lines(ctx, traceback, color, theme, limits):
+        yield line
+
+    for idx, member in enumerate(traceback.members, 1):
+        yield _member_head(idx, member)
+        for line in _iter_member_lines(member, ctxs, color, theme, limits):
+            yield GROUP_MEMBER_PREFIX + line
+
+    if traceback.members:
+        yield GROUP_END
+
+
+class ChainContext(typ.NamedTuple):
+    """Layout of a chain of tracebacks, see init_chain_context."""
+
+    aliases     : AliasPrefixes
+    is_wide_mode: bool
+
+    # for each link of the chain, the contexts of the tracebacks
+    # of the link (in the order of iter_group_tracebacks)
+    link_contexts: typ.List[typ.List[Context]]
+
+
+def init_chain_context(
+    tracebacks: com.Tracebacks,
+    term_width: typ.Optional[int] = None,
+    limits    : typ.Optional[Limits] = None,
+) -> ChainContext:
+    """Compute the layout for a chain of tracebacks.
+
+    All entries of the chain are processed in one pass: the source
+    lines are loaded, the paths are resolved and the aliases and the
+    widths of the columns are computed once, so that the rows of all
+    links are aligned.
+
+    The result can be passed to format_tracebacks, e.g. to format
+    the same chain with and without color.
+    """
+    _limits = DEFAULT_LIMITS if limits is None else limits
+    return _init_chain_context(tracebacks, term_width, _limits)
+
+
+def _init_chain_context(
+    tracebacks: com.Tracebacks,
+    term_width: typ.Optional[int],
+    limits    : Limits,
+    budget    : typ.Optional[_Budget] = None,
+) -> ChainContext:
+    groups   = [list(iter_group_tracebacks(tb_tup)) for tb_tup in tracebacks]
+    entries   = [group_tb.entries for group in groups for group_tb in group]
+    exc_names = [group_tb.exc_name for group in groups for group_tb in group]
+    contexts  = _init_contexts(entries, term_width, limits, budget, exc_names)
+
+    link_contexts: typ.List[typ.List[Context]] = []
+    start = 0
+    for group in groups:
+        link_contexts.append(contexts[start : start + len(group)])
+        start += len(group)
+
+    if contexts:
+        return ChainContext(contexts[0].aliases, contexts[0].is_wide_mode, link_contexts)
+    else:
+        return ChainContext([], True, link_contexts)
+
+
+def _check_context(context: ChainContext, tracebacks: com.Tracebacks) -> None:
+    num_tracebacks = sum(len(ctxs) for ctxs in context.link_contexts)
+    num_expected   = sum(len(list(iter_group_tracebacks(tb_tup))) for tb_tup in tracebacks)
+    if len(context.link_contexts) != len(tracebacks) or num_tracebacks != num_expected:
+        raise ValueError("Context was not initialized for these tracebacks")
+
+
+# NOTE: The size of the output is only measured (by rendering it twice)
+#   if it may exceed max_output_len. Usually it's well below that, which
+#   is checked with an upper bound that is computed from the contexts.
 
-    lines.append(error_line)
-    return os.linesep.join(lines) + os.linesep
 
+def _plan_overhead(plan: RenderPlan) -> int:
+    # upper bound for the ANSI sequences and separators of any line
+    return sum(map(len, plan.row)) + sum(map(len, plan.pwd_row)) + sum(map(len, plan[2:]))
+
+
+def _link_len_bound(
+    traceback: com.Traceback,
+    ctxs     : typ.Iterator[Context],
+    overhead : int,
+    depth    : int = 0,
+) -> int:
+    ctx        = next(ctxs)
+    line_extra = len(GROUP_MEMBER_PREFIX) * depth + len(os.linesep)
+
+    module_len = max(ctx.max_full_module_len, ctx.max_short_module_len)
+    row_len    = module_len + ctx.max_lineno_len + ctx.max_call_len + ctx.max_context_len
+    bound      = len(ctx.rows) * (4 + row_len + overhead + line_extra)
+    bound     += sum(len(marker) + 4 + line_extra for marker in ctx.markers.values())
+    bound     += sum(
+        4 + row_len + len(row.caret) + overhead + line_extra for row in ctx.rows if row.caret
+    )
+    # heads of the traceback and the chain, blank lines, the error line
+    bound += 4 * (len(com.CAUSE_HEAD) + line_extra)
+    bound += len(traceback.exc_name) + len(traceback.exc_msg) + overhead + 64 + line_extra
+
+    for member in traceback.members:
+        bound += len(GROUP_MEMBER_HEAD) + 32 + line_extra
+        for member_tb in member.tracebacks:
+            bound += _link_len_bound(member_tb, ctxs, overhead, depth + 1)
+    return bound + len(GROUP_END) + line_extra
+
+
+def _chain_len_bound(tracebacks: com.Tracebacks, context: ChainContext, plan: RenderPlan) -> int:
+    overhead = _plan_overhead(plan)
+    bound    = len(com.ALIASES_HEAD) + 128
+    bound   += sum(len(alias) * 2 + len(path) + overhead + 8 for alias, path in context.aliases)
+    for tb_tup, link_contexts in zip(tracebacks, context.link_contexts):
+        bound += _link_len_bound(tb_tup, iter(link_contexts), overhead)
+    return bound
+
+
+def _lines_len(lines: typ.Iterable[str]) -> int:
+    linesep_len = len(os.linesep)
+    return sum(len(line) + linesep_len for line in lines)
+
+
+def _iter_limited_lines(
+    lines: typ.Iterable[str], total_len: int, max_output_len: int
+) -> typ.Iterator[str]:
+    """Keep the first and the last lines of an output of total_len characters."""
+    linesep_len = len(os.linesep)
+
+    head_end    = max_output_len // 2
+    tail_start  = total_len - max_output_len // 2
+    num_omitted = 0
+    pos         = 0
+    for line in lines:
+        end = pos + len(line) + linesep_len
+        if end <= head_end or pos >= tail_start or end == total_len:
+            if num_omitted:
+                yield f"    ... {num_omitted} omitted characters (max_output_len={max_output_len})"
+                num_omitted = 0
+            yield line
+        else:
+            num_omitted += end - pos
+        pos = end
+
+
+def _iter_chain_lines(
+    tracebacks: com.Tracebacks,
+    context   : ChainContext,
+    color     : bool,
+    theme     : typ.Optional[Theme],
+    limits    : Limits,
+) -> typ.Iterator[str]:
+    # pylint:disable=too-many-locals   ; inlined for speed
+    plan           = _get_render_plan(color, theme)
+    max_output_len = limits.max_output_len
+
+    def _link_lines(idx: int) -> typ.Iterator[str]:
+        ctxs = iter(context.link_contexts[idx])
+        return _iter_group_lines(tracebacks[idx], ctxs, color, theme, limits, False)
+
+    num_links = len(tracebacks)
+    first_idx = 0
+    link_lens: typ.List[int] = []
+    if _chain_len_bound(tracebacks, context, plan) > max_output_len:
+        # NOTE: The lengths are measured starting with the last (most
+        #   recent) exception, so that the oldest exceptions are omitted
+        #   if the output becomes too large.
+        link_lens  = [0] * num_links
+        output_len = 0
+        for idx in range(num_links - 1, -1, -1):
+            link_len = link_lens[idx] = _lines_len(_link_lines(idx))
+            if link_len > max_output_len:
+                limited    = _iter_limited_lines(_link_lines(idx), link_len, max_output_len)
+                output_len += _lines_len(limited)
+            else:
+                output_len += link_len
+            if idx < num_links - 1 and output_len > max_output_len:
+                first_idx = idx + 1
+                break
 
-def format_traceback(traceback: com.Traceback, color: bool = False) -> str:
-    ctx = _init_entries_context(traceback.entries)
-    return _format_traceback(ctx, traceback, color)
+    # The aliases are shared by all links, so they are written only once.
+    if context.aliases and not context.is_wide_mode:
+        yield com.ALIASES_HEAD
+        for line in _aliases_to_lines(context.aliases, plan):
+            yield line
 
+    if first_idx > 0:
+        marker = f"{first_idx} earlier exceptions omitted (max_output_len={max_output_len})"
+        yield "    " + OMITTED_EXC_NAME + " " + marker
+        yield ""
 
-def format_tracebacks(tracebacks: typ.List[com.Traceback], color: bool = False) -> str:
-    traceback_strs: typ.List[str] = []
+    for idx in range(first_idx, num_links):
+        tb_tup = tracebacks[idx]
+        if idx > first_idx:
+            yield ""
 
-    for tb_tup in tracebacks:
         if tb_tup.is_caused:
-            # traceback_strs.append("vvv caused by ^^^ - ")
-            traceback_strs.append(com.CAUSE_HEAD + os.linesep)
+            yield com.CAUSE_HEAD
+            yield ""
         elif tb_tup.is_context:
-            # traceback_strs.append("vvv happend after ^^^ - ")
-            traceback_strs.append(com.CONTEXT_HEAD + os.linesep)
+            yield com.CONTEXT_HEAD
+            yield ""
+
+        lines = _link_lines(idx)
+        if link_lens and link_lens[idx] > max_output_len:
+            lines = _iter_limited_lines(lines, link_lens[idx], max_output_len)
+        for line in lines:
+            yield line
+
 
-        traceback_str = format_traceback(tb_tup, color)
-        traceback_strs.append(traceback_str)
+def _iter_stripped(lines: typ.Iterable[str]) -> typ.Iterator[str]:
+    # same as str.strip() of the joined lines (the first line is never empty)
+    prev_line: typ.Optional[str] = None
+    for line in lines:
+        if prev_line is None:
+            prev_line = line.lstrip()
+        else:
+            yield prev_line
+            prev_line = line
+    if prev_line is not None:
+        yield prev_line.rstrip()
+
+
+def _chain_context(
+    tracebacks: com.Tracebacks,
+    term_width: typ.Optional[int],
+    limits    : Limits,
+    context   : typ.Optional[ChainContext],
+) -> ChainContext:
+    if context is None:
+        if term_width is None:
+            term_width = _get_terminal_width()
+        return init_chain_context(tracebacks, term_width, limits)
+    else:
+        _check_context(context, tracebacks)
+        return context
 
-    return os.linesep.join(traceback_strs).strip()
+
+def format_traceback(
+    traceback : com.Traceback,
+    color     : bool = False,
+    term_width: typ.Optional[int] = None,
+    theme     : typ.Optional[Theme] = None,
+    limits    : Limits = DEFAULT_LIMITS,
+    context   : typ.Optional[ChainContext] = None,
+) -> str:
+    """Format a traceback, including the members if it's an exception group.
+
+    Each distinct member is shown once, all members share the same
+    aliases and column widths. If a `context` is given, it must have
+    been initialized with init_chain_context([traceback]).
+    """
+    if context is None:
+        context = init_chain_context([traceback], term_width, limits)
+    else:
+        _check_context(context, [traceback])
+
+    ctxs  = iter(context.link_contexts[0])
+    lines = list(_iter_group_lines(traceback, ctxs, color, theme, limits))
+
+    total_len = _lines_len(lines)
+    if total_len > limits.max_output_len:
+        lines = list(_iter_limited_lines(lines, total_len, limits.max_output_len))
+    return os.linesep.join(lines) + os.linesep
+
+
+def iter_traceback_lines(
+    tracebacks: com.Tracebacks,
+    color     : bool = False,
+    term_width: typ.Optional[int] = None,
+    theme     : typ.Optional[Theme] = None,
+    limits    : typ.Optional[Limits] = None,
+    context   : typ.Optional[ChainContext] = None,
+) -> typ.Iterator[str]:
+    """The lines (without line separators) of format_tracebacks.
+
+    Lines are rendered as they are consumed.
+    """
+    _limits = DEFAULT_LIMITS if limits is None else limits
+    context = _chain_context(tracebacks, term_width, _limits, context)
+    return _iter_stripped(_iter_chain_lines(tracebacks, context, color, theme, _limits))
+
+
+def format_tracebacks(
+    tracebacks: typ.List[com.Traceback],
+    color     : bool = False,
+    term_width: typ.Optional[int] = None,
+    theme     : typ.Optional[Theme] = None,
+    limits    : typ.Optional[Limits] = None,
+    context   : typ.Optional[ChainContext] = None,
+) -> str:
+    """Format a chain of tracebacks.
+
+    If no `term_width` is given, the width of the terminal is used.
+    If color is enabled and no `theme` is given, `DEFAULT_THEME` is used.
+    If no `limits` are given, `DEFAULT_LIMITS` are used.
+    If no `context` is given, it is initialized with init_chain_context,
+    otherwise `term_width` is ignored.
+    """
+    lines = iter_traceback_lines(tracebacks, color, term_width, theme, limits, context)
+    return os.linesep.join(lines)
+
+
+# Number of lines that write_tracebacks writes at once. This is below
+# the limit for the number of buffers of os.writev (IOV_MAX, usually 1024).
+WRITE_BATCH_SIZE = 256
+
+
+def _write_chunks(fd: int, chunks: typ.List[bytes]) -> None:
+    if hasattr(os, 'writev'):
+        num_written = os.writev(fd, chunks)
+        if num_written == sum(map(len, chunks)):
+            return
+        # e.g. to a pipe that is full
+        data = b"".join(chunks)[num_written:]
+    else:
+        data = b"".join(chunks)
+
+    while data:
+        data = data[os.write(fd, data) :]
+
+
+def _write_fd(fd: int, lines: typ.Iterable[str], encoding: str) -> None:
+    linesep = os.linesep.encode(encoding)
+
+    batch: typ.List[bytes] = []
+    for line in lines:
+        batch.append(line.encode(encoding, "backslashreplace") + linesep)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            _write_chunks(fd, batch)
+            batch = []
+
+    if batch:
+        _write_chunks(fd, batch)
+
+
+def write_tracebacks(
+    tracebacks: com.Tracebacks,
+    out       : typ.Union[typ.TextIO, int],
+    color     : bool = False,
+    term_width: typ.Optional[int] = None,
+    theme     : typ.Optional[Theme] = None,
+    limits    : typ.Optional[Limits] = None,
+    context   : typ.Optional[ChainContext] = None,
+    encoding  : str = "utf-8",
+) -> None:
+    """Write a chain of tracebacks to a text stream or a file descriptor.
+
+    The output is the same as that of format_tracebacks (plus a final
+    line separator), but it is never built as one string. Lines are
+    rendered as they are written, in batches of WRITE_BATCH_SIZE lines.
+    For a file descriptor, each batch is encoded (with `encoding`) and
+    written with one call to os.writev.
+    """
+    lines = iter_traceback_lines(tracebacks, color, term_width, theme, limits, context)
+    if isinstance(out, int):
+        _write_fd(out, lines, encoding)
+        return
+
+    batch: typ.List[str] = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            out.write(os.linesep.join(batch) + os.linesep)
+            batch = []
+
+    if batch:
+        out.write(os.linesep.join(batch) + os.linesep)
 
 
 def get_tb_attr(ex: BaseException) -> types.TracebackType:
     return typ.cast(types.TracebackType, getattr(ex, '__traceback__', None))
 
 
-def exc_to_traceback_str(
+def _capture_entries(traceback: types.TracebackType, lazy_src: bool) -> com.Entries:
+    entries = list(_traceback_to_entries(traceback))
+    if lazy_src:
+        return entries
+    else:
+        return load_src_ctx(entries)
+
+
+def _exc_msg(exc_value: BaseException, max_msg_len: int) -> str:
+    try:
+        exc_msg = str(exc_value)
+    except Exception:    # pylint:disable=broad-except ; same as traceback.format_exception
+        return "<exception str() failed>"
+    return _limit_msg(exc_msg, max_msg_len)
+
+
+def _next_exc(exc_value: BaseException) -> typ.Optional[BaseException]:
+    next_cause = getattr(exc_value, '__cause__', None)
+    if next_cause:
+        return next_cause
+    else:
+        return getattr(exc_value, '__context__', None)
+
+
+def _sub_exceptions(exc_value: BaseException) -> typ.Sequence[BaseException]:
+    # NOTE: BaseExceptionGroup is only a builtin since python 3.11, for
+    #   older versions it's provided by the exceptiongroup backport.
+    sub_excs = getattr(exc_value, 'exceptions', None)
+    if isinstance(sub_excs, tuple):
+        for cls in type(exc_value).__mro__:
+            if cls.__name__ == 'BaseExceptionGroup':
+                return sub_excs
+    return ()
+
+
+def _capture_members(
+    exc_value: BaseException,
+    lazy_src : bool,
+    limits   : Limits,
+    outer_ids: typ.AbstractSet[int],
+    depth    : int,
+) -> typ.Sequence[com.Member]:
+    sub_excs = _sub_exceptions(exc_value)
+    if not sub_excs:
+        return ()
+
+    if depth >= limits.max_group_depth:
+        max_depth = limits.max_group_depth
+        marker    = f"{len(sub_excs)} sub-exceptions omitted (max_group_depth={max_depth})"
+        return (com.Member([_omitted_traceback(marker)]),)
+
+    # NOTE: Sub-exceptions with the same fingerprint (e.g. the same error
+    #   in thousands of tasks of a TaskGroup) are only shown once.
+    # NOTE: The member chains only skip the exceptions of the enclosing
+    #   chains (outer_ids), which guards against cycles. The members of
+    #   a TaskGroup usually share a __context__, which is captured (and
+    #   shown) for each of them, the same as python does.
+    members    : typ.Dict[str, com.Member] = {}
+    omitted_fps: typ.Set[str] = set()
+    num_omitted = 0
+
+    for sub_exc in sub_excs:
+        if id(sub_exc) in outer_ids:
+            continue
+        sub_tb = sub_exc.__traceback__
+        chain  = _capture_chain(sub_exc, sub_tb, lazy_src, limits, outer_ids, depth + 1)
+        fp     = dedup.fingerprint(chain)
+
+        member = members.get(fp)
+        if member is not None:
+            members[fp] = member._replace(count=member.count + 1)
+        elif len(members) < limits.max_group_members:
+            members[fp] = com.Member(chain)
+        else:
+            omitted_fps.add(fp)
+            num_omitted += 1
+
+    result = list(members.values())
+    if num_omitted:
+        marker = (
+            f"{num_omitted} more sub-exceptions ({len(omitted_fps)} distinct) omitted "
+            f"(max_group_members={limits.max_group_members})"
+        )
+        result.append(com.Member([_omitted_traceback(marker)], num_omitted))
+    return tuple(result)
+
+
+def _is_captured(exc_value: BaseException, chain_excs: typ.List[BaseException]) -> bool:
+    for chain_exc in chain_excs:
+        if chain_exc is exc_value:
+            return True
+    return False
+
+
+def _capture_chain(
     exc_value: BaseException,
     traceback: types.TracebackType,
-    color    : bool = False,
-) -> str:
-    # NOTE (mb 2020-08-13): wrt. cause vs context see
-    #   https://www.python.org/dev/peps/pep-3134/#enhanced-reporting
-    #   https://stackoverflow.com/questions/11235932/
+    lazy_src : bool,
+    limits   : Limits,
+    outer_ids: typ.AbstractSet[int],
+    depth    : int = 0,
+) -> com.Tracebacks:
+    # NOTE: Cycles within the chain are detected with a scan of the
+    #   exceptions that were captured, which are at most max_chain_len.
+    #   A set of their ids is only built for the rare cases that need
+    #   one (omitted exceptions, the members of an exception group).
     tracebacks: typ.List[com.Traceback] = []
+    chain_excs: typ.List[BaseException] = []
 
-    cur_exc_value: BaseException = exc_value
+    cur_exc_value: typ.Optional[BaseException] = exc_value
     cur_traceback: types.TracebackType = traceback
 
-    while cur_exc_value:
+    while (
+        cur_exc_value is not None
+        and id(cur_exc_value) not in outer_ids
+        and not _is_captured(cur_exc_value, chain_excs)
+    ):
+        if len(tracebacks) >= limits.max_chain_len:
+            seen_ids = set(outer_ids)
+            seen_ids.update(map(id, chain_excs))
+
+            num_omitted = 0
+            while cur_exc_value is not None and id(cur_exc_value) not in seen_ids:
+                seen_ids.add(id(cur_exc_value))
+                num_omitted  += 1
+                cur_exc_value = _next_exc(cur_exc_value)
+
+            marker = (
+                f"{num_omitted} earlier exceptions omitted "
+                f"(max_chain_len={limits.max_chain_len})"
+            )
+            tracebacks.append(_omitted_traceback(marker))
+            break
+
+        chain_excs.append(cur_exc_value)
+
         next_cause   = getattr(cur_exc_value, '__cause__', None)
         next_context = getattr(cur_exc_value, '__context__', None)
+        next_exc     = _next_exc(cur_exc_value)
+
+        # no header for a link to an exception that is not captured (a cycle)
+        is_linked = (
+            next_exc is not None
+            and id(next_exc) not in outer_ids
+            and not _is_captured(next_exc, chain_excs)
+        )
+
+        if _sub_exceptions(cur_exc_value):
+            member_outer_ids = set(outer_ids)
+            member_outer_ids.update(map(id, chain_excs))
+            members = _capture_members(cur_exc_value, lazy_src, limits, member_outer_ids, depth)
+        else:
+            members = ()
 
         tb_tup = com.Traceback(
             exc_name=type(cur_exc_value).__name__,
-            exc_msg=str(cur_exc_value),
-            entries=list(_traceback_to_entries(cur_traceback)),
-            is_caused=bool(next_cause),
-            is_context=bool(next_context),
+            exc_msg=_exc_msg(cur_exc_value, limits.max_msg_len),
+            entries=_capture_entries(cur_traceback, lazy_src),
+            is_caused=is_linked and bool(next_cause),
+            is_context=is_linked and bool(next_context),
+            members=members,
         )
 
         tracebacks.append(tb_tup)
 
-        if next_cause:
-            cur_exc_value = next_cause
-            cur_traceback = get_tb_attr(next_cause)
-        elif next_context:
-            cur_exc_value = next_context
-            cur_traceback = get_tb_attr(next_context)
-        else:
-            break
+        cur_exc_value = next_exc
+        if cur_exc_value is not None:
+            cur_traceback = get_tb_attr(cur_exc_value)
+
+    return list(reversed(tracebacks))
+
+
+def exc_to_tracebacks(
+    exc_value: BaseException,
+    traceback: types.TracebackType,
+    lazy_src : bool = False,
+    limits   : typ.Optional[Limits] = None,
+) -> com.Tracebacks:
+    """Capture the chain of tracebacks for an exception.
+
+    With `lazy_src=True`, the source lines of the entries are not read,
+    instead `src_ctx` is set to `LAZY_SRC_CTX`. Formatting functions
+    load the source lines for entries that they render.
+
+    At most `limits.max_chain_len` exceptions of the chain are captured,
+    any older exceptions are replaced by a placeholder (OMITTED_EXC_NAME).
+    The sub-exceptions of an exception group are captured as its members.
+    """
+    # NOTE (mb 2020-08-13): wrt. cause vs context see
+    #   https://www.python.org/dev/peps/pep-3134/#enhanced-reporting
+    #   https://stackoverflow.com/questions/11235932/
+    _limits = DEFAULT_LIMITS if limits is None else limits
+
+    # NOTE: The chain may have cycles, which can be created by assigning
+    #   __context__. They are cut off by _capture_chain.
+    return _capture_chain(exc_value, traceback, lazy_src, _limits, frozenset())
+
+
+def exc_to_traceback_str(
+    exc_value : BaseException,
+    traceback : types.TracebackType,
+    color     : bool = False,
+    term_width: typ.Optional[int] = None,
+    theme     : typ.Optional[Theme] = None,
+    limits    : typ.Optional[Limits] = None,
+) -> str:
+    tracebacks = exc_to_tracebacks(exc_value, traceback, lazy_src=True, limits=limits)
+    return format_tracebacks(tracebacks, color, term_width, theme, limits)
+
 
-    tracebacks = list(reversed(tracebacks))
+_dup_tracker_lock = threading.Lock()
+_budget_lock      = threading.Lock()
 
-    return format_tracebacks(tracebacks, color)
+# Attribute of a LogRecord with a snapshot of its exception (see deferred.py)
+TRACEBACKS_ATTR = 'pretty_tracebacks'
 
 
 class LoggingFormatterMixin:
     # pylint:disable=invalid-name   # logging module naming convention
     # pylint:disable=no-self-use    # because mixin
 
+    # Fixed width for the output, so that the terminal is never probed,
+    # e.g. for handlers that write to a file.
+    term_width: typ.Optional[int] = None
+
+    # If set, a traceback that was already formatted within this many
+    # seconds is only logged as a one line summary.
+    suppress_window: typ.Optional[float] = None
+
+    # Colors of the output, DEFAULT_THEME if not set.
+    theme: typ.Optional[Theme] = None
+
+    # Bounds for the size of the output, DEFAULT_LIMITS if not set.
+    limits: typ.Optional[Limits] = None
+
+    # If set, the time (in seconds) that formatting an exception may take,
+    # after which a cheaper output is used (see BUDGET_STAGES).
+    budget: typ.Optional[float] = None
+
+    _dup_tracker  : typ.Optional[dedup.DuplicateTracker] = None
+    _budget_counts: typ.Optional[typ.Counter[str]] = None
+
+    def _get_dup_tracker(self, window: float) -> dedup.DuplicateTracker:
+        with _dup_tracker_lock:
+            if self._dup_tracker is None or self._dup_tracker.window != window:
+                self._dup_tracker = dedup.DuplicateTracker(window)
+            return self._dup_tracker
+
+    def format(self, record: logging.LogRecord) -> str:
+        tracebacks = getattr(record, TRACEBACKS_ATTR, None)
+        if tracebacks and not record.exc_text:
+            # exception captured by deferred.CapturingQueueHandler
+            record.exc_text = self.formatTracebacks(tracebacks)
+        return super().format(record)  # type: ignore
+
     def formatException(self, ei) -> str:
         _, exc_value, traceback = ei
-        return exc_to_traceback_str(exc_value, traceback, color=True)
+        budget     = None if self.budget is None else _Budget(self.budget)
+        tracebacks = exc_to_tracebacks(exc_value, traceback, lazy_src=True, limits=self.limits)
+        return self._format_tracebacks(tracebacks, budget)
+
+    def formatTracebacks(self, tracebacks: com.Tracebacks) -> str:
+        budget = None if self.budget is None else _Budget(self.budget)
+        return self._format_tracebacks(tracebacks, budget)
+
+    def _format_tracebacks(self, tracebacks: com.Tracebacks, budget: typ.Optional[_Budget]) -> str:
+        # NOTE: logger.exception() outside of an except block has no
+        #   tracebacks, which are neither tracked nor suppressed.
+        if self.suppress_window and tracebacks:
+            fp             = dedup.fingerprint(tracebacks)
+            num_duplicates = self._get_dup_tracker(self.suppress_window).count(fp)
+            if num_duplicates > 0:
+                return dedup.summary_line(tracebacks, fp, num_duplicates)
+
+        if budget is None:
+            return format_tracebacks(
+                tracebacks,
+                color=True,
+                term_width=self.term_width,
+                theme=self.theme,
+                limits=self.limits,
+            )
+
+        limits  = DEFAULT_LIMITS if self.limits is None else self.limits
+        context = _init_chain_context(tracebacks, self.term_width, limits, budget)
+        color   = not budget.check("layout")
+        tb_str  = format_tracebacks(
+            tracebacks, color=color, theme=self.theme, limits=limits, context=context
+        )
+        budget.check("render")
+        self._count_budget(budget.exceeded_stage)
+        return tb_str
 
+    def _count_budget(self, exceeded_stage: typ.Optional[str]) -> None:
+        with _budget_lock:
+            if self._budget_counts is None:
+                self._budget_counts = collections.Counter()
+            self._budget_counts["formatted"] += 1
+            if exceeded_stage:
+                self._budget_counts[exceeded_stage] += 1
 
-class LoggingFormatter(LoggingFormatterMixin, logging.Formatter):
+    def budget_info(self) -> BudgetInfo:
+        """How often the budget was exceeded (in total and per stage)."""
+        with _budget_lock:
+            counts = collections.Counter(self._budget_counts)
 
-    pass
+        by_stage = {stage: counts[stage] for stage in BUDGET_STAGES}
+        return BudgetInfo(counts["formatted"], sum(by_stage.values()), by_stage)
+
+
+class LoggingFormatter(LoggingFormatterMixin, logging.Formatter):
+    def __init__(
+        self,
+        *args,
+        term_width     : typ.Optional[int] = None,
+        suppress_window: typ.Optional[float] = None,
+        theme          : typ.Optional[Theme] = None,
+        limits         : typ.Optional[Limits] = None,
+        budget         : typ.Optional[float] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.term_width      = term_width
+        self.suppress_window = suppress_window
+        self.theme           = theme
+        self.limits          = limits
+        self.budget          = budget
@@ -4,41 +4,267 @@
 # Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
 # SPDX-License-Identifier: MIT
 
+# NOTE: This module is imported on startup of any program that calls
+#   install(), so it must stay cheap to import. The formatting module
+#   (and colorama) are only imported when the first exception is
+#   handled and the typing module is only imported for type checking.
+
 import os
 import sys
-import types
-import typing as typ
 
-import colorama
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    import types
+    import typing as typ
+
+    from pretty_traceback import formatting
+
+
+PTH_FILENAME = "pretty_traceback.pth"
+
+# Lines of a .pth file which start with "import" are executed by the site module.
+PTH_CONTENT = "import pretty_traceback; pretty_traceback.install()\n"
+
+
+def _stderr_fd(color: bool) -> "typ.Optional[int]":
+    # NOTE: The file descriptor is only written to directly if nothing
+    #   else would process the output, i.e. if sys.stderr was not
+    #   replaced and colorama would not convert/strip ANSI sequences.
+    if sys.stderr is not sys.__stderr__ or not hasattr(os, 'writev'):
+        return None
+    if color and not sys.stderr.isatty():
+        return None
+
+    try:
+        return sys.stderr.fileno()
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# NOTE: The emergency renderer is used for a MemoryError and if the
+#   formatting of an exception fails. It doesn't read source files or
+#   resolve paths, holds no more than one line at a time and writes
+#   directly to the file descriptor of stderr (if it wasn't replaced).
+#   The output has the layout of the default python traceback (without
+#   source lines), so that it can be parsed by parsing/formats.
+
+EMERGENCY_MAX_CHAIN   = 8
+EMERGENCY_MAX_ENTRIES = 64
+EMERGENCY_MAX_MSG_LEN = 1000
+
+# Memory that is allocated by install() and released when the emergency
+# renderer is used, so that a process with an exhausted heap can still
+# write its traceback.
+EMERGENCY_RESERVE_SIZE = 64 * 1024
+
+_emergency_reserve: "typ.List[bytearray]" = []
+
+# same as common.TRACEBACK_HEAD, common.CAUSE_HEAD and common.CONTEXT_HEAD
+_EMERGENCY_TRACEBACK_HEAD = "Traceback (most recent call last):\n"
+_EMERGENCY_CAUSE_HEAD     = (
+    "\nThe above exception was the direct cause of the following exception:\n\n"
+)
+_EMERGENCY_CONTEXT_HEAD = (
+    "\nDuring handling of the above exception, another exception occurred:\n\n"
+)
+
+
+def _reserve_emergency_memory() -> None:
+    if not _emergency_reserve:
+        try:
+            _emergency_reserve.append(bytearray(EMERGENCY_RESERVE_SIZE))
+        except MemoryError:
+            pass
+
+
+def _emergency_fd() -> "typ.Optional[int]":
+    try:
+        sys.stderr.flush()
+        if sys.stderr is sys.__stderr__:
+            return sys.stderr.fileno()
+    except (AttributeError, ValueError, OSError):
+        pass
+    return None
+
+
+def _emergency_write(fd: "typ.Optional[int]", text: str) -> None:
+    if fd is None:
+        sys.stderr.write(text)
+        return
+
+    data = text.encode("utf-8", "backslashreplace")
+    while data:
+        data = data[os.write(fd, data) :]
+
+
+def _emergency_chain(exc_value: BaseException) -> "typ.List[BaseException]":
+    # newest first, cycles are cut off
+    chain: "typ.List[BaseException]" = []
+    cur_exc_value: "typ.Optional[BaseException]" = exc_value
+    while cur_exc_value is not None and len(chain) < EMERGENCY_MAX_CHAIN:
+        for seen_exc in chain:
+            if seen_exc is cur_exc_value:
+                return chain
+        chain.append(cur_exc_value)
+        cur_exc_value = cur_exc_value.__cause__ or cur_exc_value.__context__
+    return chain
+
+
+def _write_emergency_entries(fd: "typ.Optional[int]", traceback: "typ.Any") -> None:
+    num_entries = 0
+    cur_tb      = traceback
+    while cur_tb is not None:
+        num_entries += 1
+        cur_tb = cur_tb.tb_next
+
+    # the first and the last entries are kept
+    head_end   = EMERGENCY_MAX_ENTRIES // 2
+    tail_start = max(head_end, num_entries - EMERGENCY_MAX_ENTRIES // 2)
+
+    idx = 0
+    while traceback is not None:
+        if idx < head_end or idx >= tail_start:
+            code = traceback.tb_frame.f_code
+            location = f'  File "{code.co_filename}", line {traceback.tb_lineno}, in {code.co_name}'
+            _emergency_write(fd, location + "\n")
+        elif idx == head_end:
+            _emergency_write(fd, f"  ... {tail_start - head_end} entries omitted\n")
+        idx += 1
+        traceback = traceback.tb_next
+
+
+def _emergency_msg(exc_value: BaseException) -> str:
+    try:
+        exc_msg = str(exc_value)
+    except Exception:    # pylint:disable=broad-except ; same as traceback.format_exception
+        return "<exception str() failed>"
+
+    if len(exc_msg) > EMERGENCY_MAX_MSG_LEN:
+        return exc_msg[:EMERGENCY_MAX_MSG_LEN] + " ..."
+    else:
+        return exc_msg
+
 
-from pretty_traceback import formatting
+def _write_emergency(exc_value: BaseException, traceback: "typ.Any", note: str) -> None:
+    fd = _emergency_fd()
+    if note:
+        _emergency_write(fd, note + "\n")
 
+    chain = _emergency_chain(exc_value)
+    for idx in range(len(chain) - 1, -1, -1):
+        cur_exc_value = chain[idx]
+        if idx < len(chain) - 1:
+            if cur_exc_value.__cause__ is chain[idx + 1]:
+                _emergency_write(fd, _EMERGENCY_CAUSE_HEAD)
+            else:
+                _emergency_write(fd, _EMERGENCY_CONTEXT_HEAD)
+
+        # same as python, the head is omitted for an exception without a traceback
+        cur_traceback = traceback if idx == 0 else cur_exc_value.__traceback__
+        if cur_traceback is not None:
+            _emergency_write(fd, _EMERGENCY_TRACEBACK_HEAD)
+            _write_emergency_entries(fd, cur_traceback)
+
+        exc_msg = _emergency_msg(cur_exc_value)
+        if exc_msg:
+            _emergency_write(fd, f"{type(cur_exc_value).__name__}: {exc_msg}\n")
+        else:
+            _emergency_write(fd, f"{type(cur_exc_value).__name__}\n")
+
+
+def emergency_excepthook(
+    exc_type : "typ.Type[BaseException]",
+    exc_value: BaseException,
+    traceback: "types.TracebackType",
+    note     : str = "",
+) -> None:
+    """Write a minimal traceback to stderr, with as few allocations as possible.
+
+    This is used by the excepthook of install() for a MemoryError and
+    if the formatting of an exception fails. If even this fails, the
+    exception is written by sys.__excepthook__.
+    """
+    del _emergency_reserve[:]
+    try:
+        _write_emergency(exc_value, traceback, note)
+    except Exception:    # pylint:disable=broad-except ; last resort
+        sys.__excepthook__(exc_type, exc_value, traceback)
+    finally:
+        _reserve_emergency_memory()
+
+
+def init_excepthook(
+    color     : bool,
+    term_width: "typ.Optional[int]" = None,
+    theme     : "typ.Optional[formatting.Theme]" = None,
+    output    : str = "text",
+    limits    : "typ.Optional[formatting.Limits]" = None,
+) -> "typ.Callable":
+    _reserve_emergency_memory()
 
-def init_excepthook(color: bool) -> typ.Callable:
     def excepthook(
-        exc_type: typ.Type[BaseException],
+        exc_type: "typ.Type[BaseException]",
         exc_value: BaseException,
-        traceback: types.TracebackType,
+        traceback: "types.TracebackType",
     ) -> None:
-        # pylint:disable=unused-argument
-        tb_str = formatting.exc_to_traceback_str(exc_value, traceback, color) + "\n"
-        if color:
+        if isinstance(exc_value, MemoryError):
+            emergency_excepthook(exc_type, exc_value, traceback)
+            return
+
+        try:
+            _write_formatted(exc_value, traceback)
+            return
+        except Exception as ex:    # pylint:disable=broad-except ; fall back to emergency output
+            note = f"pretty_traceback: formatting failed ({type(ex).__name__})"
+
+        # NOTE: Called outside of the except block, so that the frames
+        #   of the failed formatting can be released.
+        emergency_excepthook(exc_type, exc_value, traceback, note)
+
+    def _write_formatted(exc_value: BaseException, traceback: "types.TracebackType") -> None:
+        # pylint:disable=import-outside-toplevel   ; deferred until the first exception
+        from pretty_traceback import formatting
+
+        tracebacks = formatting.exc_to_tracebacks(exc_value, traceback, True, limits)
+
+        if output == "json":
+            from pretty_traceback import structured
+
+            structured.write_json(tracebacks, sys.stderr)
+            return
+
+        import colorama
+
+        write_args = (color, term_width, theme, limits)
+
+        stderr_fd = _stderr_fd(color)
+        if stderr_fd is not None:
+            sys.stderr.flush()
+            encoding = getattr(sys.stderr, 'encoding', None) or "utf-8"
+            formatting.write_tracebacks(tracebacks, stderr_fd, *write_args, encoding=encoding)
+        elif color:
             colorama.init()
             try:
-                sys.stderr.write(tb_str)
+                formatting.write_tracebacks(tracebacks, sys.stderr, *write_args)
             finally:
                 colorama.deinit()
         else:
-            sys.stderr.write(tb_str)
+            formatting.write_tracebacks(tracebacks, sys.stderr, *write_args)
 
+    setattr(excepthook, '_is_pretty_traceback', True)
     return excepthook
 
 
 def install(
-    envvar: typ.Optional[str] = None,
+    envvar: "typ.Optional[str]" = None,
     color: bool = True,
     only_tty: bool = True,
     only_hook_if_default_excepthook: bool = True,
+    term_width: "typ.Optional[int]" = None,
+    theme: "typ.Optional[formatting.Theme]" = None,
+    output: str = "text",
+    limits: "typ.Optional[formatting.Limits]" = None,
 ) -> None:
     """Hook the current excepthook to the pretty_traceback.
 
@@ -48,7 +274,22 @@ def install(
     Color output respects the NO_COLOR environment variable
     (https://no-color.org/). If NO_COLOR is set (regardless of
     its value), color output will be disabled.
+
+    If `term_width` is set, the output is formatted for that width
+    instead of probing the terminal.
+
+    The colors of the output can be changed with a custom
+    `pretty_traceback.formatting.Theme`.
+
+    With `output="json"`, each traceback chain is written as one
+    line of JSON (see `pretty_traceback.structured`).
+
+    The size of the output is bounded by `limits` (default:
+    `pretty_traceback.formatting.DEFAULT_LIMITS`).
     """
+    if output not in ("text", "json"):
+        raise ValueError(f"Invalid output={output!r}, expected 'text' or 'json'")
+
     if envvar and os.environ.get(envvar, "0") == "0":
         return
 
@@ -68,9 +309,276 @@ def install(
     if only_hook_if_default_excepthook and not is_default_exepthook:
         return
 
-    sys.excepthook = init_excepthook(color=color)
+    excepthook = init_excepthook(
+        color=color, term_width=term_width, theme=theme, output=output, limits=limits
+    )
+    sys.excepthook = excepthook
+    _install_secondary_hooks(excepthook, only_hook_if_default_excepthook)
 
 
 def uninstall() -> None:
-    """Restore the default excepthook."""
+    """Restore the default excepthook (and all other hooks set by install)."""
     sys.excepthook = sys.__excepthook__
+    _post_import_hook.callbacks.clear()
+
+    if "threading" in sys.modules:
+        threading = sys.modules["threading"]
+        if getattr(threading.excepthook, '_is_pretty_traceback', False):
+            threading.excepthook = threading.__excepthook__
+
+    if getattr(sys, 'unraisablehook', None) and getattr(
+        sys.unraisablehook, '_is_pretty_traceback', False
+    ):
+        sys.unraisablehook = sys.__unraisablehook__
+
+    if "asyncio.base_events" in sys.modules:
+        loop_type = sys.modules["asyncio.base_events"].BaseEventLoop
+        orig_handler = getattr(loop_type.default_exception_handler, '_orig_handler', None)
+        if orig_handler:
+            loop_type.default_exception_handler = orig_handler
+
+
+# NOTE: Modules that are not imported yet (threading, asyncio) are only
+#   patched once they are imported by the program, so that install()
+#   doesn't add their import time to every program.
+
+
+class _LoaderProxy:
+    def __init__(self, loader: "typ.Any", callback: "typ.Callable") -> None:
+        self._loader   = loader
+        self._callback = callback
+
+    def create_module(self, spec: "typ.Any") -> "typ.Any":
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: "types.ModuleType") -> None:
+        self._loader.exec_module(module)
+        self._callback(module)
+
+    def __getattr__(self, name: str) -> "typ.Any":
+        return getattr(self._loader, name)
+
+
+class _PostImportHook:
+    """Meta path finder, which calls a function after a module is imported."""
+
+    def __init__(self) -> None:
+        self.callbacks: "typ.Dict[str, typ.Callable]" = {}
+
+    def register(self, module_name: str, callback: "typ.Callable") -> None:
+        if module_name in sys.modules:
+            callback(sys.modules[module_name])
+            return
+
+        self.callbacks[module_name] = callback
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def find_spec(
+        self, fullname: str, path: "typ.Any" = None, target: "typ.Any" = None
+    ) -> "typ.Any":
+        callback = self.callbacks.pop(fullname, None)
+        if callback is None:
+            return None
+
+        if not self.callbacks and self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, 'find_spec', None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is None or not hasattr(spec.loader, 'exec_module'):
+            return None
+
+        spec.loader = _LoaderProxy(spec.loader, callback)
+        return spec
+
+
+_post_import_hook = _PostImportHook()
+
+
+def _write_with_header(
+    excepthook: "typ.Callable", header: str, exc_value: BaseException, traceback: "typ.Any"
+) -> None:
+    if header:
+        sys.stderr.write(header + "\n")
+    excepthook(type(exc_value), exc_value, traceback)
+
+
+def init_threading_excepthook(excepthook: "typ.Callable") -> "typ.Callable":
+    def threading_excepthook(args: "typ.Any") -> None:
+        if args.exc_type is SystemExit or args.exc_value is None:
+            return    # same as the default threading.excepthook
+
+        name   = args.thread.name if args.thread else "<unknown>"
+        header = f"Exception in thread {name}:"
+        _write_with_header(excepthook, header, args.exc_value, args.exc_traceback)
+
+    setattr(threading_excepthook, '_is_pretty_traceback', True)
+    return threading_excepthook
+
+
+# An unraisable exception (e.g. in __del__) is written at most this
+# many times per location and UNRAISABLE_WINDOW (in seconds).
+UNRAISABLE_MAX_REPEATS = 5
+UNRAISABLE_WINDOW      = 10.0
+
+
+def _unraisable_location(unraisable: "typ.Any") -> str:
+    # the innermost frame, no source lines or paths are resolved here
+    traceback = unraisable.exc_traceback
+    if traceback is None:
+        location = repr(type(unraisable.object))
+    else:
+        while traceback.tb_next is not None:
+            traceback = traceback.tb_next
+        location = f"{traceback.tb_frame.f_code.co_filename}:{traceback.tb_lineno}"
+    return f"{unraisable.exc_type.__name__} at {location}"
+
+
+def init_unraisablehook(excepthook: "typ.Callable") -> "typ.Callable":
+    trackers: "typ.List[typ.Any]" = []
+
+    def unraisablehook(unraisable: "typ.Any") -> None:
+        # pylint:disable=import-outside-toplevel   ; deferred until the first exception
+        if unraisable.exc_value is None:
+            sys.__unraisablehook__(unraisable)
+            return
+
+        if not trackers:
+            from pretty_traceback import dedup
+
+            trackers.append(dedup.DuplicateTracker(UNRAISABLE_WINDOW))
+
+        location       = _unraisable_location(unraisable)
+        num_duplicates = trackers[0].count(location)
+        if num_duplicates > UNRAISABLE_MAX_REPEATS:
+            return
+        if num_duplicates == UNRAISABLE_MAX_REPEATS:
+            sys.stderr.write(
+                f"Further exceptions ({location}) are ignored for {UNRAISABLE_WINDOW:g} seconds\n"
+            )
+            return
+
+        err_msg = unraisable.err_msg or "Exception ignored in"
+        if unraisable.object is None:
+            header = err_msg + ":"
+        else:
+            try:
+                header = f"{err_msg}: {unraisable.object!r}"
+            except Exception:    # pylint:disable=broad-except ; same as the default hook
+                header = f"{err_msg}: <object repr() failed>"
+        _write_with_header(excepthook, header, unraisable.exc_value, unraisable.exc_traceback)
+
+    setattr(unraisablehook, '_is_pretty_traceback', True)
+    return unraisablehook
+
+
+def init_asyncio_exception_handler(excepthook: "typ.Callable") -> "typ.Callable":
+    def asyncio_exception_handler(loop: "typ.Any", context: "typ.Dict[str, typ.Any]") -> None:
+        exc_value = context.get('exception')
+        if not isinstance(exc_value, BaseException):
+            # nothing to format, e.g. "Task was destroyed but it is pending!"
+            orig_handler = getattr(type(loop).default_exception_handler, '_orig_handler', None)
+            (orig_handler or type(loop).default_exception_handler)(loop, context)
+            return
+
+        lines = [context.get('message') or "Unhandled exception in event loop"]
+        for key in sorted(context):
+            if key not in ('message', 'exception'):
+                lines.append(f"{key}: {context[key]!r}")
+        _write_with_header(excepthook, "\n".join(lines), exc_value, exc_value.__traceback__)
+
+    return asyncio_exception_handler
+
+
+def asyncio_exception_handler(loop: "typ.Any", context: "typ.Dict[str, typ.Any]") -> None:
+    """Exception handler for `loop.set_exception_handler`.
+
+    Uses the options of install(), if it was called.
+    """
+    excepthook = sys.excepthook
+    if not getattr(excepthook, '_is_pretty_traceback', False):
+        isatty     = getattr(sys.stderr, "isatty", lambda: False)
+        excepthook = init_excepthook(color=isatty() and "NO_COLOR" not in os.environ)
+    init_asyncio_exception_handler(excepthook)(loop, context)
+
+
+def _patch_threading(excepthook: "typ.Callable", only_if_default: bool) -> "typ.Callable":
+    def _patch(threading: "types.ModuleType") -> None:
+        # pylint:disable=comparison-with-callable   ; intentional
+        is_default = threading.excepthook == threading.__excepthook__
+        if is_default or not only_if_default:
+            threading.excepthook = init_threading_excepthook(excepthook)
+
+    return _patch
+
+
+def _patch_asyncio(excepthook: "typ.Callable", only_if_default: bool) -> "typ.Callable":
+    def _patch(base_events: "types.ModuleType") -> None:
+        loop_type    = base_events.BaseEventLoop
+        orig_handler = loop_type.default_exception_handler
+        if hasattr(orig_handler, '_orig_handler'):
+            orig_handler = orig_handler._orig_handler    # installed before
+        elif only_if_default and orig_handler.__module__ != base_events.__name__:
+            return
+
+        handler = init_asyncio_exception_handler(excepthook)
+
+        def default_exception_handler(loop: "typ.Any", context: "typ.Dict[str, typ.Any]") -> None:
+            handler(loop, context)
+
+        setattr(default_exception_handler, '_orig_handler', orig_handler)
+        loop_type.default_exception_handler = default_exception_handler
+
+    return _patch
+
+
+def _install_secondary_hooks(excepthook: "typ.Callable", only_if_default: bool) -> None:
+    # NOTE: All hooks use the same excepthook, and with it the same
+    #   options and the same caches of the formatting module.
+    if hasattr(sys, 'unraisablehook'):
+        # pylint:disable=comparison-with-callable   ; intentional
+        is_default = sys.unraisablehook == sys.__unraisablehook__
+        if is_default or not only_if_default:
+            sys.unraisablehook = init_unraisablehook(excepthook)
+
+    _post_import_hook.register("threading", _patch_threading(excepthook, only_if_default))
+    _post_import_hook.register("asyncio.base_events", _patch_asyncio(excepthook, only_if_default))
+
+
+def _default_site_dir() -> str:
+    # pylint:disable=import-outside-toplevel   ; only used by the cli
+    import sysconfig
+
+    return sysconfig.get_paths()["purelib"]
+
+
+def install_pth(site_dir: "typ.Optional[str]" = None) -> str:
+    """Activate pretty_traceback for every program of this environment.
+
+    A .pth file is written to site_dir (default: the site-packages
+    directory of the current interpreter), which calls install() on
+    startup. Returns the path of the .pth file.
+    """
+    pth_path = os.path.join(site_dir or _default_site_dir(), PTH_FILENAME)
+    with open(pth_path, mode="w", encoding="utf-8") as fobj:
+        fobj.write(PTH_CONTENT)
+    return pth_path
+
+
+def uninstall_pth(site_dir: "typ.Optional[str]" = None) -> "typ.Optional[str]":
+    """Remove the .pth file written by install_pth (if it exists)."""
+    pth_path = os.path.join(site_dir or _default_site_dir(), PTH_FILENAME)
+    if os.path.exists(pth_path):
+        os.remove(pth_path)
+        return pth_path
+    else:
+        return None
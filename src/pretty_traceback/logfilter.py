@@ -0,0 +1,58 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+
+import typing as typ
+
+import pretty_traceback.common as com
+from pretty_traceback import parsing
+from pretty_traceback import formatting
+
+READ_SIZE = 64 * 1024
+
+
+class FilterOptions(typ.NamedTuple):
+
+    color     : bool
+    term_width: typ.Optional[int]
+    encoding  : str
+
+
+def _render(tb_tup: com.Traceback, opts: FilterOptions) -> bytes:
+    tb_str = formatting.format_tracebacks([tb_tup], opts.color, opts.term_width)
+    return (tb_str + "\n").encode(opts.encoding, "replace")
+
+
+def iter_filtered(items: parsing.ParserItems, opts: FilterOptions) -> typ.Iterator[bytes]:
+    for item in items:
+        if isinstance(item, bytes):
+            yield item
+        else:
+            yield _render(item, opts)
+
+
+def _read_chunk(stream: typ.IO[bytes], size: int = READ_SIZE) -> bytes:
+    # NOTE: read1 returns as soon as some data is available, rather than
+    #   waiting for a full buffer, which matters for `tail -f` style input.
+    read1 = getattr(stream, 'read1', None)
+    if read1 is None:
+        return stream.read(size)
+    else:
+        return typ.cast(bytes, read1(size))
+
+
+def filter_stream(in_stream: typ.IO[bytes], out: typ.IO[bytes], opts: FilterOptions) -> None:
+    """Copy in_stream to out, replacing tracebacks with their formatted version."""
+    parser = parsing.TracebackParser(encoding=opts.encoding)
+    while True:
+        chunk = _read_chunk(in_stream)
+        if not chunk:
+            break
+
+        out.writelines(iter_filtered(parser.feed_items(chunk), opts))
+        out.flush()
+
+    out.writelines(iter_filtered(parser.close_items(), opts))
+    out.flush()
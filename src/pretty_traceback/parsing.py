@@ -8,6 +8,7 @@ import re
 import typing as typ
 
 import pretty_traceback.common as com
+from pretty_traceback import columnar
 
 # TODO (mb 2020-08-12): path/module with doublequotes in them.
 #   Not even sure what python does with that.
@@ -26,88 +27,136 @@ File
 LOCATION_RE = re.compile(LOCATION_PATTERN, flags=re.VERBOSE)
 
 
-def _parse_entries(entry_lines: typ.List[str]) -> typ.Iterable[com.Entry]:
-    i = 0
-    while i < len(entry_lines):
-        line = entry_lines[i]
-        i += 1
-        loc_match = LOCATION_RE.match(line)
-        if loc_match is None:
-            continue
+# NOTE: The lines of a traceback are scanned once. Each line is
+#   classified by its prefix, only the lines of entries are matched
+#   with LOCATION_RE. This is linear in the size of the input.
 
-        if i < len(entry_lines):
-            maybe_src_ctx = entry_lines[i]
-        else:
-            maybe_src_ctx = ""
+ENTRY_PREFIX = '  File "'
+SRC_PREFIX   = "    "
 
-        is_src_ctx = maybe_src_ctx.startswith("    ")
-        if is_src_ctx:
-            src_ctx = maybe_src_ctx.strip()
-            i += 1
-        else:
-            src_ctx = ""
+# python >= 3.11 marks the failing expression, e.g. "    ~~~^^^^^"
+CARET_CHARS = "^~"
+
+REPEAT_RE = re.compile(r"\s*\[Previous line repeated (\d+) more times?\]")
+
+# Name of the exception of a traceback that ends before its exception line.
+TRUNCATED_EXC_NAME = "<truncated>"
 
-        module, lineno, call = loc_match.groups()
 
-        yield com.Entry(module, call, lineno, src_ctx)
+def _is_caret_line(line: str) -> bool:
+    stripped = line.strip()
+    return bool(stripped) and not stripped.strip(CARET_CHARS)
+
+
+def _parse_entries(entry_lines: typ.List[str]) -> com.Entries:
+    entries: com.Entries = []
+
+    # fields of the current entry, which is appended once it's complete
+    loc_match: typ.Optional[typ.Match[str]] = None
+    src_ctx = ""
+    caret   = ""
+    repeat  = 0
+
+    for line in entry_lines:
+        if line.startswith(SRC_PREFIX):
+            # the first indented line is the source, the second may be the carets
+            if loc_match is None or caret:
+                continue
+            if not src_ctx:
+                src_ctx = line.strip()
+            elif _is_caret_line(line):
+                caret = line[len(SRC_PREFIX) :].rstrip()
+        elif line.startswith(ENTRY_PREFIX):
+            new_match = LOCATION_RE.match(line)
+            if new_match is None:
+                continue
+            if loc_match:
+                module, lineno, call = loc_match.groups()
+                entries.append(com.Entry(module, call, lineno, src_ctx, caret, repeat))
+            loc_match = new_match
+            src_ctx   = ""
+            caret     = ""
+            repeat    = 0
+        elif loc_match is not None:
+            repeat_match = REPEAT_RE.match(line)
+            if repeat_match:
+                repeat += int(repeat_match.group(1))
+
+    if loc_match:
+        module, lineno, call = loc_match.groups()
+        entries.append(com.Entry(module, call, lineno, src_ctx, caret, repeat))
+    return entries
 
 
 TRACE_HEADERS = {com.TRACEBACK_HEAD, com.CAUSE_HEAD, com.CONTEXT_HEAD}
 
 
-def _iter_tracebacks(trace: str) -> typ.Iterable[com.Traceback]:
-    lines = trace.strip().splitlines()
+def init_traceback(
+    entry_lines: typ.List[str],
+    exc_line   : str,
+    is_caused  : bool,
+    is_context : bool,
+) -> com.Traceback:
+    """A traceback from the lines of its entries and its exception line.
 
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
+    entry_lines are the (indented) lines between the head of the traceback
+    and its exception line, e.g. '  File "x.py", line 1, in <module>'.
+    """
+    if ": " in exc_line:
+        exc_name, exc_msg = exc_line.split(": ", 1)
+    else:
+        exc_name = exc_line
+        exc_msg  = ""
 
-        # skip empty lines
-        if not line:
-            i += 1
-            continue
+    return com.Traceback(
+        exc_name=exc_name,
+        exc_msg=exc_msg,
+        entries=_parse_entries(entry_lines),
+        is_caused=is_caused,
+        is_context=is_context,
+    )
 
-        is_caused  = False
-        is_context = False
 
-        if line.startswith(com.CAUSE_HEAD):
-            is_caused = True
-            i += 1
-        elif line.startswith(com.CONTEXT_HEAD):
-            is_context = True
-            i += 1
+def _iter_tracebacks(trace: str) -> typ.Iterable[com.Traceback]:
+    is_caused   = False
+    is_context  = False
+    is_started  = False
+    entry_lines: typ.List[str] = []
 
-        # skip empty lines and tb head
-        while i < len(lines):
-            line = lines[i].strip()
-            if not line or line.startswith(com.TRACEBACK_HEAD):
-                i += 1
-            else:
-                break
+    for line in trace.splitlines():
+        # entries, source lines, carets and repetitions are indented
+        if line.startswith("  ") and (is_started or entry_lines):
+            entry_lines.append(line)
+            continue
 
-        # accumulate entry lines
-        entry_lines: typ.List[str] = []
-        while i < len(lines) and lines[i].startswith("  "):
-            entry_lines.append(lines[i])
-            i += 1
+        stripped = line.strip()
+        if not stripped:
+            continue
 
-        exc_line = lines[i]
-        if ": " in exc_line:
-            exc_name, exc_msg = exc_line.split(": ", 1)
+        if stripped.startswith(com.TRACEBACK_HEAD):
+            is_started = True
+        elif entry_lines or is_started:
+            # the exception line
+            yield init_traceback(entry_lines, stripped, is_caused, is_context)
+            is_caused   = False
+            is_context  = False
+            is_started  = False
+            entry_lines = []
+        elif stripped.startswith(com.CAUSE_HEAD):
+            is_caused = True
+        elif stripped.startswith(com.CONTEXT_HEAD):
+            is_context = True
+        elif line.startswith("  "):
+            # entries of a traceback without a head
+            entry_lines.append(line)
         else:
-            exc_name = exc_line
-            exc_msg  = ""
+            # an exception without a traceback
+            yield init_traceback(entry_lines, stripped, is_caused, is_context)
+            is_caused  = False
+            is_context = False
 
-        entries = list(_parse_entries(entry_lines))
-        yield com.Traceback(
-            exc_name=exc_name,
-            exc_msg=exc_msg,
-            entries=entries,
-            is_caused=is_caused,
-            is_context=is_context,
-        )
-
-        i += 1
+    if entry_lines or is_started:
+        yield init_traceback(entry_lines, TRUNCATED_EXC_NAME, is_caused, is_context)
 
 
 def parse_tracebacks(trace: str) -> com.Tracebacks:
@@ -118,5 +167,324 @@ def parse_tracebacks(trace: str) -> com.Tracebacks:
                    "Traceback (most recent call last):"
                ending with the last line in the chain, e.g.
                    "FileNotFoundError: [Errno 2] No such ..."
+
+    A traceback that ends before its exception line (e.g. a truncated
+    log) is parsed with TRUNCATED_EXC_NAME as the name of its exception.
     """
     return list(_iter_tracebacks(trace))
+
+
+TRACEBACK_HEAD_BYTES = com.TRACEBACK_HEAD.encode("ascii")
+CAUSE_HEAD_BYTES     = com.CAUSE_HEAD.encode("ascii")
+CONTEXT_HEAD_BYTES   = com.CONTEXT_HEAD.encode("ascii")
+
+# Upper bound for the number of lines of a single traceback. Longer
+# tracebacks are discarded, so that the state of a parser stays bounded.
+MAX_TRACEBACK_LINES = 100000
+
+# Lines longer than this are truncated (only relevant for the state that
+# is kept between chunks, complete lines are never copied).
+MAX_LINE_LEN = 1024 * 1024
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+ParserItem  = typ.Union[bytes, com.Traceback]
+ParserItems = typ.List[ParserItem]
+
+
+class TracebackParser:
+    """Incremental parser for tracebacks in a stream of log output.
+
+    Chunks of text are passed to `feed`, which returns each traceback
+    as soon as its exception line has been parsed. Any text that is not
+    part of a traceback is skipped.
+
+    Alternatively `feed_items` returns the text that is not part of a
+    traceback (as `bytes`), interleaved with the parsed tracebacks. A
+    parser instance should use only one of `feed` or `feed_items`.
+
+    Chunks may be `bytes` or `str` (which is encoded with `encoding`). The
+    `offset` attribute is the number of bytes after which parsing can
+    be resumed, e.g. after a restart:
+
+        parser = TracebackParser(offset=offset)
+        fobj.seek(offset)
+        ...
+
+    Chains of tracebacks are returned link by link. The flags `is_caused`
+    and `is_context` tell whether a traceback continues the chain of the
+    previous one.
+    """
+
+    # pylint:disable=too-many-instance-attributes   ; parser state
+
+    def __init__(self, offset: int = 0, encoding: str = "utf-8") -> None:
+        self.offset   = offset
+        self.encoding = encoding
+
+        # number of bytes of all complete lines that have been processed
+        self._pos = offset
+        # the incomplete last line of the previous chunk
+        self._partial: bytes = b""
+        # remainder of a line that was too long is dropped or passed through
+        self._is_truncated     : bool = False
+        self._is_truncated_text: bool = False
+        # After a traceback (or at the start of a stream), each line is
+        # checked for the head of a chained traceback. Otherwise we can
+        # skip ahead to the next occurrence of TRACEBACK_HEAD.
+        self._is_line_mode: bool = True
+
+        self._in_traceback: bool = False
+        self._is_caused   : bool = False
+        self._is_context  : bool = False
+        self._entry_lines : typ.List[str] = []
+        # raw lines of the current traceback, in case it is not completed
+        self._held_lines: typ.List[bytes] = []
+
+    def feed(self, chunk: typ.Union[bytes, str]) -> com.Tracebacks:
+        """Parse a chunk and return the tracebacks that were completed."""
+        items = self._feed(chunk, keep_text=False)
+        return typ.cast(com.Tracebacks, items)
+
+    def feed_items(self, chunk: typ.Union[bytes, str]) -> ParserItems:
+        """Parse a chunk and return completed tracebacks and any other text."""
+        return self._feed(chunk, keep_text=True)
+
+    def close(self) -> com.Tracebacks:
+        """Parse any remaining incomplete line at the end of the stream.
+
+        A traceback that was not completed is returned with
+        TRUNCATED_EXC_NAME as the name of its exception.
+        """
+        items = self._close(keep_text=False)
+        return typ.cast(com.Tracebacks, items)
+
+    def close_items(self) -> ParserItems:
+        """Parse the remaining text and release an incomplete traceback."""
+        return self._close(keep_text=True)
+
+    @property
+    def is_idle(self) -> bool:
+        return not (self._in_traceback or self._is_caused or self._is_context)
+
+    def _feed(self, chunk: typ.Union[bytes, str], keep_text: bool) -> ParserItems:
+        if isinstance(chunk, str):
+            # NOTE: Encoded the same as bytes chunks are decoded, so that
+            #   str and bytes chunks can be mixed and offset stays valid.
+            chunk = chunk.encode(self.encoding, "replace")
+
+        items: ParserItems = []
+        if self._is_truncated:
+            # the remainder of a line that was truncated
+            nl_idx = chunk.find(b"\n")
+            if nl_idx < 0:
+                nl_idx = len(chunk)
+            else:
+                self._is_truncated = False
+
+            self._pos += nl_idx
+            if keep_text and self._is_truncated_text and nl_idx > 0:
+                items.append(chunk[:nl_idx])
+            chunk = chunk[nl_idx:]
+
+        if self._partial:
+            data = self._partial + chunk
+        else:
+            data = chunk
+
+        end = data.rfind(b"\n") + 1
+        items.extend(self._iter_items(data, end, keep_text))
+
+        partial = data[end:]
+        if len(partial) > MAX_LINE_LEN:
+            self._is_truncated      = True
+            self._is_truncated_text = keep_text and self.is_idle
+            if self._is_truncated_text:
+                # NOTE: A head is short, so this can't be the start of a traceback.
+                self._pos += len(partial)
+                items.append(partial)
+                partial = b""
+            else:
+                self._pos += len(partial) - MAX_LINE_LEN
+                partial = partial[:MAX_LINE_LEN]
+
+        self._partial = partial
+        return items
+
+    def _close(self, keep_text: bool) -> ParserItems:
+        data = self._partial
+        self._partial      = b""
+        self._is_truncated = False
+
+        items: ParserItems = []
+        if data:
+            items.extend(self._iter_items(data + b"\n", len(data) + 1, keep_text))
+            # the newline was not part of the input
+            self._pos -= 1
+            if self.is_idle:
+                self.offset = self._pos
+
+            if self._held_lines:
+                self._held_lines[-1] = self._held_lines[-1][:-1]
+            elif keep_text and items and isinstance(items[-1], bytes):
+                items[-1] = items[-1][:-1]
+
+        if self._held_lines:
+            items.append(b"".join(self._held_lines))
+            self._held_lines = []
+        elif self._in_traceback and not keep_text:
+            items.append(
+                init_traceback(
+                    self._entry_lines, TRUNCATED_EXC_NAME, self._is_caused, self._is_context
+                )
+            )
+        self._reset()
+        return items
+
+    def _iter_items(self, data: bytes, end: int, keep_text: bool) -> typ.Iterator[ParserItem]:
+        start = 0
+        while start < end:
+            if not self._is_line_mode:
+                line_start = self._skip_to_head(data, start, end)
+                if keep_text and line_start > start:
+                    yield data[start:line_start]
+
+                start = line_start
+                if start >= end:
+                    break
+
+            line_end = data.index(b"\n", start) + 1
+            line     = data[start:line_end]
+
+            self._pos += line_end - start
+            start = line_end
+
+            if keep_text:
+                for item in self._push_text_line(line):
+                    yield item
+            else:
+                tb_tup = self._push_line(line.rstrip(b"\r\n"))
+                if tb_tup:
+                    yield tb_tup
+
+            if self.is_idle:
+                self.offset = self._pos
+
+    def _push_text_line(self, line: bytes) -> ParserItems:
+        was_idle = self.is_idle
+        tb_tup   = self._push_line(line.rstrip(b"\r\n"))
+        if tb_tup:
+            self._held_lines = []
+            return [tb_tup]
+        elif not self.is_idle:
+            self._held_lines.append(line)
+            return []
+        elif was_idle:
+            return [line]
+        else:
+            # the traceback (or chain) was not completed after all
+            self._held_lines.append(line)
+            held_text = b"".join(self._held_lines)
+            self._held_lines = []
+            return [held_text]
+
+    def _skip_to_head(self, data: bytes, start: int, end: int) -> int:
+        # Fast path for text that is not part of a traceback: Skip
+        # directly to the start of the next line that contains a head.
+        idx = data.find(TRACEBACK_HEAD_BYTES, start, end)
+        if idx < 0:
+            line_start = end
+        else:
+            line_start = max(start, data.rfind(b"\n", start, idx) + 1)
+
+        self._pos  += line_start - start
+        self.offset = self._pos
+        return line_start
+
+    def _push_line(self, line: bytes) -> typ.Optional[com.Traceback]:
+        if self._in_traceback:
+            return self._push_traceback_line(line)
+
+        stripped = line.strip()
+        if stripped.startswith(TRACEBACK_HEAD_BYTES):
+            self._in_traceback = True
+            self._is_line_mode = True
+        elif stripped.startswith(CAUSE_HEAD_BYTES):
+            self._is_caused  = True
+            self._is_context = False
+        elif stripped.startswith(CONTEXT_HEAD_BYTES):
+            self._is_caused  = False
+            self._is_context = True
+        elif stripped:
+            self._is_caused    = False
+            self._is_context   = False
+            self._is_line_mode = False
+        return None
+
+    def _push_traceback_line(self, line: bytes) -> typ.Optional[com.Traceback]:
+        entry_lines = self._entry_lines
+        if line.startswith(b"  "):
+            if len(entry_lines) < MAX_TRACEBACK_LINES:
+                entry_lines.append(line.decode(self.encoding, "replace"))
+            else:
+                self._reset()
+                self._is_line_mode = False
+            return None
+
+        if not entry_lines:
+            stripped = line.strip()
+            if not stripped or stripped.startswith(TRACEBACK_HEAD_BYTES):
+                return None
+
+        exc_line = line.decode(self.encoding, "replace")
+        tb_tup   = init_traceback(entry_lines, exc_line, self._is_caused, self._is_context)
+        self._reset()
+        return tb_tup
+
+    def _reset(self) -> None:
+        self._in_traceback = False
+        self._is_caused    = False
+        self._is_context   = False
+        self._is_line_mode = True
+        self._entry_lines  = []
+
+
+def iter_stream_tracebacks(
+    stream: typ.IO[bytes], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> typ.Iterator[com.Traceback]:
+    """Parse tracebacks from a file or pipe without reading all of it."""
+    parser = TracebackParser()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        for tb_tup in parser.feed(chunk):
+            yield tb_tup
+
+    for tb_tup in parser.close():
+        yield tb_tup
+
+
+def read_table(
+    stream    : typ.IO[bytes],
+    table     : typ.Optional[columnar.EntryTable] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> columnar.EntryTable:
+    """Parse tracebacks from a stream into a (new or existing) EntryTable.
+
+    Only the tracebacks of one chunk are held as tuples at any time,
+    so this uses much less memory than a list of all tracebacks.
+    """
+    if table is None:
+        table = columnar.EntryTable()
+
+    parser = TracebackParser()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        table.extend(parser.feed(chunk))
+
+    table.extend(parser.close())
+    return table
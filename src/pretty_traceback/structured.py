@@ -0,0 +1,282 @@
+# This file is part of the pretty-traceback project
+# https://github.com/mbarkhau/pretty-traceback
+#
+# Copyright (c) 2020-2024 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+"""Structured (JSON/NDJSON) output of traceback chains.
+
+A chain is written as one compact JSON object:
+
+    {
+        "fingerprint": "8c1f4e3a5b7d9f01",
+        "aliases"    : [["<pwd>", "/home/user/myproject/"], ...],
+        "tracebacks" : [
+            {
+                "exc_name"  : "ValueError",
+                "exc_msg"   : "invalid value",
+                "is_caused" : false,
+                "is_context": false,
+                "entries"   : [
+                    {
+                        "module" : "/home/user/myproject/cli.py",
+                        "call"   : "main",
+                        "lineno" : 12,
+                        "src_ctx": "run()"
+                    },
+                    ...
+                ]
+            },
+            ...
+        ]
+    }
+
+The traceback of an exception group has an additional "members" field
+with the distinct sub-exceptions of the group:
+
+    "members": [{"count": 998, "tracebacks": [...]}, ...]
+
+Entries of parsed tracebacks may have the additional fields "caret"
+(the markers below "src_ctx", python 3.11+) and "repeat" (see
+common.Entry). They are omitted if they are empty.
+
+Since the output contains no newlines, a sequence of chains separated
+by newlines is valid NDJSON.
+"""
+
+import json
+import logging
+import typing as typ
+
+import pretty_traceback.common as com
+from pretty_traceback import dedup
+from pretty_traceback import formatting
+
+# Number of entries that are serialized before they are written to the output.
+WRITE_BATCH_SIZE = 256
+
+_encode_str = json.encoder.encode_basestring
+
+
+def _lineno_json(lineno: str) -> str:
+    # NOTE: isdecimal excludes e.g. "²", which int() can't parse, the
+    #   comparison excludes non-ascii digits and leading zeros, which
+    #   are not valid in a JSON number.
+    if lineno.isdecimal() and str(int(lineno)) == lineno:
+        return lineno
+    else:
+        return _encode_str(lineno)
+
+
+def _entry_json(entry: com.Entry) -> str:
+    return "".join(
+        (
+            '{"module":',
+            _encode_str(entry.module),
+            ',"call":',
+            _encode_str(entry.call),
+            ',"lineno":',
+            _lineno_json(entry.lineno),
+            ',"src_ctx":',
+            _encode_str(entry.src_ctx),
+            (',"caret":' + _encode_str(entry.caret)) if entry.caret else "",
+            (',"repeat":' + str(entry.repeat)) if entry.repeat else "",
+            "}",
+        )
+    )
+
+
+def _bool_json(val: bool) -> str:
+    return "true" if val else "false"
+
+
+def _load_member(member: com.Member) -> com.Member:
+    return member._replace(tracebacks=_load_tracebacks(member.tracebacks))
+
+
+def _load_tracebacks(tracebacks: com.Tracebacks) -> com.Tracebacks:
+    # source lines that were not loaded yet (see exc_to_tracebacks(lazy_src=True))
+    return [
+        tb_tup._replace(
+            entries=formatting.load_src_ctx(tb_tup.entries),
+            members=tuple(map(_load_member, tb_tup.members)),
+        )
+        for tb_tup in tracebacks
+    ]
+
+
+def _iter_tracebacks_json(tracebacks: com.Tracebacks, batch_size: int) -> typ.Iterable[str]:
+    yield "["
+    for i, tb_tup in enumerate(tracebacks):
+        yield "".join(
+            (
+                "," if i else "",
+                '{"exc_name":',
+                _encode_str(tb_tup.exc_name),
+                ',"exc_msg":',
+                _encode_str(tb_tup.exc_msg),
+                ',"is_caused":',
+                _bool_json(tb_tup.is_caused),
+                ',"is_context":',
+                _bool_json(tb_tup.is_context),
+                ',"entries":[',
+            )
+        )
+        entries = tb_tup.entries
+        for start in range(0, len(entries), batch_size):
+            chunk = ",".join(map(_entry_json, entries[start : start + batch_size]))
+            yield ("," + chunk) if start else chunk
+        yield "]"
+
+        if tb_tup.members:
+            yield ',"members":['
+            for j, member in enumerate(tb_tup.members):
+                yield ('{"count":' if j == 0 else ',{"count":') + str(member.count)
+                yield ',"tracebacks":'
+                for chunk in _iter_tracebacks_json(member.tracebacks, batch_size):
+                    yield chunk
+                yield "}"
+            yield "]"
+        yield "}"
+
+    yield "]"
+
+
+def iter_json_chunks(
+    tracebacks: com.Tracebacks, batch_size: int = WRITE_BATCH_SIZE
+) -> typ.Iterable[str]:
+    """Serialize a chain of tracebacks as chunks of a compact JSON object.
+
+    Each chunk contains at most batch_size entries, so that deep
+    tracebacks can be written without building one large string.
+    """
+    tracebacks = _load_tracebacks(tracebacks)
+    aliases    = [
+        "[" + _encode_str(alias) + "," + _encode_str(prefix) + "]"
+        for alias, prefix in formatting.chain_aliases(tracebacks)
+    ]
+
+    yield "".join(
+        (
+            '{"fingerprint":"',
+            dedup.fingerprint(tracebacks),
+            '","aliases":[',
+            ",".join(aliases),
+            '],"tracebacks":',
+        )
+    )
+    for chunk in _iter_tracebacks_json(tracebacks, batch_size):
+        yield chunk
+    yield "}"
+
+
+def dumps(tracebacks: com.Tracebacks) -> str:
+    """Serialize a chain of tracebacks as a (single line) JSON string."""
+    return "".join(iter_json_chunks(tracebacks))
+
+
+def write_json(tracebacks: com.Tracebacks, out: typ.TextIO) -> None:
+    """Write a chain of tracebacks as one line of NDJSON."""
+    for chunk in iter_json_chunks(tracebacks):
+        out.write(chunk)
+    out.write("\n")
+
+
+def write_ndjson(chains: typ.Iterable[com.Tracebacks], out: typ.TextIO) -> None:
+    for tracebacks in chains:
+        write_json(tracebacks, out)
+
+
+def _entry_from_obj(obj: typ.Dict[str, typ.Any]) -> com.Entry:
+    return com.Entry(
+        obj['module'],
+        obj['call'],
+        str(obj['lineno']),
+        obj['src_ctx'],
+        obj.get('caret', ""),
+        obj.get('repeat', 0),
+    )
+
+
+def _member_from_obj(obj: typ.Dict[str, typ.Any]) -> com.Member:
+    return com.Member(from_obj(obj), obj['count'])
+
+
+def from_obj(obj: typ.Dict[str, typ.Any]) -> com.Tracebacks:
+    """Inverse of json.loads(dumps(tracebacks))."""
+    return [
+        com.Traceback(
+            exc_name=tb_obj['exc_name'],
+            exc_msg=tb_obj['exc_msg'],
+            entries=[_entry_from_obj(entry_obj) for entry_obj in tb_obj['entries']],
+            is_caused=tb_obj['is_caused'],
+            is_context=tb_obj['is_context'],
+            members=tuple(map(_member_from_obj, tb_obj.get('members', ()))),
+        )
+        for tb_obj in obj['tracebacks']
+    ]
+
+
+def loads(data: str) -> com.Tracebacks:
+    return from_obj(json.loads(data))
+
+
+def exc_to_json(
+    exc_value: BaseException,
+    traceback: typ.Any,
+    limits   : typ.Optional[formatting.Limits] = None,
+) -> str:
+    tracebacks = formatting.exc_to_tracebacks(exc_value, traceback, lazy_src=True, limits=limits)
+    return dumps(tracebacks)
+
+
+# Attributes of a LogRecord that are written by JSONLoggingFormatter.
+RECORD_FIELDS = ('name', 'levelname', 'pathname', 'lineno', 'process', 'thread')
+
+
+class JSONLoggingFormatter(logging.Formatter):
+    """Format log records as NDJSON (one object per record).
+
+    The traceback chain of a record with exc_info is written
+    to the "exception" field (see the module docstring). Its size
+    is bounded by `limits` (default: formatting.DEFAULT_LIMITS).
+    """
+
+    def __init__(
+        self,
+        *args,
+        fields: typ.Sequence[str] = RECORD_FIELDS,
+        limits: typ.Optional[formatting.Limits] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.fields = tuple(fields)
+        self.limits = limits
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            '{"time":',
+            _encode_str(self.formatTime(record, self.datefmt)),
+            ',"message":',
+            _encode_str(record.getMessage()),
+        ]
+        for field in self.fields:
+            parts.append("," + _encode_str(field) + ":")
+            parts.append(json.dumps(getattr(record, field, None), default=str))
+
+        tracebacks = getattr(record, formatting.TRACEBACKS_ATTR, None)
+        if not tracebacks and record.exc_info and record.exc_info[1] is not None:
+            _, exc_value, traceback = record.exc_info
+            tracebacks = formatting.exc_to_tracebacks(
+                exc_value, traceback, lazy_src=True, limits=self.limits
+            )
+
+        if tracebacks:
+            parts.append(',"exception":')
+            parts.extend(iter_json_chunks(tracebacks))
+
+        if record.stack_info:
+            parts.append(',"stack_info":')
+            parts.append(_encode_str(record.stack_info))
+
+        parts.append("}")
+        return "".join(parts)
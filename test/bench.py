@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the hot paths of pretty_traceback.
+
+Usage:
+    $ python -m test.bench              # compare with test/bench_baseline.json
+    $ python -m test.bench --save       # update the baseline
+    $ python -m test.bench --filter parse
+
+Times are normalized by a calibration loop, so that a baseline recorded
+on one machine is roughly comparable on another. The exit status is 1
+if any benchmark regressed by more than its threshold (TIME_THRESHOLDS,
+DEFAULT_TIME_THRESHOLD).
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+import tracemalloc
+import subprocess as sp
+
+import test.synthetic as syn
+
+from pretty_traceback import formats
+from pretty_traceback import parsing
+from pretty_traceback import deferred
+from pretty_traceback import formatting
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+DEFAULT_TIME_THRESHOLD  = 1.5
+DEFAULT_ALLOC_THRESHOLD = 1.25
+
+# Benchmarks with a time threshold other than the default, because
+# their time varies more between runs (short calls, subprocesses).
+TIME_THRESHOLDS = {
+    'import'         : 2.0,
+    'logging_capture': 2.0,
+    'logging_format' : 1.75,
+}
+
+# minimum time spent on each benchmark (per repetition)
+MIN_BENCH_TIME = 0.1
+NUM_REPEATS    = 7
+
+
+def _calibration_workload():
+    # A fixed, pure python workload similar in nature (strings, dicts, lists)
+    # to the code that is benchmarked.
+    counts = {}
+    for i in range(20000):
+        key = "/some/path/module_{0}.py".format(i % 100)
+        counts[key] = counts.get(key, 0) + 1
+    return sorted(counts.items())
+
+
+def _num_calls(func):
+    """Number of calls of func that take about MIN_BENCH_TIME."""
+    num_calls = 1
+    while True:
+        duration = _time_calls(func, num_calls)
+        if duration > MIN_BENCH_TIME / 10:
+            break
+        num_calls *= 2
+    return max(1, int(num_calls * MIN_BENCH_TIME / max(duration, 1e-9)))
+
+
+def _time_calls(func, num_calls):
+    t0 = time.perf_counter()
+    for _ in range(num_calls):
+        func()
+    return time.perf_counter() - t0
+
+
+def _times_per_call(funcs):
+    """Time per call of each function and of the calibration workload.
+
+    The time of each repetition is relative to a run of the calibration
+    workload right before it, so that a slow phase of the machine (e.g.
+    due to other processes) affects both. The repetitions of all
+    functions are interleaved and the median of their relative times
+    is used, which is scaled by the (minimum) time of the calibration.
+    """
+    calib_calls = _num_calls(_calibration_workload) // 4 or 1
+    num_calls   = {name: _num_calls(func) for name, func in funcs.items()}
+
+    calib_times = []
+    ratios      = {name: [] for name in funcs}
+    for _ in range(NUM_REPEATS):
+        for name, func in funcs.items():
+            calib_time = _time_calls(_calibration_workload, calib_calls) / calib_calls
+            func_time  = _time_calls(func, num_calls[name]) / num_calls[name]
+            calib_times.append(calib_time)
+            ratios[name].append(func_time / calib_time)
+
+    calibration = min(calib_times)
+    times       = {name: statistics.median(ratios[name]) * calibration for name in funcs}
+    return (calibration, times)
+
+
+def _alloc_per_call(func):
+    func()  # warm up caches
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _retained_per_call(func):
+    """Memory held by the result of func (in bytes)."""
+    tracemalloc.start()
+    try:
+        result = func()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return retained
+
+
+def _import_time():
+    """Cumulative import time (in seconds) of pretty_traceback in a fresh interpreter."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    # measure the import of cached bytecode, not the compilation
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    sp.check_output([sys.executable, "-c", "import pretty_traceback"], env=env)
+
+    best = float('inf')
+    for _ in range(NUM_REPEATS):
+        output = sp.check_output(
+            [sys.executable, "-X", "importtime", "-c", "import pretty_traceback"],
+            stderr=sp.STDOUT,
+            env=env,
+        )
+        for line in output.decode("utf-8").splitlines():
+            match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+pretty_traceback$", line)
+            if match:
+                best = min(best, int(match.group(1)) / 1e6)
+    return best
+
+
+def _iter_benchmarks():
+    deep_str    = syn.deep_traceback_str(depth=1000, cycle_len=3)
+    wide_str    = syn.wide_traceback_str(depth=50)
+    chained_str = syn.chained_traceback_str(num_links=20)
+    log_text    = syn.log_text(num_lines=20000, traceback_every=500)
+
+    yield "parse_deep"   , lambda: parsing.parse_tracebacks(deep_str)
+    yield "parse_wide"   , lambda: parsing.parse_tracebacks(wide_str)
+    yield "parse_chained", lambda: parsing.parse_tracebacks(chained_str)
+
+    log_bytes = log_text.encode("utf-8")
+
+    def _parse_stream():
+        parser = parsing.TracebackParser()
+        parser.feed(log_bytes)
+        parser.close()
+
+    yield "parse_stream_log", _parse_stream
+    yield "parse_formats_log", lambda: formats.parse_tracebacks(log_text)
+
+    deep    = parsing.parse_tracebacks(deep_str)
+    wide    = parsing.parse_tracebacks(wide_str)
+    chained = parsing.parse_tracebacks(chained_str)
+
+    yield "format_deep"   , lambda: formatting.format_tracebacks(deep, color=True, term_width=100)
+    yield "format_wide"   , lambda: formatting.format_tracebacks(wide, color=True, term_width=100)
+    yield "format_chained", lambda: formatting.format_tracebacks(chained, term_width=100)
+
+    large_sys_path = syn.sys_path(num_paths=2000)
+
+    def _format_large_sys_path():
+        orig_sys_path = sys.path
+        sys.path      = large_sys_path
+        try:
+            formatting.format_tracebacks(wide, term_width=100)
+        finally:
+            sys.path = orig_sys_path
+
+    yield "format_large_sys_path", _format_large_sys_path
+
+    _, deep_exc, deep_tb = syn.deep_exception(depth=500)
+    _, chained_exc, chained_tb = syn.chained_exception(num_links=20)
+
+    yield "exc_to_str_deep"   , lambda: formatting.exc_to_traceback_str(deep_exc, deep_tb, True, 100)
+    yield "exc_to_str_chained", lambda: formatting.exc_to_traceback_str(chained_exc, chained_tb)
+
+    if sys.version_info >= (3, 11):
+        # a TaskGroup with many tasks that failed the same way
+        _, group_exc, group_tb = syn.group_exception(num_tasks=2000, num_distinct=3)
+
+        yield "exc_to_str_group", lambda: formatting.exc_to_traceback_str(group_exc, group_tb)
+
+    record = logging.LogRecord(
+        "bench", logging.ERROR, __file__, 1, "request failed", None, syn.chained_exception(5)
+    )
+    formatter = formatting.LoggingFormatter(term_width=100)
+
+    def _logging_format():
+        record.exc_text = None
+        formatter.format(record)
+
+    yield "logging_format", _logging_format
+
+    # the part of deferred logging that runs in the thread which logs
+    capture_handler = deferred.CapturingQueueHandler(None)
+
+    yield "logging_capture", lambda: capture_handler.prepare(record)
+
+
+def _iter_memory_benchmarks():
+    # many tracebacks with (partially) the same long paths
+    log_bytes = "".join(
+        syn.wide_traceback_str(depth=30, seed=i % 20) for i in range(500)
+    ).encode("utf-8")
+
+    yield "memory_tuples", lambda: list(parsing.iter_stream_tracebacks(io.BytesIO(log_bytes)))
+    yield "memory_table" , lambda: parsing.read_table(io.BytesIO(log_bytes))
+
+
+def run_benchmarks(name_filter=""):
+    funcs = {name: func for name, func in _iter_benchmarks() if name_filter in name}
+    mem_funcs = {name: func for name, func in _iter_memory_benchmarks() if name_filter in name}
+
+    calibration, times = _times_per_call(dict(funcs, **mem_funcs))
+
+    results = {}
+    for name, func in funcs.items():
+        results[name] = {'time': times[name], 'alloc': _alloc_per_call(func)}
+        print("{0:<24} {1:>10.1f} us {2:>10.1f} KiB".format(
+            name, results[name]['time'] * 1e6, results[name]['alloc'] / 1024
+        ))
+
+    for name, func in mem_funcs.items():
+        results[name] = {'time': times[name], 'retained': _retained_per_call(func)}
+        print("{0:<24} {1:>10.1f} us {2:>10.1f} KiB retained".format(
+            name, results[name]['time'] * 1e6, results[name]['retained'] / 1024
+        ))
+
+    if name_filter in "import":
+        results['import'] = {'time': _import_time()}
+        print("{0:<24} {1:>10.1f} us".format('import', results['import']['time'] * 1e6))
+
+    return {'calibration': calibration, 'results': results}
+
+
+def compare(baseline, current, time_threshold, alloc_threshold, time_thresholds=None):
+    """Return a list of messages for each regression.
+
+    The time_thresholds of individual benchmarks (default: TIME_THRESHOLDS)
+    take precedence over time_threshold.
+    """
+    if time_thresholds is None:
+        time_thresholds = TIME_THRESHOLDS
+    # times are relative to the calibration of the respective run
+    speed_factor = current['calibration'] / baseline['calibration']
+
+    regressions = []
+    for name, cur in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+
+        time_ratio = cur['time'] / (base['time'] * speed_factor)
+        if time_ratio > time_thresholds.get(name, time_threshold):
+            regressions.append("{0}: time x{1:.2f}".format(name, time_ratio))
+
+        for key in ('alloc', 'retained'):
+            if base.get(key, 0) > 0 and key in cur:
+                ratio = cur[key] / base[key]
+                if ratio > alloc_threshold:
+                    regressions.append("{0}: {1} x{2:.2f}".format(name, key, ratio))
+    return regressions
+
+
+def main(args=None):
+    arg_parser = argparse.ArgumentParser(prog="python -m test.bench")
+    arg_parser.add_argument('--save'    , action='store_true', help="Update the baseline")
+    arg_parser.add_argument('--filter'  , default="", help="Only run matching benchmarks")
+    arg_parser.add_argument('--baseline', default=BASELINE_PATH)
+    arg_parser.add_argument('--threshold'      , type=float, default=DEFAULT_TIME_THRESHOLD)
+    arg_parser.add_argument('--alloc-threshold', type=float, default=DEFAULT_ALLOC_THRESHOLD)
+    opts = arg_parser.parse_args(args)
+
+    current = run_benchmarks(opts.filter)
+
+    if opts.save:
+        with open(opts.baseline, mode="w") as fobj:
+            json.dump(current, fobj, indent=2, sort_keys=True)
+        return 0
+
+    if not os.path.exists(opts.baseline):
+        print("No baseline at {0}, use --save to create it".format(opts.baseline))
+        return 0
+
+    with open(opts.baseline) as fobj:
+        baseline = json.load(fobj)
+
+    regressions = compare(baseline, current, opts.threshold, opts.alloc_threshold)
+    for msg in regressions:
+        print("REGRESSION", msg)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -347,8 +347,294 @@ CHAINED_TRACEBACK = [
 ]
 
 
+# python >= 3.11, with carets and a repeated entry
+CARET_TRACEBACK_STR = """
+Traceback (most recent call last):
+  File "/home/user/project/calc.py", line 11, in <module>
+    walk({"count": 3, "total": 0}, 30)
+  File "/home/user/project/calc.py", line 8, in walk
+    return walk(node, depth - 1)
+           ^^^^^^^^^^^^^^^^^^^^^
+  File "/home/user/project/calc.py", line 8, in walk
+    return walk(node, depth - 1)
+           ^^^^^^^^^^^^^^^^^^^^^
+  File "/home/user/project/calc.py", line 8, in walk
+    return walk(node, depth - 1)
+           ^^^^^^^^^^^^^^^^^^^^^
+  [Previous line repeated 27 more times]
+  File "/home/user/project/calc.py", line 7, in walk
+    return ratio(node, node["total"])
+           ^^^^^^^^^^^^^^^^^^^^^^^^^^
+  File "/home/user/project/calc.py", line 2, in ratio
+    return values["count"] / total
+           ~~~~~~~~~~~~~~~~^~~~~~~
+ZeroDivisionError: division by zero
+"""
+
+
+_WALK_ENTRY = com.Entry(
+    module="/home/user/project/calc.py",
+    call="walk",
+    lineno="8",
+    src_ctx="return walk(node, depth - 1)",
+    caret="       ^^^^^^^^^^^^^^^^^^^^^",
+)
+
+CARET_TRACEBACK = com.Traceback(
+    exc_name="ZeroDivisionError",
+    exc_msg="division by zero",
+    entries=[
+        com.Entry(
+            module="/home/user/project/calc.py",
+            call="<module>",
+            lineno="11",
+            src_ctx='walk({"count": 3, "total": 0}, 30)',
+        ),
+        _WALK_ENTRY,
+        _WALK_ENTRY,
+        _WALK_ENTRY._replace(repeat=27),
+        com.Entry(
+            module="/home/user/project/calc.py",
+            call="walk",
+            lineno="7",
+            src_ctx='return ratio(node, node["total"])',
+            caret="       ^^^^^^^^^^^^^^^^^^^^^^^^^^",
+        ),
+        com.Entry(
+            module="/home/user/project/calc.py",
+            call="ratio",
+            lineno="2",
+            src_ctx='return values["count"] / total',
+            caret="       ~~~~~~~~~~~~~~~~^~~~~~~",
+        ),
+    ],
+    is_caused=False,
+    is_context=False,
+)
+
+
 ALL_TRACEBACK_STRS = [
     BASIC_TRACEBACK_STR,
     COMPRESSABLE_TRACEBACK_STR,
     CHAINED_TRACEBACK_STR,
+    CARET_TRACEBACK_STR,
+]
+
+
+FAULTHANDLER_STR = """
+Fatal Python error: Segmentation fault
+
+Current thread 0x00007fd07b43cb80 (most recent call first):
+  File "/usr/lib/python3.11/ctypes/__init__.py", line 519 in string_at
+  File "/home/user/project/crash.py", line 3 in crash
+  File "/home/user/project/crash.py", line 6 in <module>
+
+Thread 0x00007fd07a2ff640 (most recent call first):
+  File "/usr/lib/python3.11/threading.py", line 327 in wait
+  File "/home/user/project/crash.py", line 9 in worker
+"""
+
+FAULTHANDLER_CHAINS = [
+    [
+        com.Traceback(
+            exc_name="Fatal Python error",
+            exc_msg="Segmentation fault",
+            entries=[
+                com.Entry("/home/user/project/crash.py", "<module>", "6", ""),
+                com.Entry("/home/user/project/crash.py", "crash", "3", ""),
+                com.Entry("/usr/lib/python3.11/ctypes/__init__.py", "string_at", "519", ""),
+            ],
+            is_caused=False,
+            is_context=False,
+        )
+    ],
+    [
+        com.Traceback(
+            exc_name="Thread 0x00007fd07a2ff640",
+            exc_msg="",
+            entries=[
+                com.Entry("/home/user/project/crash.py", "worker", "9", ""),
+                com.Entry("/usr/lib/python3.11/threading.py", "wait", "327", ""),
+            ],
+            is_caused=False,
+            is_context=False,
+        )
+    ],
+]
+
+
+REMOTE_TRACEBACK_STR = '''
+multiprocessing.pool.RemoteTraceback: 
+"""
+Traceback (most recent call last):
+  File "/usr/lib/python3.11/multiprocessing/pool.py", line 48, in mapstar
+    return list(map(*args))
+  File "/home/user/project/jobs.py", line 5, in helper
+    raise ValueError(f"bad value {x}")
+ValueError: bad value 1
+"""
+
+The above exception was the direct cause of the following exception:
+
+Traceback (most recent call last):
+  File "/home/user/project/jobs.py", line 8, in <module>
+    pool.map(helper, [1])
+  File "/usr/lib/python3.11/multiprocessing/pool.py", line 774, in get
+    raise self._value
+ValueError: bad value 1
+'''
+
+REMOTE_TRACEBACK_CHAINS = [
+    [
+        com.Traceback(
+            exc_name="ValueError",
+            exc_msg="bad value 1",
+            entries=[
+                com.Entry(
+                    "/usr/lib/python3.11/multiprocessing/pool.py",
+                    "mapstar",
+                    "48",
+                    "return list(map(*args))",
+                ),
+                com.Entry(
+                    "/home/user/project/jobs.py",
+                    "helper",
+                    "5",
+                    'raise ValueError(f"bad value {x}")',
+                ),
+            ],
+            is_caused=False,
+            is_context=False,
+        ),
+        com.Traceback(
+            exc_name="ValueError",
+            exc_msg="bad value 1",
+            entries=[
+                com.Entry("/home/user/project/jobs.py", "<module>", "8", "pool.map(helper, [1])"),
+                com.Entry(
+                    "/usr/lib/python3.11/multiprocessing/pool.py",
+                    "get",
+                    "774",
+                    "raise self._value",
+                ),
+            ],
+            is_caused=True,
+            is_context=False,
+        ),
+    ]
+]
+
+
+IPYTHON_TRACEBACK_STR = """
+---------------------------------------------------------------------------
+KeyError                                  Traceback (most recent call last)
+Cell In[3], line 2
+      1 try:
+----> 2     calc.run({})
+      3 except KeyError as ex:
+
+File /home/user/project/calc.py:6, in run(values={})
+      5 def run(values):
+----> 6     total = lookup(values, "count")
+        values = {}
+      7     return total
+
+KeyError: 'count'
+
+The above exception was the direct cause of the following exception:
+
+ValueError                                Traceback (most recent call last)
+Cell In[3], line 4
+      2     calc.run({})
+      3 except KeyError as ex:
+----> 4     raise ValueError("wrapped") from ex
+
+ValueError: wrapped
+"""
+
+IPYTHON_TRACEBACK_CHAINS = [
+    [
+        com.Traceback(
+            exc_name="KeyError",
+            exc_msg="'count'",
+            entries=[
+                com.Entry("In[3]", "<module>", "2", "calc.run({})"),
+                com.Entry(
+                    "/home/user/project/calc.py",
+                    "run",
+                    "6",
+                    'total = lookup(values, "count")',
+                ),
+            ],
+            is_caused=False,
+            is_context=False,
+        ),
+        com.Traceback(
+            exc_name="ValueError",
+            exc_msg="wrapped",
+            entries=[
+                com.Entry("In[3]", "<module>", "4", 'raise ValueError("wrapped") from ex'),
+            ],
+            is_caused=True,
+            is_context=False,
+        ),
+    ]
+]
+
+
+# --tb=auto, the entries between the first and the last are in the short format
+PYTEST_REPORT_STR = """
+=================================== FAILURES ===================================
+__________________________________ test_deep ___________________________________
+
+    def test_deep():
+>       walk(1)
+
+test_walk.py:14: 
+_ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ 
+test_walk.py:2: in walk
+    return lookup(x)
+           ^^^^^^^^^
+_ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ 
+
+x = 1
+
+    def lookup(x):
+>       raise KeyError(x)
+E       KeyError: 1
+
+test_walk.py:10: KeyError
+_________________________________ test_assert __________________________________
+
+    def test_assert():
+>       assert 1 + 1 == 3
+E       assert (1 + 1) == 3
+
+test_walk.py:18: AssertionError
+=========================== short test summary info ============================
+"""
+
+PYTEST_REPORT_CHAINS = [
+    [
+        com.Traceback(
+            exc_name="KeyError",
+            exc_msg="1",
+            entries=[
+                com.Entry("test_walk.py", "test_deep", "14", "walk(1)"),
+                com.Entry("test_walk.py", "walk", "2", "return lookup(x)"),
+                com.Entry("test_walk.py", "lookup", "10", "raise KeyError(x)"),
+            ],
+            is_caused=False,
+            is_context=False,
+        )
+    ],
+    [
+        com.Traceback(
+            exc_name="AssertionError",
+            exc_msg="assert (1 + 1) == 3",
+            entries=[com.Entry("test_walk.py", "test_assert", "18", "assert 1 + 1 == 3")],
+            is_caused=False,
+            is_context=False,
+        )
+    ],
 ]
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Generators for synthetic tracebacks, used by benchmarks and tests."""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sys
+import random
+
+from pretty_traceback import common
+
+SITE_DIR = "/home/user/venvs/py38/lib/python3.8/site-packages"
+PROJECT_DIR = "/home/user/foss/myproject/src"
+
+
+def _entry_lines(module, lineno, call, src_ctx):
+    return [
+        '  File "{0}", line {1}, in {2}'.format(module, lineno, call),
+        "    " + src_ctx,
+    ]
+
+
+def deep_traceback_str(depth=1000, cycle_len=1, exc_line="RecursionError: maximum recursion"):
+    """Traceback of a (mutual) recursion with depth entries."""
+    lines = [common.TRACEBACK_HEAD]
+    lines.extend(_entry_lines(PROJECT_DIR + "/myproject/cli.py", 12, "main", "run()"))
+    for i in range(depth):
+        func_idx = i % cycle_len
+        lines.extend(
+            _entry_lines(
+                PROJECT_DIR + "/myproject/walk.py",
+                100 + func_idx,
+                "walk_{0}".format(func_idx),
+                "return walk_{0}(node.child)".format((func_idx + 1) % cycle_len),
+            )
+        )
+    lines.append(exc_line)
+    return "\n".join(lines) + "\n"
+
+
+def wide_traceback_str(depth=50, path_depth=12, seed=0):
+    """Traceback with long paths in many different packages."""
+    rand  = random.Random(seed)
+    lines = [common.TRACEBACK_HEAD]
+    for i in range(depth):
+        parts  = ["pkg_{0}".format(rand.randint(0, 20)) for _ in range(path_depth)]
+        module = SITE_DIR + "/" + "/".join(parts) + "/module_{0}.py".format(i)
+        lines.extend(_entry_lines(module, rand.randint(1, 5000), "func_{0}".format(i), "x = f(y)"))
+    lines.append("ValueError: invalid value")
+    return "\n".join(lines) + "\n"
+
+
+def chained_traceback_str(num_links=20, depth=10):
+    """Traceback with a long chain of causes/contexts."""
+    parts = []
+    for i in range(num_links):
+        if i > 0:
+            head = common.CAUSE_HEAD if i % 2 else common.CONTEXT_HEAD
+            parts.append("\n" + head + "\n\n")
+        lines = [common.TRACEBACK_HEAD]
+        for j in range(depth):
+            module = SITE_DIR + "/retry/core_{0}.py".format(j)
+            lines.extend(_entry_lines(module, 10 + j, "attempt", "return func(*args)"))
+        lines.append("RuntimeError: attempt {0} failed".format(i))
+        parts.append("\n".join(lines) + "\n")
+    return "".join(parts)
+
+
+def log_text(num_lines=100000, traceback_every=1000):
+    """Log output with a traceback every so many lines."""
+    parts = []
+    for i in range(num_lines):
+        parts.append("2020-08-16 21:13:16,123 INFO request {0} handled in 12ms\n".format(i))
+        if i % traceback_every == traceback_every - 1:
+            parts.append(deep_traceback_str(depth=20, cycle_len=2))
+    return "".join(parts)
+
+
+def sys_path(num_paths=2000):
+    """A large sys.path, e.g. from a zipapp/pex layout."""
+    wheels_dir = "/home/user/.pex/installed_wheels"
+    paths      = ["{0}/{1:040x}/pkg_{2}".format(wheels_dir, i * 7919, i) for i in range(num_paths)]
+    return paths + sys.path
+
+
+def _recurse(depth):
+    if depth > 0:
+        _recurse(depth - 1)
+    raise ValueError("bottom")
+
+
+def deep_exception(depth=500):
+    """Return exc_info of an exception raised depth frames deep."""
+    try:
+        _recurse(depth)
+    except ValueError:
+        return sys.exc_info()
+    raise AssertionError("unreachable")
+
+
+def chained_exception(num_links=20):
+    """Return exc_info of an exception with a chain of num_links."""
+
+    def _retry(i):
+        if i == 0:
+            raise ValueError("first attempt")
+        try:
+            _retry(i - 1)
+        except ValueError as ex:
+            raise ValueError("attempt {0}".format(i)) from ex
+
+    try:
+        _retry(num_links - 1)
+    except ValueError:
+        return sys.exc_info()
+    raise AssertionError("unreachable")
+
+
+def _fail_task(i, depth):
+    if depth > 0:
+        _fail_task(i, depth - 1)
+    raise ValueError("task {0} failed".format(i))
+
+
+def group_exception(num_tasks=1000, num_distinct=2):
+    """Return exc_info of an ExceptionGroup (python 3.11+), e.g. of a TaskGroup.
+
+    The sub-exceptions have num_distinct different tracebacks.
+    """
+    sub_excs = []
+    for i in range(num_tasks):
+        try:
+            _fail_task(i, i % num_distinct)
+        except Exception as ex:    # pylint:disable=broad-except
+            sub_excs.append(ex)
+
+    try:
+        raise ExceptionGroup("unhandled errors in a TaskGroup", sub_excs)    # noqa: F821
+    except Exception:    # pylint:disable=broad-except
+        return sys.exc_info()
+    raise AssertionError("unreachable")
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test.bench
+
+
+def test_bench_compare():
+    baseline = {'calibration': 1.0, 'results': {'a': {'time': 1.0, 'alloc': 100}}}
+    # twice as slow on a machine that is twice as slow is not a regression
+    current = {'calibration': 2.0, 'results': {'a': {'time': 2.0, 'alloc': 100}}}
+    assert test.bench.compare(baseline, current, 1.5, 1.25) == []
+
+    current = {'calibration': 1.0, 'results': {'a': {'time': 2.0, 'alloc': 200}}}
+    assert test.bench.compare(baseline, current, 1.5, 1.25) == [
+        "a: time x2.00",
+        "a: alloc x2.00",
+    ]
+
+
+def test_bench_thresholds():
+    baseline = {'calibration': 1.0, 'results': {'a': {'time': 1.0}, 'b': {'time': 1.0}}}
+    current  = {'calibration': 1.0, 'results': {'a': {'time': 1.8}, 'b': {'time': 1.8}}}
+    assert test.bench.compare(baseline, current, 1.5, 1.25, {'a': 2.0}) == ["b: time x1.80"]
+    assert test.bench.compare(baseline, current, 2.0, 1.25, {}) == []
@@ -8,12 +8,15 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import io
 import os
 import re
 import sys
 import time
 import sched
+import types
 import random
+import logging
 import subprocess as sp
 
 try:
@@ -22,11 +25,14 @@ except ImportError:
     import builtins
 
 import test.fixtures
+import test.synthetic
 
 import pytest
 
+from pretty_traceback import dedup
 from pretty_traceback import common
 from pretty_traceback import parsing
+from pretty_traceback import deferred
 from pretty_traceback import formatting
 
 text_type = getattr(builtins, 'unicode', str)
@@ -66,7 +72,7 @@ def env_setup():
     formatting.PWD        = "/home/user/foss/myproject"
     yield
     del formatting.TEST_PATHS[:]
-    formatting.PWD = os.getcwd()
+    formatting.PWD = None
 
 
 def test_formatting_basic():
@@ -78,7 +84,13 @@ def test_formatting_basic():
             tb_entry_lines = tb_entries_str.splitlines()
             assert traceback.exc_name in tb_entry_lines[-1]
             assert traceback.exc_msg  in tb_entry_lines[-1]
-            entry_lines = [line for line in tb_entry_lines if line.startswith("    ")]
+            entry_lines = [
+                line
+                for line in tb_entry_lines
+                if line.startswith("    ")
+                and not line.startswith("    [Previous line")
+                and line.strip(" ^~")    # the carets of an entry (python 3.11+)
+            ]
             assert len(entry_lines) == len(traceback.entries)
             for line, entry in zip(entry_lines, traceback.entries):
                 assert entry.lineno  in line
@@ -119,6 +131,248 @@ def test_formatting(fixture_index, term_width, pathsep_re, env_setup):
         assert len(pathsep_offsets) > 3 and len(set(pathsep_offsets)) == 1
 
 
+ANSI_RE = re.compile(r"\x1b\[\d+m")
+
+
+def test_themes():
+    trace_str  = test.fixtures.ALL_TRACEBACK_STRS[0]
+    tracebacks = parsing.parse_tracebacks(trace_str)
+
+    plain_str   = formatting.format_tracebacks(tracebacks, color=False, term_width=100)
+    default_str = formatting.format_tracebacks(tracebacks, color=True, term_width=100)
+    assert "\x1b" not in plain_str
+    assert formatting.FMT_ERROR_NAME.format(tracebacks[-1].exc_name) in default_str
+    assert ANSI_RE.sub("", default_str) == plain_str
+
+    theme     = formatting.Theme(module="\x1b[34m", call="", lineno="", error_name="", error_msg="")
+    theme_str = formatting.format_tracebacks(tracebacks, color=True, term_width=100, theme=theme)
+    assert ANSI_RE.sub("", theme_str) == plain_str
+    assert set(ANSI_RE.findall(theme_str)) == {"\x1b[34m", "\x1b[0m"}
+
+    # the theme is ignored without color
+    assert formatting.format_tracebacks(tracebacks, term_width=100, theme=theme) == plain_str
+
+
+def _brute_force_used_py_paths(py_paths, entry_paths):
+    uniq_entry_paths = set(entry_paths)
+    for py_path in py_paths:
+        is_path_used = False
+        for entry_path in list(uniq_entry_paths):
+            if entry_path.startswith(py_path):
+                is_path_used = True
+                uniq_entry_paths.remove(entry_path)
+
+        if is_path_used:
+            yield py_path
+
+
+def test_py_path_index(env_setup):
+    entry_paths = [
+        entry.module
+        for trace_str in test.fixtures.ALL_TRACEBACK_STRS
+        for traceback in parsing.parse_tracebacks(trace_str)
+        for entry in traceback.entries
+    ]
+    expected = list(_brute_force_used_py_paths(formatting.TEST_PATHS, entry_paths))
+    index    = formatting._get_py_path_index()
+    assert list(formatting._iter_used_py_paths(index, entry_paths)) == expected
+    assert formatting._get_py_path_index() is index
+
+    formatting.TEST_PATHS.append("/home/user/venvs/py38/lib")
+    new_index = formatting._get_py_path_index()
+    assert new_index is not index
+    assert "/home/user/venvs/py38/lib" in new_index.ranks
+
+
+def test_py_path_index_sys_path(monkeypatch):
+    index = formatting._get_py_path_index()
+    monkeypatch.setattr(sys, 'path', list(sys.path) + ["/tmp/extra/lib/python3.8"])
+    new_index = formatting._get_py_path_index()
+    assert new_index is not index
+    assert new_index.aliases["/tmp/extra/lib/python3.8"] == "<py>"
+
+    entry_path = "/tmp/extra/lib/python3.8/json/decoder.py"
+    assert list(formatting._iter_alias_prefixes([entry_path])) == [
+        ("<py>", "/tmp/extra/lib/python3.8/")
+    ]
+
+
+def test_py_path_index_chdir(tmpdir, monkeypatch):
+    monkeypatch.setattr(sys, 'path', list(sys.path) + [str(tmpdir.join("src"))])
+    monkeypatch.chdir(tmpdir)
+    index = formatting._get_py_path_index()
+    assert index.pwd == str(tmpdir)
+    assert index.aliases[str(tmpdir.join("src"))] == "<pwd>"
+
+    monkeypatch.chdir(tmpdir.mkdir("sub"))
+    new_index = formatting._get_py_path_index()
+    assert new_index is not index
+    assert new_index.pwd == str(tmpdir.join("sub"))
+    assert new_index.aliases[str(tmpdir.join("src"))] == ""
+
+
+def test_path_cache(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("mod.py").write("pass\n")
+    entries = [
+        common.Entry("mod.py"        , "<module>", "1", "pass"),
+        common.Entry("missing.py"    , "<module>", "1", ""),
+        common.Entry("/abs/path/x.py", "<module>", "1", ""),
+    ]
+    formatting.path_cache_clear()
+
+    paths = list(formatting._iter_entry_paths(entries))
+    assert paths == [str(tmpdir.join("mod.py")), "missing.py", "/abs/path/x.py"]
+    assert formatting.path_cache_info().misses == 3
+    assert formatting.path_cache_info().hits   == 0
+
+    assert list(formatting._iter_entry_paths(entries)) == paths
+    assert formatting.path_cache_info().misses == 3
+    assert formatting.path_cache_info().hits   == 3
+
+    monkeypatch.setattr(formatting, 'PATH_CACHE_MAXSIZE', 2)
+    formatting.path_cache_clear()
+    list(formatting._iter_entry_paths(entries))
+    assert formatting.path_cache_info().currsize == 2
+
+
+def test_path_cache_validate(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setattr(formatting, 'PATH_CACHE_VALIDATE', True)
+    tmpdir.join("mod.py").write("pass\n")
+    entries = [common.Entry("mod.py", "<module>", "1", "pass")]
+    formatting.path_cache_clear()
+
+    assert list(formatting._iter_entry_paths(entries)) == [str(tmpdir.join("mod.py"))]
+    tmpdir.join("mod.py").remove()
+    assert list(formatting._iter_entry_paths(entries)) == ["mod.py"]
+    assert formatting.path_cache_info().misses == 2
+
+
+class _FakeTTY:
+    def isatty(self):
+        return True
+
+    def fileno(self):
+        return 99
+
+
+def test_terminal_width(monkeypatch):
+    sizes = [os.terminal_size((123, 40)), os.terminal_size((77, 40))]
+
+    def _get_terminal_size(fd):
+        assert fd == 99
+        return sizes.pop(0)
+
+    monkeypatch.delenv('COLUMNS', raising=False)
+    monkeypatch.setattr(os, 'get_terminal_size', _get_terminal_size)
+
+    # queried for each call, so a resize is seen right away
+    assert formatting._get_terminal_width(_FakeTTY()) == 123
+    assert formatting._get_terminal_width(_FakeTTY()) == 77
+
+    monkeypatch.setenv('COLUMNS', "66")
+    assert formatting._get_terminal_width(_FakeTTY()) == 66
+
+
+def test_terminal_width_stty(monkeypatch):
+    stty_calls = []
+
+    def _get_terminal_size(fd):
+        raise OSError("not a terminal")
+
+    def _check_output(args):
+        stty_calls.append(args)
+        return b"40 123\n"
+
+    monkeypatch.delenv('COLUMNS', raising=False)
+    monkeypatch.setattr(os, 'get_terminal_size', _get_terminal_size)
+    monkeypatch.setattr(sp, 'check_output', _check_output)
+    monkeypatch.setattr(formatting, '_stty_columns', None)
+
+    assert formatting._get_terminal_width(_FakeTTY()) == 123
+    assert formatting._get_terminal_width(_FakeTTY()) == 123
+    assert stty_calls == [['stty', 'size']]
+
+
+def test_fixed_term_width(monkeypatch):
+    def _get_terminal_width(stream=None):
+        raise AssertionError("terminal should not be probed")
+
+    monkeypatch.setattr(formatting, '_get_terminal_width', _get_terminal_width)
+
+    tracebacks = parsing.parse_tracebacks(test.fixtures.CHAINED_TRACEBACK_STR)
+    assert formatting.format_tracebacks(tracebacks, term_width=1000)
+
+    formatter = formatting.LoggingFormatter(term_width=1000)
+    try:
+        raise KeyError("test")
+    except KeyError:
+        assert "KeyError" in formatter.formatException(sys.exc_info())
+
+
+def _raise_key_error(key):
+    raise KeyError(key)
+
+
+def test_fingerprint():
+    fingerprints = set()
+    for key in ["a", "b"]:
+        try:
+            _raise_key_error(key)
+        except KeyError:
+            _, exc_value, traceback = sys.exc_info()
+            tracebacks = formatting.exc_to_tracebacks(exc_value, traceback)
+            fingerprints.add(dedup.fingerprint(tracebacks))
+
+    # messages don't affect the fingerprint
+    assert len(fingerprints) == 1
+
+    basic   = parsing.parse_tracebacks(test.fixtures.BASIC_TRACEBACK_STR)
+    chained = parsing.parse_tracebacks(test.fixtures.CHAINED_TRACEBACK_STR)
+    assert dedup.fingerprint(basic) == dedup.fingerprint(list(basic))
+    assert dedup.fingerprint(basic) != dedup.fingerprint(chained)
+    assert dedup.fingerprint(chained[:-1]) != dedup.fingerprint(chained)
+
+
+def test_duplicate_tracker():
+    tracker = dedup.DuplicateTracker(window=10, max_size=2)
+    assert tracker.count("a", now=0) == 0
+    assert tracker.count("a", now=1) == 1
+    assert tracker.count("a", now=5) == 2
+    assert tracker.count("a", now=11) == 0
+    assert tracker.count("b", now=11) == 0
+    assert tracker.count("c", now=11) == 0
+    # "a" was dropped
+    assert tracker.count("a", now=12) == 0
+
+
+def test_logging_formatter_suppress():
+    formatter = formatting.LoggingFormatter(term_width=100, suppress_window=60)
+    outputs   = []
+    for _ in range(3):
+        try:
+            _raise_key_error("x")
+        except KeyError:
+            outputs.append(formatter.formatException(sys.exc_info()))
+
+    assert common.TRACEBACK_HEAD in outputs[0]
+    assert outputs[1].startswith("KeyError: 'x'  [traceback ")
+    assert outputs[1].endswith(" seen 1 more time]")
+    assert outputs[2].endswith(" seen 2 more times]")
+
+
+def test_logging_formatter_suppress_no_exception():
+    formatter = formatting.LoggingFormatter(term_width=100, suppress_window=60)
+    # logger.exception() outside of an except block, exc_info is (None, None, None)
+    exc_info  = (None, None, None)
+    for _ in range(3):
+        record = logging.LogRecord("test", logging.ERROR, __file__, 1, "oops", (), exc_info)
+        assert formatter.format(record).startswith("oops")
+
+    assert dedup.summary_line([], "0123", 1) == "NoneType: None  [traceback 0123 seen 1 more time]"
+
+
 def _pong(depth):
     _ping(depth + 1)
 
@@ -192,6 +446,551 @@ def run_max_recursion():
         print(tb_str)
 
 
+def _recurse(depth):
+    if depth > 0:
+        _recurse(depth - 1)
+    raise ValueError("bottom")
+
+
+def _deep_ping(depth):
+    if depth > 0:
+        _deep_pong(depth - 1)
+    raise ValueError("bottom")
+
+
+def _deep_pong(depth):
+    _deep_ping(depth)
+
+
+def _format_exc(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        _, exc_value, traceback = sys.exc_info()
+        return formatting.exc_to_traceback_str(exc_value, traceback, term_width=1000)
+    raise AssertionError("expected an exception")
+
+
+def test_compress_recursion():
+    tb_str = _format_exc(_recurse, 500)
+    lines  = tb_str.splitlines()
+    assert len(lines) < 10
+    assert "... 498 omitted entries (cycle of 1 repeated 500 times)" in tb_str
+    assert lines[-1] == "ValueError: bottom"
+
+
+def test_compress_pingpong():
+    tb_str = _format_exc(_deep_ping, 400)
+    lines  = tb_str.splitlines()
+    assert len(lines) < 12
+    assert "... 796 omitted entries (cycle of 2 repeated 400 times)" in tb_str
+    assert lines[-1] == "ValueError: bottom"
+    assert "_deep_ping" in lines[-2]
+
+
+def _random_recurse_a():
+    if random.random() > 0.5:
+        _random_recurse_a()
+    else:
+        _random_recurse_b()
+
+
+def _random_recurse_b():
+    if random.random() > 0.5:
+        _random_recurse_a()
+    else:
+        _random_recurse_b()
+
+
+def test_compress_max_recursion():
+    tb_str = _format_exc(_random_recurse_a)
+    assert "RecursionError" in tb_str
+    assert len(tb_str.splitlines()) < formatting.MAX_UNCOMPRESSED_ENTRIES
+    assert " omitted entries" in tb_str
+
+
+def test_lazy_src_ctx():
+    try:
+        _raise_key_error("x")
+    except KeyError:
+        _, exc_value, traceback = sys.exc_info()
+
+    eager = formatting.exc_to_tracebacks(exc_value, traceback)
+    lazy  = formatting.exc_to_tracebacks(exc_value, traceback, lazy_src=True)
+    assert [e.src_ctx for e in eager[0].entries] == [
+        "_raise_key_error(\"x\")",
+        "raise KeyError(key)",
+    ]
+    assert all(e.src_ctx == formatting.LAZY_SRC_CTX for e in lazy[0].entries)
+    assert formatting.load_src_ctx(lazy[0].entries) == eager[0].entries
+
+    tb_str = formatting.format_tracebacks(lazy, term_width=1000)
+    assert "raise KeyError(key)" in tb_str
+    assert formatting.LAZY_SRC_CTX not in tb_str
+
+
+def test_compress_short():
+    entries = [
+        common.Entry("a.py", "f", "1", ""),
+        common.Entry("b.py", "g", "2", ""),
+    ] * 4
+    assert formatting._compress_entries(entries) == (entries, {})
+
+
+def test_find_cycle():
+    # the short cycle at the start must not hide the longer one
+    keys = [0, 0, 0, 1, 2] * 5
+    assert formatting._find_cycle(keys, 0) == (5, 5)
+    assert formatting._find_cycle([3, 4] * 10, 0) == (2, 10)
+
+
+def test_compress_long_stack():
+    # a deep stack without a cycle, some entries are seen more than twice
+    entries = []
+    for i in range(40):
+        entries.append(common.Entry("app.py", f"step_{i}", str(i + 10), ""))
+        entries.append(common.Entry("util.py", "helper", "5", ""))
+        entries.append(common.Entry("util.py", "dispatch", "9", ""))
+    entries.append(common.Entry("app.py", "innermost", "99", ""))
+
+    assert formatting._compress_entries(entries) == (entries, {})
+
+    kept, markers = formatting._compress_entries(entries, is_recursion=True)
+    assert len(kept) < len(entries)
+    assert kept[-1] == entries[-1]
+    assert " omitted entries" in markers[len(kept) - 2]
+
+    tb_tup = common.Traceback("KeyError", "x", entries, False, False)
+    tb_str = formatting.format_tracebacks([tb_tup], term_width=100)
+    assert " omitted entries" not in tb_str
+    assert "step_0 " in tb_str
+    assert "step_39 " in tb_str
+
+
+def test_deferred_logging():
+    buf     = io.StringIO()
+    handler = logging.StreamHandler(buf)
+    handler.setFormatter(formatting.LoggingFormatter(term_width=100))
+
+    logger = logging.getLogger("test_deferred_logging")
+    logger.propagate = False
+
+    listener = deferred.start_listener([handler], logger=logger)
+    try:
+        for i in range(3):
+            try:
+                raise KeyError(i)
+            except KeyError:
+                logger.exception("failed %d", i)
+        logger.warning("done")
+    finally:
+        listener.stop()
+    assert not logger.handlers
+
+    output = buf.getvalue()
+    assert "failed 0" in output
+    assert "failed 2" in output
+    assert output.count(common.TRACEBACK_HEAD) == 3
+    assert "raise KeyError(i)" in output
+    assert "done" in output
+
+
+def test_deferred_snapshot():
+    def _fail():
+        local_value = object()
+        raise ValueError(local_value)
+
+    try:
+        _fail()
+    except ValueError:
+        record = logging.LogRecord("x", logging.ERROR, __file__, 1, "msg %s", ("arg",), sys.exc_info())
+
+    snapshot = deferred.CapturingQueueHandler(None).prepare(record)
+    assert snapshot.exc_info is None
+    assert snapshot.getMessage() == "msg arg"
+    # the original record is unchanged
+    assert record.exc_info is not None
+
+    tracebacks = getattr(snapshot, formatting.TRACEBACKS_ATTR)
+    assert tracebacks[-1].entries[-1].call == "_fail"
+    # source lines are loaded when the record is formatted
+    assert tracebacks[-1].entries[-1].src_ctx == formatting.LAZY_SRC_CTX
+
+    tb_str = formatting.LoggingFormatter(term_width=100).format(snapshot)
+    assert "raise ValueError(local_value)" in tb_str
+
+
+def test_deferred_snapshot_limits():
+    _, exc_value, traceback = test.synthetic.chained_exception(num_links=50)
+    exc_info = (type(exc_value), exc_value, traceback)
+    record   = logging.LogRecord("x", logging.ERROR, __file__, 1, "msg", (), exc_info)
+
+    limits   = formatting.Limits(max_chain_len=5)
+    snapshot = deferred.CapturingQueueHandler(None, limits).prepare(record)
+
+    tracebacks = getattr(snapshot, formatting.TRACEBACKS_ATTR)
+    assert len(tracebacks) == 6
+    assert tracebacks[0].exc_name == formatting.OMITTED_EXC_NAME
+
+
+def _distinct_entries(name, num_entries):
+    return [common.Entry(f"{name}.py", f"{name}_{i}", str(i + 1), "") for i in range(num_entries)]
+
+
+def test_limit_entries():
+    entries = _distinct_entries("step", 400)
+    tb_tup  = common.Traceback("ValueError", "bottom", entries, False, False)
+    limits  = formatting.Limits(max_entries=50)
+
+    tb_str = formatting.format_tracebacks([tb_tup], term_width=1000, limits=limits)
+    lines  = tb_str.splitlines()
+    assert "... 350 omitted entries (max_entries=50)" in tb_str
+    assert sum(1 for line in lines if "step_" in line) == 50
+    assert "step_399 " in lines[-2]
+    assert lines[-1] == "ValueError: bottom"
+
+    # a deep recursion is compressed to fewer than max_entries
+    _, exc_value, traceback = test.synthetic.deep_exception(depth=400)
+    tb_str = formatting.exc_to_traceback_str(exc_value, traceback, term_width=1000, limits=limits)
+    assert "(max_entries=50)" not in tb_str
+    assert "... 398 omitted entries (cycle of 1 repeated 400 times)" in tb_str
+
+
+def test_limit_entries_mutual_recursion():
+    ping    = common.Entry("pingpong.py", "ping", "3", "")
+    pong    = common.Entry("pingpong.py", "pong", "7", "")
+    cycle   = [ping, pong] * 5000
+    limits  = formatting.Limits()
+    entries = _distinct_entries("head", 10) + cycle + _distinct_entries("tail", 10)
+
+    kept, markers = formatting._limit_entries(entries, limits.max_entries)
+    assert len(kept) == 24
+    assert list(markers.values()) == ["... 9996 omitted entries (cycle of 2 repeated 5000 times)"]
+
+    # cycles are compressed before max_entries is applied
+    entries = _distinct_entries("head", 600) + cycle + _distinct_entries("tail", 600)
+    kept, markers = formatting._limit_entries(entries, limits.max_entries)
+    assert len(kept) == 1000
+    assert markers == {500: "... 10200 omitted entries (max_entries=1000)"}
+    assert kept[499].call == "head_499"
+    assert kept[500].call == "tail_100"
+
+
+def test_limit_chain():
+    _, exc_value, traceback = test.synthetic.chained_exception(num_links=50)
+    limits     = formatting.Limits(max_chain_len=5)
+    tracebacks = formatting.exc_to_tracebacks(exc_value, traceback, limits=limits)
+    assert len(tracebacks) == 6
+    assert tracebacks[0].exc_name == formatting.OMITTED_EXC_NAME
+    assert tracebacks[0].exc_msg.startswith("45 earlier exceptions omitted")
+    assert tracebacks[-1].exc_msg == "attempt 49"
+
+    tb_str = formatting.format_tracebacks(tracebacks, term_width=1000)
+    assert tb_str.startswith("... 45 earlier exceptions omitted")
+    assert tb_str.count(common.TRACEBACK_HEAD) == 5
+
+
+def test_limit_chain_cycle():
+    first  = ValueError("first")
+    second = KeyError("second")
+    second.__context__ = first
+    first.__context__  = second
+
+    try:
+        raise second
+    except KeyError as ex:
+        exc_value = ex
+
+    tracebacks = formatting.exc_to_tracebacks(exc_value, exc_value.__traceback__)
+    assert [tb_tup.exc_name for tb_tup in tracebacks] == ["ValueError", "KeyError"]
+    # the context of the oldest exception is not captured again
+    assert not tracebacks[0].is_context
+    assert common.CONTEXT_HEAD not in formatting.format_tracebacks(tracebacks[:1])
+
+
+class _BadStr(Exception):
+    def __str__(self):
+        raise RuntimeError("no str")
+
+
+def test_limit_msg():
+    limits = formatting.Limits(max_msg_len=100)
+    try:
+        raise ValueError("x" * 10000)
+    except ValueError as ex:
+        tracebacks = formatting.exc_to_tracebacks(ex, ex.__traceback__, limits=limits)
+    assert tracebacks[0].exc_msg == "x" * 100 + "... (9900 more characters)"
+
+    try:
+        raise _BadStr()
+    except _BadStr as ex:
+        tracebacks = formatting.exc_to_tracebacks(ex, ex.__traceback__)
+    assert tracebacks[0].exc_msg == "<exception str() failed>"
+
+
+def test_limit_output():
+    tracebacks = parsing.parse_tracebacks(test.synthetic.chained_traceback_str(num_links=20))
+    limits     = formatting.Limits(max_output_len=5000)
+    tb_str     = formatting.format_tracebacks(tracebacks, term_width=1000, limits=limits)
+    assert len(tb_str) <= 5000
+    assert "earlier exceptions omitted (max_output_len=5000)" in tb_str
+    assert tb_str.endswith("RuntimeError: attempt 19 failed")
+
+    # a single traceback which is too large
+    tracebacks = parsing.parse_tracebacks(test.synthetic.wide_traceback_str(depth=200))
+    limits     = formatting.Limits(max_output_len=2000)
+    tb_str     = formatting.format_tracebacks(tracebacks, term_width=1000, limits=limits)
+    assert len(tb_str) < 2200
+    assert "omitted characters (max_output_len=2000)" in tb_str
+    assert tb_str.endswith("ValueError: invalid value")
+
+
+requires_exc_group = pytest.mark.skipif(
+    sys.version_info < (3, 11), reason="ExceptionGroup requires python 3.11"
+)
+
+
+@requires_exc_group
+def test_exception_group():
+    _, exc_value, traceback = test.synthetic.group_exception(num_tasks=1000, num_distinct=3)
+    tracebacks = formatting.exc_to_tracebacks(exc_value, traceback)
+    assert len(tracebacks) == 1
+
+    members = tracebacks[0].members
+    assert [member.count for member in members] == [334, 333, 333]
+    assert members[0].tracebacks[-1].exc_msg == "task 0 failed"
+
+    tb_str = formatting.format_tracebacks(tracebacks, term_width=200)
+    lines  = tb_str.splitlines()
+    assert lines[-1] == formatting.GROUP_END
+    assert "ExceptionGroup: unhandled errors in a TaskGroup (1000 sub-exceptions)" in lines
+    assert formatting.GROUP_MEMBER_HEAD.format("1 (334 times)") in lines
+    assert formatting.GROUP_MEMBER_HEAD.format("3 (333 times)") in lines
+    assert tb_str.count("ValueError: task") == 3
+
+    # the rows of all members are aligned with those of the group
+    call_cols = {line.index("  _fail_task  ") for line in lines if "  _fail_task  " in line}
+    assert len(call_cols) == 1
+
+
+@requires_exc_group
+def test_exception_group_limits():
+    _, exc_value, traceback = test.synthetic.group_exception(num_tasks=100, num_distinct=10)
+    limits     = formatting.Limits(max_group_members=4)
+    tracebacks = formatting.exc_to_tracebacks(exc_value, traceback, limits=limits)
+    members    = tracebacks[0].members
+    assert len(members) == 5
+    assert members[-1].count == 60
+    assert members[-1].tracebacks[0].exc_msg.startswith("60 more sub-exceptions (6 distinct)")
+
+    tb_str = formatting.format_tracebacks(tracebacks, term_width=200)
+    assert formatting.GROUP_MEMBER_HEAD.format("...") in tb_str
+
+    # nested groups
+    try:
+        try:
+            raise ExceptionGroup("inner", [exc_value, KeyError("x")])    # noqa: F821
+        except ExceptionGroup as inner:    # noqa: F821
+            raise ExceptionGroup("outer", [inner])    # noqa: F821
+    except ExceptionGroup as outer:    # noqa: F821
+        exc_value = outer
+
+    tracebacks = formatting.exc_to_tracebacks(exc_value, exc_value.__traceback__)
+    inner_tb   = tracebacks[-1].members[0].tracebacks[-1]
+    assert inner_tb.exc_msg == "inner (2 sub-exceptions)"
+    assert len(inner_tb.members[0].tracebacks[-1].members) == 10
+
+    tb_str = formatting.format_tracebacks(tracebacks, term_width=200)
+    assert "  |   |   +---------------- 10 (10 times) ----------------" in tb_str.splitlines()
+
+    limits     = formatting.Limits(max_group_depth=1)
+    tracebacks = formatting.exc_to_tracebacks(exc_value, exc_value.__traceback__, limits=limits)
+    inner_tb   = tracebacks[-1].members[0].tracebacks[-1]
+    assert inner_tb.members[0].tracebacks[0].exc_msg == (
+        "2 sub-exceptions omitted (max_group_depth=1)"
+    )
+
+
+@requires_exc_group
+def test_exception_group_shared_context():
+    # the tasks of a TaskGroup fail while the same exception is handled
+    sub_excs = []
+    try:
+        raise KeyError("orig")
+    except KeyError:
+        for _ in range(3):
+            try:
+                raise ValueError("failed")
+            except ValueError as ex:
+                sub_excs.append(ex)
+
+    try:
+        raise ExceptionGroup("tasks", sub_excs)    # noqa: F821
+    except ExceptionGroup as ex:    # noqa: F821
+        exc_value = ex
+
+    tracebacks = formatting.exc_to_tracebacks(exc_value, exc_value.__traceback__)
+    assert len(tracebacks) == 1
+    assert not tracebacks[0].is_context
+
+    members = tracebacks[0].members
+    assert [member.count for member in members] == [3]
+    assert [tb_tup.exc_name for tb_tup in members[0].tracebacks] == ["KeyError", "ValueError"]
+    assert members[0].tracebacks[1].is_context
+
+    tb_str = formatting.format_tracebacks(tracebacks, term_width=200)
+    assert tb_str.startswith(common.TRACEBACK_HEAD)
+    assert tb_str.count(common.CONTEXT_HEAD) == 1
+    assert formatting.GROUP_MEMBER_HEAD.format("1 (3 times)") in tb_str.splitlines()
+
+
+def test_chain_context(env_setup):
+    tracebacks = parsing.parse_tracebacks(test.fixtures.CHAINED_TRACEBACK_STR)
+    context    = formatting.init_chain_context(tracebacks, term_width=40)
+    assert [len(link_ctxs) for link_ctxs in context.link_contexts] == [1, 1, 1]
+    assert context.aliases
+    assert not context.is_wide_mode
+
+    tb_str = formatting.format_tracebacks(tracebacks, context=context)
+    assert tb_str == formatting.format_tracebacks(tracebacks, term_width=40)
+    assert tb_str.count(common.ALIASES_HEAD) == 1
+    assert tb_str.startswith(common.ALIASES_HEAD)
+
+    # the columns of all links are aligned
+    lines     = tb_str.splitlines()
+    call_cols = {line.index("  _ping  ") for line in lines if "  _ping  " in line}
+    assert len(call_cols) == 1
+
+    # the same context can be used with color
+    color_str = formatting.format_tracebacks(tracebacks, color=True, context=context)
+    assert ANSI_RE.sub("", color_str) == tb_str
+
+    with pytest.raises(ValueError):
+        formatting.format_tracebacks(tracebacks[:2], context=context)
+
+
+def test_write_tracebacks(monkeypatch, tmp_path):
+    chained = parsing.parse_tracebacks(test.synthetic.chained_traceback_str(num_links=20))
+    deep    = parsing.parse_tracebacks(test.synthetic.deep_traceback_str(depth=1000))
+    for tracebacks in (chained, deep):
+        for limits in (None, formatting.Limits(max_output_len=2000)):
+            tb_str = formatting.format_tracebacks(tracebacks, term_width=100, limits=limits)
+
+            buf = io.StringIO()
+            formatting.write_tracebacks(tracebacks, buf, term_width=100, limits=limits)
+            assert buf.getvalue() == tb_str + os.linesep
+
+            bound = formatting._chain_len_bound(
+                tracebacks,
+                formatting.init_chain_context(tracebacks, term_width=100),
+                formatting._init_render_plan(formatting._PLAIN_THEME),
+            )
+            assert bound >= len(tb_str)
+
+    # to a file descriptor, one os.writev call per batch of lines
+    writev_calls = []
+    orig_writev  = os.writev
+
+    def _writev(fd, chunks):
+        writev_calls.append(len(chunks))
+        return orig_writev(fd, chunks)
+
+    monkeypatch.setattr(os, 'writev', _writev)
+
+    wide     = parsing.parse_tracebacks(test.synthetic.wide_traceback_str(depth=600))
+    tb_str   = formatting.format_tracebacks(wide, term_width=100)
+    num_rows = len(tb_str.splitlines())
+    out_path = str(tmp_path / "traceback.txt")
+    out_fd   = os.open(out_path, os.O_WRONLY | os.O_CREAT)
+    try:
+        formatting.write_tracebacks(wide, out_fd, term_width=100)
+    finally:
+        os.close(out_fd)
+
+    with io.open(out_path, mode="rb") as fobj:
+        data = fobj.read()
+
+    assert data.decode("utf-8") == tb_str + os.linesep
+    assert max(writev_calls) == formatting.WRITE_BATCH_SIZE
+    assert len(writev_calls) == -(-num_rows // formatting.WRITE_BATCH_SIZE)
+
+
+def test_logging_formatter_budget(env_setup, monkeypatch):
+    tracebacks = parsing.parse_tracebacks(test.fixtures.CHAINED_TRACEBACK_STR)
+    full_str   = formatting.LoggingFormatter(term_width=40).formatTracebacks(tracebacks)
+    plain_str  = ANSI_RE.sub("", full_str)
+    assert common.ALIASES_HEAD in full_str
+
+    # each call of the clock advances by 1, it's called once when the
+    # budget starts and once after each stage
+    def _run(budget):
+        clock = iter(range(100))
+        fake_time = types.SimpleNamespace(perf_counter=lambda: next(clock))
+        monkeypatch.setattr(formatting, 'time', fake_time)
+        formatter = formatting.LoggingFormatter(term_width=40, budget=budget)
+        tb_str    = formatter.formatTracebacks(tracebacks)
+        return tb_str, formatter.budget_info()
+
+    tb_str, info = _run(budget=10)
+    assert tb_str == full_str
+    assert info.num_formatted == 1
+    assert info.num_exceeded == 0
+
+    tb_str, info = _run(budget=3.5)
+    assert tb_str == full_str
+    assert info.by_stage['render'] == 1
+
+    tb_str, info = _run(budget=2.5)
+    assert tb_str == plain_str
+    assert info.by_stage['layout'] == 1
+
+    tb_str, info = _run(budget=1.5)
+    assert not ANSI_RE.search(tb_str)
+    assert common.ALIASES_HEAD not in tb_str
+    assert "_ping(depth + 1)" in tb_str
+    assert info.by_stage['paths'] == 1
+
+    tb_str, info = _run(budget=0.5)
+    assert common.ALIASES_HEAD not in tb_str
+    assert "_ping(depth + 1)" not in tb_str
+    assert tb_str.endswith(tracebacks[-1].exc_msg)
+    assert info == formatting.BudgetInfo(
+        1, 1, {'capture': 1, 'paths': 0, 'layout': 0, 'render': 0}
+    )
+
+
+def test_repeat_markers():
+    tracebacks = parsing.parse_tracebacks(test.fixtures.CARET_TRACEBACK_STR)
+    lines      = formatting.format_tracebacks(tracebacks, term_width=100).splitlines()
+    marker_idx = lines.index("    [Previous line repeated 27 more times]")
+    # same as python, the marker follows the carets of the entry
+    assert "calc.py:8" in lines[marker_idx - 2]
+    assert lines[marker_idx - 1].strip() == "^" * 21
+    assert "calc.py:7" in lines[marker_idx + 1]
+
+    # a repetition of the last entry
+    entries    = tracebacks[0].entries[:4]
+    tracebacks = [tracebacks[0]._replace(entries=entries)]
+    lines      = formatting.format_tracebacks(tracebacks, term_width=100).splitlines()
+    assert lines[-2] == "    [Previous line repeated 27 more times]"
+
+
+def test_caret_lines():
+    tracebacks = parsing.parse_tracebacks(test.fixtures.CARET_TRACEBACK_STR)
+    lines      = formatting.format_tracebacks(tracebacks, term_width=100).splitlines()
+    assert lines[-3].endswith('return values["count"] / total')
+    # the carets are aligned with the source line
+    src_col   = lines[-3].index("return")
+    caret_col = lines[-2].index("~")
+    assert caret_col == src_col + len("return ")
+    assert lines[-2][caret_col:] == "~~~~~~~~~~~~~~~~^~~~~~~"
+
+    # without source lines, the carets are not shown either
+    entries = [entry._replace(src_ctx="") for entry in tracebacks[0].entries]
+    tb_str  = formatting.format_tracebacks([tracebacks[0]._replace(entries=entries)])
+    assert "^" not in tb_str
+
+
 def main():
     run_max_recursion()
 
@@ -205,7 +1004,7 @@ def main():
         print(tb_str)
         print("\n------------------------------\n")
 
-    formatting.PWD = os.getcwd()
+    formatting.PWD = None
     del formatting.TEST_PATHS[:]
 
     try:
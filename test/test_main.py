@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=protected-access
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import subprocess as sp
+
+import pytest
+
+import test.fixtures
+
+from pretty_traceback import hook
+from pretty_traceback import batch
+from pretty_traceback import common
+from pretty_traceback import parsing
+from pretty_traceback import formatting
+from pretty_traceback import logfilter
+
+OPTS = logfilter.FilterOptions(color=False, term_width=100, encoding="utf-8")
+
+
+def _log_text():
+    return "".join(
+        [
+            "INFO: startup\n",
+            test.fixtures.BASIC_TRACEBACK_STR.lstrip(),
+            "INFO: Traceback (most recent call last): in a message\n",
+            test.fixtures.CHAINED_TRACEBACK_STR.lstrip(),
+            "\n",
+            "INFO: shutdown",
+        ]
+    )
+
+
+class _ChunkedReader(io.RawIOBase):
+    def __init__(self, data, chunk_size):
+        self.data       = data
+        self.chunk_size = chunk_size
+
+    def readable(self):
+        return True
+
+    def read1(self, size=-1):
+        chunk, self.data = self.data[: self.chunk_size], self.data[self.chunk_size :]
+        return chunk
+
+
+def _filter(data, chunk_size):
+    out = io.BytesIO()
+    logfilter.filter_stream(_ChunkedReader(data, chunk_size), out, OPTS)
+    return out.getvalue().decode("utf-8")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 1024 * 1024])
+def test_filter_stream(chunk_size):
+    output = _filter(_log_text().encode("utf-8"), chunk_size)
+    lines  = output.splitlines()
+
+    assert lines[0]  == "INFO: startup"
+    assert lines[-1] == "INFO: shutdown"
+    assert not output.endswith("\n")
+    assert "INFO: Traceback (most recent call last): in a message" in lines
+
+    # entries are reformatted, so the stock format is gone
+    assert not any(line.startswith("  File ") for line in lines)
+
+    # NOTE: Since the stream is filtered as it is read, each link of a
+    #   chain is formatted on its own.
+    basic   = parsing.parse_tracebacks(test.fixtures.BASIC_TRACEBACK_STR)
+    chained = parsing.parse_tracebacks(test.fixtures.CHAINED_TRACEBACK_STR)
+    for tb_tup in basic + chained:
+        tb_str = formatting.format_tracebacks([tb_tup], color=False, term_width=100)
+        assert tb_str in output
+    assert common.CAUSE_HEAD in output
+
+
+def test_filter_passthrough():
+    data = b"no tracebacks here\n" * 1000 + b"\xff invalid utf8\n"
+    out = io.BytesIO()
+    logfilter.filter_stream(io.BytesIO(data), out, OPTS)
+    assert out.getvalue() == data
+
+
+def test_filter_truncated():
+    data = b"INFO: x\nTraceback (most recent call last):\n  File \"x.py\", line 1, in <module>\n"
+    out  = io.BytesIO()
+    logfilter.filter_stream(io.BytesIO(data), out, OPTS)
+    assert out.getvalue() == data
+
+
+def test_main_cli(tmpdir):
+    log_path = tmpdir.join("app.log")
+    log_path.write(_log_text())
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    output = sp.check_output(
+        [sys.executable, "-m", "pretty_traceback", "--no-color", "--width", "100", str(log_path)],
+        env=env,
+    )
+    lines = output.decode("utf-8").splitlines()
+    assert lines[0]  == "INFO: startup"
+    assert lines[-1] == "INFO: shutdown"
+    assert not any(line.startswith("  File ") for line in lines)
+    assert "TypeError: no loader for this environment specified" in lines
+
+
+def _write_logs(tmpdir, num_files):
+    paths = []
+    for i in range(num_files):
+        log_path = tmpdir.join(f"app_{i}.log")
+        log_path.write(_log_text() * (i + 3))
+        paths.append(str(log_path))
+    return paths
+
+
+def test_split_file(tmpdir):
+    path   = _write_logs(tmpdir, 1)[0]
+    ranges = batch.split_file(path, range_size=100)
+    assert len(ranges) > 1
+    assert ranges[0].start  == 0
+    assert ranges[-1].end   == os.path.getsize(path)
+    for rng, next_rng in zip(ranges, ranges[1:]):
+        assert rng.end == next_rng.start
+
+    with open(path, mode="rb") as fobj:
+        data = fobj.read()
+
+    for rng in ranges[1:]:
+        assert data[rng.start :].startswith(parsing.TRACEBACK_HEAD_BYTES)
+        # chained tracebacks are never split apart
+        prelude = data[: rng.start].rstrip().splitlines()[-1]
+        assert not prelude.startswith(parsing.CAUSE_HEAD_BYTES)
+        assert not prelude.startswith(parsing.CONTEXT_HEAD_BYTES)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_batch(tmpdir, monkeypatch, jobs):
+    monkeypatch.setattr(batch, 'MIN_RANGE_SIZE', 100)
+    monkeypatch.setattr(batch, 'MAX_RANGE_SIZE', 1000)
+    paths = _write_logs(tmpdir, 3)
+
+    expected_tracebacks = []
+    expected_output     = io.BytesIO()
+    for path in paths:
+        with open(path, mode="rb") as fobj:
+            expected_tracebacks.extend(parsing.iter_stream_tracebacks(fobj))
+        with open(path, mode="rb") as fobj:
+            logfilter.filter_stream(fobj, expected_output, OPTS)
+
+    assert list(batch.iter_tracebacks(paths, jobs=jobs)) == expected_tracebacks
+
+    output = io.BytesIO()
+    batch.filter_files(paths, output, OPTS, jobs=jobs)
+    assert output.getvalue() == expected_output.getvalue()
+
+
+def _run_python(code, args=(), **kwargs):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    env.pop('NO_COLOR', None)
+    cmd  = [sys.executable, "-c", code] + list(args)
+    proc = sp.run(cmd, env=env, stdout=sp.PIPE, stderr=sp.PIPE, **kwargs)
+    return proc.stdout.decode("utf-8"), proc.stderr.decode("utf-8")
+
+
+LAZY_IMPORT_CODE = """
+import sys
+import pretty_traceback
+pretty_traceback.install(only_tty=False)
+print(",".join(sorted(m for m in sys.modules if m.startswith(("pretty_traceback", "colorama")))))
+def fail():
+    raise ValueError("lazy")
+fail()
+"""
+
+
+def test_lazy_import():
+    stdout, stderr = _run_python(LAZY_IMPORT_CODE)
+    assert stdout.strip() == "pretty_traceback,pretty_traceback.hook"
+    # formatted by pretty_traceback, not the default excepthook
+    assert "  File " not in stderr
+    assert "fail" in stderr
+    assert stderr.strip().endswith("ValueError: lazy")
+
+
+def test_lazy_attrs():
+    stdout, _ = _run_python(
+        "import sys, pretty_traceback; "
+        "print('pretty_traceback.formatting' in sys.modules); "
+        "print(pretty_traceback.LoggingFormatter.__name__); "
+        "print(pretty_traceback.LoggingFormaterMixin is pretty_traceback.LoggingFormatterMixin)"
+    )
+    assert stdout.split() == ["False", "LoggingFormatter", "True"]
+
+
+def test_install_pth(tmpdir):
+    site_dir = str(tmpdir)
+    env      = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    cmd = [sys.executable, "-m", "pretty_traceback", "--site-dir", site_dir]
+    sp.check_output(cmd + ["--install-pth"], env=env)
+    assert os.listdir(site_dir) == ["pretty_traceback.pth"]
+
+    stdout, _ = _run_python(
+        "import sys, site; "
+        f"site.addsitedir({site_dir!r}); "
+        "print('pretty_traceback.hook' in sys.modules, 'pretty_traceback.formatting' in sys.modules)"
+    )
+    assert stdout.split() == ["True", "False"]
+
+    sp.check_output(cmd + ["--uninstall-pth"], env=env)
+    assert os.listdir(site_dir) == []
+
+
+THREAD_CODE = """
+import sys
+import pretty_traceback
+pretty_traceback.install(only_tty=False, color=False)
+assert "threading" not in sys.modules
+import threading
+def fail():
+    raise ValueError("in thread")
+thread = threading.Thread(target=fail, name="worker")
+thread.start()
+thread.join()
+"""
+
+
+def test_threading_hook():
+    _, stderr = _run_python(THREAD_CODE)
+    assert "Exception in thread worker:" in stderr
+    assert "  File " not in stderr
+    assert stderr.strip().endswith("ValueError: in thread")
+
+
+UNRAISABLE_CODE = """
+import pretty_traceback
+pretty_traceback.install(only_tty=False, color=False)
+class Finalizer:
+    def __del__(self):
+        raise ValueError("in __del__")
+for _ in range(10000):
+    Finalizer()
+"""
+
+
+def test_unraisable_hook():
+    _, stderr = _run_python(UNRAISABLE_CODE)
+    assert "  File " not in stderr
+    assert stderr.count("Exception ignored in: <function Finalizer.__del__") == 5
+    assert stderr.count("ValueError: in __del__") == 5
+    assert stderr.count("Further exceptions (ValueError at ") == 1
+
+
+ASYNCIO_CODE = """
+import pretty_traceback
+pretty_traceback.install(only_tty=False, color=False)
+import asyncio
+async def fail():
+    raise ValueError("in task")
+async def main():
+    asyncio.get_running_loop().call_exception_handler(
+        {"message": "Task exception", "exception": ValueError("in task")}
+    )
+    try:
+        await fail()
+    except ValueError as ex:
+        asyncio.get_running_loop().call_exception_handler({"message": "failed", "exception": ex})
+asyncio.run(main())
+"""
+
+
+def test_asyncio_handler():
+    _, stderr = _run_python(ASYNCIO_CODE)
+    assert "  File " not in stderr
+    assert "Task exception" in stderr
+    assert "failed" in stderr
+    assert stderr.count("ValueError: in task") == 2
+
+
+def test_uninstall_hooks():
+    stdout, _ = _run_python(
+        "import sys, threading, pretty_traceback\n"
+        "pretty_traceback.install(only_tty=False)\n"
+        "assert threading.excepthook is not threading.__excepthook__\n"
+        "pretty_traceback.uninstall()\n"
+        "import asyncio.base_events\n"
+        "print(threading.excepthook is threading.__excepthook__, "
+        "sys.unraisablehook is sys.__unraisablehook__, "
+        "asyncio.base_events.BaseEventLoop.default_exception_handler.__module__)"
+    )
+    assert stdout.split() == ["True", "True", "asyncio.base_events"]
+
+
+EMERGENCY_CODE = """
+import sys, atexit
+import pretty_traceback
+from pretty_traceback import hook
+pretty_traceback.install(only_tty=False, color=False)
+atexit.register(lambda: print("pretty_traceback.formatting" in sys.modules))
+if sys.argv[1] in ("format_error", "emergency_error"):
+    import pretty_traceback.formatting as formatting
+    def _fail(*args, **kwargs):
+        raise RuntimeError("formatting failed")
+    formatting.exc_to_tracebacks = _fail
+if sys.argv[1] == "emergency_error":
+    hook._emergency_write = None
+def recurse(depth):
+    if depth == 0:
+        raise MemoryError() if sys.argv[1] == "memory" else ValueError("failed")
+    recurse(depth - 1)
+try:
+    raise KeyError("first")
+except KeyError as ex:
+    recurse(100)
+"""
+
+
+@pytest.mark.parametrize("mode", ["memory", "format_error", "emergency_error"])
+def test_emergency_excepthook(mode):
+    stdout, stderr = _run_python(EMERGENCY_CODE, args=[mode])
+    assert stdout.split() == ["False" if mode == "memory" else "True"]
+
+    if mode == "emergency_error":
+        # written by sys.__excepthook__
+        assert "entries omitted" not in stderr
+        assert stderr.strip().endswith("ValueError: failed")
+        return
+
+    assert "KeyError: 'first'" in stderr
+    assert "During handling of the above exception, another exception occurred:" in stderr
+    assert '  File "<string>", line 17, in recurse' in stderr
+    assert "  ... 38 entries omitted" in stderr
+    if mode == "memory":
+        exc_name = "MemoryError"
+        assert stderr.strip().endswith("MemoryError")
+    else:
+        exc_name        = "ValueError"
+        note, _, stderr = stderr.partition("\n")
+        assert note == "pretty_traceback: formatting failed (RuntimeError)"
+        assert stderr.strip().endswith("ValueError: failed")
+
+    # the output has the layout of a python traceback
+    tracebacks = parsing.parse_tracebacks(stderr)
+    assert [tb.exc_name for tb in tracebacks] == ["KeyError", exc_name]
+    assert tracebacks[1].is_context
+    assert len(tracebacks[1].entries) == hook.EMERGENCY_MAX_ENTRIES
+    assert tracebacks[1].entries[-1].call == "recurse"
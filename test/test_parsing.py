@@ -5,8 +5,16 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import io
+import re
+
+import pytest
+
 import test.fixtures
+import test.synthetic
 
+import pretty_traceback.common as com
+from pretty_traceback import formats
 from pretty_traceback import parsing
 
 
@@ -41,3 +49,171 @@ def test_parse_nested_trace():
     traceback_results = parsing.parse_tracebacks(test.fixtures.CHAINED_TRACEBACK_STR)
     for tb_result, tb_expect in zip(traceback_results, test.fixtures.CHAINED_TRACEBACK):
         _validate_traceback(tb_result, tb_expect)
+
+
+def test_parse_caret_trace():
+    traceback_results = parsing.parse_tracebacks(test.fixtures.CARET_TRACEBACK_STR)
+    assert len(traceback_results) == 1
+    _validate_traceback(traceback_results[0], test.fixtures.CARET_TRACEBACK)
+
+
+def test_parse_truncated_trace():
+    trace_str = test.fixtures.CHAINED_TRACEBACK_STR.strip()
+    for num_lines in range(1, len(trace_str.splitlines())):
+        truncated  = "\n".join(trace_str.splitlines()[:num_lines])
+        tracebacks = parsing.parse_tracebacks(truncated)
+        assert tracebacks
+
+        parser = parsing.TracebackParser()
+        assert parser.feed(truncated) + parser.close() == tracebacks
+
+    tracebacks = parsing.parse_tracebacks(trace_str.rsplit("\n", 1)[0])
+    assert len(tracebacks) == 3
+    assert tracebacks[-1].exc_name == parsing.TRUNCATED_EXC_NAME
+    assert tracebacks[-1].entries == test.fixtures.CHAINED_TRACEBACK[-1].entries
+
+
+def _log_text():
+    parts = ["INFO: starting up\n"]
+    for trace_str in test.fixtures.ALL_TRACEBACK_STRS:
+        parts.append("ERROR: something went wrong\n")
+        parts.append(trace_str.strip() + "\n")
+        parts.append("INFO: Traceback (most recent call last): is not a head here\n")
+    return "".join(parts).encode("utf-8")
+
+
+def _expected_tracebacks():
+    return [
+        tb_tup
+        for trace_str in test.fixtures.ALL_TRACEBACK_STRS
+        for tb_tup in parsing.parse_tracebacks(trace_str)
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1024 * 1024])
+def test_parser_chunks(chunk_size):
+    data   = _log_text()
+    parser = parsing.TracebackParser()
+
+    results = []
+    for i in range(0, len(data), chunk_size):
+        results.extend(parser.feed(data[i : i + chunk_size]))
+    results.extend(parser.close())
+
+    assert results == _expected_tracebacks()
+    assert parser.offset == len(data)
+
+
+def test_parser_str_chunks():
+    parser  = parsing.TracebackParser()
+    results = parser.feed(_log_text().decode("utf-8")) + parser.close()
+    assert results == _expected_tracebacks()
+
+
+def test_parser_mixed_chunks_encoding():
+    trace_str = test.fixtures.BASIC_TRACEBACK_STR.replace("no loader", "no l\xe9ader")
+    data      = trace_str.encode("latin-1")
+    split_at  = data.index(b"TypeError")
+
+    parser  = parsing.TracebackParser(encoding="latin-1")
+    results = parser.feed(data[:split_at]) + parser.feed(trace_str[split_at:]) + parser.close()
+    assert results == parsing.parse_tracebacks(trace_str)
+    assert "\xe9" in results[0].exc_msg
+    assert parser.offset == len(data)
+
+
+def test_parser_resume():
+    data     = _log_text()
+    expected = _expected_tracebacks()
+
+    for split_at in range(0, len(data), 97):
+        parser  = parsing.TracebackParser()
+        results = parser.feed(data[:split_at])
+
+        # restart, as if the process was killed after the first chunk
+        resumed = parsing.TracebackParser(offset=parser.offset)
+        assert resumed.offset <= split_at
+        results_after = resumed.feed(data[resumed.offset :]) + resumed.close()
+
+        num_new = len(expected) - len(results_after)
+        assert results[:num_new] + results_after == expected
+
+
+def test_iter_stream_tracebacks():
+    stream = io.BytesIO(_log_text())
+    assert list(parsing.iter_stream_tracebacks(stream, chunk_size=100)) == _expected_tracebacks()
+
+
+def test_parse_synthetic():
+    deep = parsing.parse_tracebacks(test.synthetic.deep_traceback_str(depth=100, cycle_len=3))
+    assert len(deep) == 1
+    assert len(deep[0].entries) == 101
+    assert deep[0].entries[-1].call == "walk_0"
+
+    wide = parsing.parse_tracebacks(test.synthetic.wide_traceback_str(depth=20))
+    assert len(wide[0].entries) == 20
+
+    chained = parsing.parse_tracebacks(test.synthetic.chained_traceback_str(num_links=5))
+    assert len(chained) == 5
+    assert [tb.is_caused for tb in chained] == [False, True, False, True, False]
+    assert [tb.is_context for tb in chained] == [False, False, True, False, True]
+
+    log_text  = test.synthetic.log_text(num_lines=1000, traceback_every=100)
+    from_logs = list(parsing.iter_stream_tracebacks(io.BytesIO(log_text.encode("utf-8"))))
+    assert len(from_logs) == 10
+
+
+FORMAT_FIXTURES = [
+    ("faulthandler", test.fixtures.FAULTHANDLER_STR     , test.fixtures.FAULTHANDLER_CHAINS),
+    ("remote"      , test.fixtures.REMOTE_TRACEBACK_STR , test.fixtures.REMOTE_TRACEBACK_CHAINS),
+    ("ipython"     , test.fixtures.IPYTHON_TRACEBACK_STR, test.fixtures.IPYTHON_TRACEBACK_CHAINS),
+    ("pytest"      , test.fixtures.PYTEST_REPORT_STR    , test.fixtures.PYTEST_REPORT_CHAINS),
+]
+
+
+@pytest.mark.parametrize("name, trace_str, expected", FORMAT_FIXTURES)
+def test_parse_formats(name, trace_str, expected):
+    assert formats.detect_format(trace_str) == name
+    assert list(formats.iter_chains(trace_str)) == expected
+    assert list(formats.iter_chains(trace_str.replace("\n", "\r\n"))) == expected
+
+
+def test_parse_formats_mixed():
+    # the default format is parsed the same as by parsing.parse_tracebacks
+    log_text = _log_text().decode("utf-8")
+    assert formats.parse_tracebacks(log_text) == _expected_tracebacks()
+
+    parts    = []
+    expected = []
+    for _, trace_str, chains in FORMAT_FIXTURES:
+        parts.append("INFO: not a traceback\n" + trace_str)
+        expected.extend(chains)
+    for trace_str in test.fixtures.ALL_TRACEBACK_STRS:
+        parts.append("ERROR: something went wrong\n" + trace_str)
+        expected.append(parsing.parse_tracebacks(trace_str))
+
+    assert list(formats.iter_chains("".join(parts))) == expected
+    assert formats.detect_format("INFO: Traceback (most recent call last): is not a head") is None
+
+
+def test_register_format():
+    def _parse_twisted(lines, idx):
+        exc_line = lines[idx + 1].strip()
+        tb_tup   = parsing.init_traceback([], exc_line, is_caused=False, is_context=False)
+        return ([[tb_tup]], idx + 2)
+
+    twisted = formats.TracebackFormat(
+        "twisted",
+        "Traceback (failure with no frames)",
+        re.compile(r"Traceback \(failure with no frames\): "),
+        _parse_twisted,
+    )
+    trace_str = (
+        "Traceback (failure with no frames): <class 'ValueError'>: boom\n"
+        "ValueError: boom\n"
+        + test.fixtures.BASIC_TRACEBACK_STR
+    )
+    tracebacks = formats.parse_tracebacks(trace_str, formats=formats.FORMATS + [twisted])
+    assert tracebacks[0] == com.Traceback("ValueError", "boom", [], False, False)
+    assert tracebacks[1:] == [test.fixtures.BASIC_TRACEBACK]
+    assert formats.parse_tracebacks(trace_str) == [test.fixtures.BASIC_TRACEBACK]
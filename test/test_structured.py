@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=protected-access
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import gc
+import io
+import os
+import sys
+import json
+import logging
+import warnings
+import subprocess as sp
+
+import test.fixtures
+import test.synthetic
+
+import pytest
+
+from pretty_traceback import common
+from pretty_traceback import archive
+from pretty_traceback import parsing
+from pretty_traceback import columnar
+from pretty_traceback import formatting
+from pretty_traceback import structured
+
+
+def test_json_roundtrip():
+    for trace_str in test.fixtures.ALL_TRACEBACK_STRS:
+        tracebacks = parsing.parse_tracebacks(trace_str)
+        data       = structured.dumps(tracebacks)
+        assert "\n" not in data
+
+        obj = json.loads(data)
+        assert len(obj['fingerprint']) == 16
+        assert all(len(alias_prefix) == 2 for alias_prefix in obj['aliases'])
+        assert structured.from_obj(obj) == tracebacks
+
+
+def test_json_batches():
+    tracebacks = parsing.parse_tracebacks(test.synthetic.deep_traceback_str(depth=1000))
+    chunks     = list(structured.iter_json_chunks(tracebacks, batch_size=100))
+    assert len(chunks) > 10
+    assert structured.loads("".join(chunks)) == tracebacks
+
+
+def test_json_exc():
+    _, exc_value, traceback = test.synthetic.chained_exception(num_links=3)
+    obj = json.loads(structured.exc_to_json(exc_value, traceback))
+    assert [tb_obj['exc_msg'] for tb_obj in obj['tracebacks']] == [
+        "first attempt",
+        "attempt 1",
+        "attempt 2",
+    ]
+    entry = obj['tracebacks'][0]['entries'][-1]
+    assert isinstance(entry['lineno'], int)
+    assert entry['src_ctx'] == 'raise ValueError("first attempt")'
+
+    # the same as what formatting uses
+    tracebacks = formatting.exc_to_tracebacks(exc_value, traceback)
+    assert structured.from_obj(obj) == tracebacks
+
+
+def test_json_lineno():
+    linenos = ["", "12", "007", "\u00b2", "\u0663", "?"]
+    entries = [common.Entry("<stdin>", "<module>", lineno, "") for lineno in linenos]
+    chain   = [common.Traceback("ValueError", "", entries, False, False)]
+    data    = structured.dumps(chain)
+    obj     = json.loads(data)
+    assert [entry['lineno'] for entry in obj['tracebacks'][0]['entries']] == [
+        "",
+        12,
+        "007",
+        "\u00b2",
+        "\u0663",
+        "?",
+    ]
+    assert structured.loads(data) == chain
+
+
+def test_json_logging_formatter():
+    buf     = io.StringIO()
+    handler = logging.StreamHandler(buf)
+    handler.setFormatter(structured.JSONLoggingFormatter())
+    logger = logging.getLogger("test_json_logging_formatter")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("no exception: %s", "ok")
+        try:
+            raise KeyError("missing")
+        except KeyError:
+            logger.exception("failed")
+    finally:
+        logger.removeHandler(handler)
+
+    lines = buf.getvalue().splitlines()
+    assert len(lines) == 2
+    first, second = map(json.loads, lines)
+    assert first['message'] == "no exception: ok"
+    assert first['levelname'] == "WARNING"
+    assert 'exception' not in first
+
+    assert second['message'] == "failed"
+    assert second['exception']['tracebacks'][-1]['exc_name'] == "KeyError"
+
+
+def test_json_logging_formatter_limits():
+    limits    = formatting.Limits(max_chain_len=2, max_msg_len=20)
+    formatter = structured.JSONLoggingFormatter(limits=limits)
+
+    _, exc_value, traceback = test.synthetic.chained_exception(num_links=5)
+    exc_info = (type(exc_value), exc_value, traceback)
+    record   = logging.LogRecord("x", logging.ERROR, __file__, 1, "failed", (), exc_info)
+    obj      = json.loads(formatter.format(record))
+
+    tb_objs = obj['exception']['tracebacks']
+    assert len(tb_objs) == 3
+    assert tb_objs[0]['exc_name'] == formatting.OMITTED_EXC_NAME
+    assert tb_objs[-1]['exc_msg'] == "attempt 4"
+
+
+def test_json_excepthook():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    code = (
+        "import pretty_traceback; pretty_traceback.install(only_tty=False, output='json'); "
+        "raise ValueError('json')"
+    )
+    proc = sp.run([sys.executable, "-c", code], env=env, stderr=sp.PIPE)
+    obj  = json.loads(proc.stderr.decode("utf-8"))
+    assert obj['tracebacks'][-1]['exc_msg'] == "json"
+
+
+def test_json_excepthook_limits():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    code = (
+        "import pretty_traceback; "
+        "from pretty_traceback.formatting import Limits; "
+        "pretty_traceback.install(only_tty=False, output='json', limits=Limits(max_msg_len=20)); "
+        "raise ValueError('x' * 100)"
+    )
+    proc  = sp.run([sys.executable, "-c", code], env=env, stderr=sp.PIPE)
+    lines = proc.stderr.decode("utf-8").splitlines()
+    assert len(lines) == 1
+    exc_msg = json.loads(lines[0])['tracebacks'][-1]['exc_msg']
+    assert exc_msg.startswith("x" * 20)
+    assert len(exc_msg) < 100
+
+
+def _all_trace_strs():
+    return test.fixtures.ALL_TRACEBACK_STRS + [
+        test.synthetic.deep_traceback_str(depth=300),
+        test.synthetic.chained_traceback_str(num_links=4),
+    ]
+
+
+def _all_chains():
+    return [parsing.parse_tracebacks(trace_str) for trace_str in _all_trace_strs()]
+
+
+def test_archive_roundtrip():
+    chains = _all_chains()
+    data   = archive.dumps(chains)
+    assert archive.loads(data) == chains
+
+    text_size = sum(len(trace_str) for trace_str in _all_trace_strs())
+    assert len(data) < text_size / 5
+
+    # formatting is lossless
+    for orig, loaded in zip(chains, archive.loads(data)):
+        assert formatting.format_tracebacks(loaded, term_width=100) == formatting.format_tracebacks(
+            orig, term_width=100
+        )
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="ExceptionGroup requires python 3.11")
+def test_exception_group_roundtrip():
+    _, exc_value, traceback = test.synthetic.group_exception(num_tasks=50, num_distinct=5)
+    tracebacks = formatting.exc_to_tracebacks(exc_value, traceback)
+
+    obj = json.loads(structured.dumps(tracebacks))
+    assert [member['count'] for member in obj['tracebacks'][0]['members']] == [10] * 5
+    assert structured.from_obj(obj) == tracebacks
+    assert archive.loads(archive.dumps([tracebacks])) == [tracebacks]
+
+
+def test_archive_append(tmpdir):
+    chains = _all_chains()
+    path   = str(tmpdir.join("tracebacks.ptba"))
+
+    with archive.ArchiveWriter(path) as writer:
+        for chain in chains:
+            writer.write(chain)
+    size_once = os.path.getsize(path)
+
+    # strings are not written again
+    with archive.ArchiveWriter(path) as writer:
+        for chain in chains:
+            writer.write(chain)
+    size_twice = os.path.getsize(path)
+    assert size_twice - size_once < size_once / 2
+
+    assert list(archive.iter_archive(path)) == chains + chains
+
+
+def test_archive_truncated(tmpdir):
+    chains = _all_chains()
+    path   = str(tmpdir.join("tracebacks.ptba"))
+    with archive.ArchiveWriter(path) as writer:
+        for chain in chains:
+            writer.write(chain)
+
+    # e.g. the process was killed while writing the last chain
+    with open(path, mode="r+b") as fobj:
+        fobj.truncate(os.path.getsize(path) - 5)
+    assert list(archive.iter_archive(path)) == chains[:-1]
+
+    with archive.ArchiveWriter(path) as writer:
+        writer.write(chains[-1])
+    assert list(archive.iter_archive(path)) == chains
+
+
+def test_archive_not_an_archive(tmpdir):
+    path = str(tmpdir.join("tracebacks.log"))
+    with open(path, mode="wb") as fobj:
+        fobj.write(b"INFO: not a traceback archive\n")
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        with pytest.raises(archive.ArchiveError):
+            archive.ArchiveWriter(path)
+        gc.collect()
+
+    assert not [warning for warning in caught if warning.category is ResourceWarning]
+    # the file is not modified
+    with open(path, mode="rb") as fobj:
+        assert fobj.read() == b"INFO: not a traceback archive\n"
+
+
+def test_archive_lineno():
+    entries = [
+        common.Entry("<stdin>", "<module>", "", ""),
+        common.Entry("<stdin>", "<module>", "007", ""),
+        common.Entry("<stdin>", "<module>", "\u00b2", ""),
+        common.Entry("/tmp/ünïcode.py", "f", "300", "x = '\\udcff'"),
+    ]
+    chain = [common.Traceback("ValueError", "", entries, False, False)]
+    assert archive.loads(archive.dumps([chain])) == [chain]
+
+
+def test_entry_table():
+    chains = _all_chains()
+    table  = columnar.EntryTable()
+    for chain in chains:
+        table.extend(chain)
+
+    assert len(table) == sum(len(chain) for chain in chains)
+    assert list(table.iter_chains()) == chains
+    assert table[-1] == chains[-1][-1]
+
+    # strings are shared
+    modules = {id(entry.module) for tb_tup in table for entry in tb_tup.entries}
+    assert len(modules) == len({entry.module for tb_tup in table for entry in tb_tup.entries})
+
+    for chain in table.iter_chains():
+        tb_str = formatting.format_tracebacks(chain, term_width=100)
+        assert chain[-1].exc_name in tb_str
+
+    entries = [common.Entry("<stdin>", "<module>", "", ""), common.Entry("a.py", "f", "007", "")]
+    table.append(common.Traceback("ValueError", "", entries, False, False))
+    assert table[-1].entries == entries
+
+
+def test_read_table():
+    log_text = test.synthetic.log_text(num_lines=1000, traceback_every=100).encode("utf-8")
+    table    = parsing.read_table(io.BytesIO(log_text), chunk_size=1000)
+    expected = list(parsing.iter_stream_tracebacks(io.BytesIO(log_text)))
+    assert list(table) == expected
+    assert table.num_entries == sum(len(tb_tup.entries) for tb_tup in expected)